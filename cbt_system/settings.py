@@ -130,6 +130,74 @@ DATABASES = {
 #     }
 # }
 
+# Cache
+# LocMem cukup untuk development. Di production pakai Redis/Memcached supaya
+# data ujian yang sudah di-compile dibagi antar worker. Heartbeat presence dan
+# command flush_heartbeats butuh cache bersama (system check exam.W001).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'cbt-system',
+    }
+}
+
+# CACHES = {
+#     'default': {
+#         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#         'LOCATION': 'redis://127.0.0.1:6379/1',
+#     }
+# }
+
+# Compiled exam data (payload soal, dll)
+EXAM_CACHE_LRU_SIZE = 64  # jumlah entry per worker
+EXAM_CACHE_TIMEOUT = 60 * 60 * 6  # detik, untuk shared cache
+
+# Soal dikirim ke take_exam per chunk
+EXAM_QUESTION_CHUNK_SIZE = 10
+EXAM_QUESTION_CHUNK_MAX = 50
+
+# Interval (detik) client mengirim delta jawaban ke server
+EXAM_AUTOSAVE_INTERVAL = 10
+
+# Write-behind buffer jawaban (lihat exam/answers.py)
+ANSWER_SPOOL_DIR = os.path.join(BASE_DIR, 'var', 'answer_spool')
+ANSWER_FLUSH_INTERVAL = 5  # detik, minimal jarak flush per session
+
+# Deadline session dari server (lihat exam/grading.py close_expired_sessions)
+EXAM_DEADLINE_GRACE_SECONDS = 30  # toleransi latency untuk autosave/submit terakhir
+SESSION_SWEEP_BATCH_SIZE = 2000
+SESSION_SWEEP_INTERVAL = 30  # detik
+
+# Heartbeat presence (lihat exam/presence.py)
+EXAM_HEARTBEAT_INTERVAL = 15  # detik, interval ping dari client
+HEARTBEAT_FLUSH_INTERVAL = 60  # detik, jarak flush_heartbeats --loop
+HEARTBEAT_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Index token akses ujian di cache (lihat exam/tokens.py)
+TOKEN_INDEX_TIMEOUT = 60 * 5
+TOKEN_MINT_MAX = 20000  # maksimal token per bulk generate
+TOKEN_EXPIRY_INTERVAL = 60  # detik, jarak job expire_tokens --loop
+
+# Export CSV/XLSX (lihat exam/exports.py)
+EXPORT_CHUNK_SIZE = 2000
+
+# Background job (lihat exam/jobs.py)
+JOB_OUTPUT_DIR = os.path.join(BASE_DIR, 'var', 'jobs')
+JOB_WORKERS = 2
+JOB_STATE_TIMEOUT = 60 * 60 * 24  # state & link download berlaku 1 hari
+JOBS_RUN_INLINE = False  # True: job dijalankan langsung di request (test)
+
+# Statistik dashboard student di-cache per user (lihat exam/stats.py)
+STUDENT_STATS_TIMEOUT = 60 * 60
+# Rollup statistik dashboard admin dicocokkan ulang oleh reconcile_stats --loop
+STATS_RECONCILE_INTERVAL = 60 * 5  # detik
+
+# Item analysis per exam di-cache (lihat exam/analysis.py)
+ITEM_ANALYSIS_TIMEOUT = 60 * 60 * 6
+
+# Import roster user: jumlah proses untuk hashing password (lihat exam/hashing.py)
+USER_IMPORT_HASH_WORKERS = os.cpu_count() or 1
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -215,5 +283,10 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': False,
         },
+        'exam': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
\ No newline at end of file
@@ -1,9 +1,8 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
 from django.utils.html import format_html
 from django.urls import path
 from django.shortcuts import render
-from django.db.models import Avg
 from django.utils import timezone
 from django.contrib.admin import SimpleListFilter
 from datetime import timedelta
@@ -20,8 +19,14 @@ from .models import (
     ProctoringEvent,
     Certificate,
     SystemLog,
+    SystemStats,
     Choice
 )
+from .regrade import regrade_exam
+from .stats import get_system_stats, reconcile_all_exam_stats, reconcile_system_stats
+
+# Batas nama session yang ditampilkan di pesan action regrade
+REGRADE_MESSAGE_NAMES = 10
 
 # =========================
 # CUSTOM ADMIN SITE
@@ -41,27 +46,11 @@ class CustomAdminSite(admin.AdminSite):
     
     def admin_stats(self, request):
         """Custom Dashboard Stats"""
-        total_users = CustomUser.objects.count()
-        total_exams = Exam.objects.count()
-        total_sessions = ExamSession.objects.count()
-        active_sessions = ExamSession.objects.filter(status='in_progress').count()
-
-        recent_exams = Exam.objects.order_by('-created_at')[:5]
-        recent_sessions = ExamSession.objects.select_related('user', 'exam').order_by('-start_time')[:10]
-
-        avg_score = ExamSession.objects.filter(score__isnull=False).aggregate(Avg('score'))['score__avg'] or 0
-        pass_rate = (ExamSession.objects.filter(score__gte=60).count() / total_sessions * 100) if total_sessions > 0 else 0
-
-        context = {
-            'total_users': total_users,
-            'total_exams': total_exams,
-            'total_sessions': total_sessions,
-            'active_sessions': active_sessions,
-            'avg_score': round(avg_score, 2),
-            'pass_rate': round(pass_rate, 2),
-            'recent_exams': recent_exams,
-            'recent_sessions': recent_sessions,
-        }
+        context = get_system_stats()
+        context.update({
+            'recent_exams': Exam.objects.order_by('-created_at')[:5],
+            'recent_sessions': ExamSession.objects.select_related('user', 'exam').order_by('-start_time')[:10],
+        })
         return render(request, 'admin/admin_stats.html', context)
     
     def user_management(self, request):
@@ -163,7 +152,7 @@ class ExamAdmin(admin.ModelAdmin):
     search_fields = ('title', 'description')
     readonly_fields = ('exam_id', 'created_at', 'updated_at')
     filter_horizontal = ('allowed_departments', 'allowed_users')
-    actions = ['delete_selected']
+    actions = ['delete_selected', 'regrade_exams']
 
     fieldsets = (
         ('Basic Information', {'fields': ('exam_id', 'title', 'description', 'exam_type', 'status')}),
@@ -178,6 +167,31 @@ class ExamAdmin(admin.ModelAdmin):
         return obj.examsession_set.count()
     session_count.short_description = 'Sessions'
 
+    def regrade_exams(self, request, queryset):
+        # Satu pesan per exam; daftar lengkap lewat command regrade_exam
+        for exam in queryset:
+            report = regrade_exam(exam)
+            message = (
+                f'"{exam.title}": {report.sessions_changed}/{report.sessions} sessions regraded, '
+                f'{len(report.newly_passed)} now passed, {len(report.newly_failed)} now failed'
+            )
+            if report.pass_changes:
+                shown = report.pass_changes[:REGRADE_MESSAGE_NAMES]
+                names = ', '.join(
+                    f'{change.username} ({"passed" if change.passed else "failed"})' for change in shown
+                )
+                hidden = len(report.pass_changes) - len(shown)
+                if hidden:
+                    names += (
+                        f' and {hidden} more. Run "manage.py regrade_exam {exam.pk}" instead of this '
+                        f'action to get the full list'
+                    )
+                message += f': {names}'
+            self.message_user(
+                request, message, messages.WARNING if report.newly_failed else messages.SUCCESS,
+            )
+    regrade_exams.short_description = 'Regrade selected exams'
+
 
 # =========================
 # QUESTION ADMIN
@@ -204,7 +218,7 @@ class ExamSessionAdmin(admin.ModelAdmin):
     list_display = ('user', 'exam', 'status', 'score', 'start_time', 'time_spent_display', 'is_passed')
     list_filter = ('status', 'exam', 'start_time')
     search_fields = ('user__username', 'exam__title')
-    readonly_fields = ('session_id', 'start_time', 'end_time', 'submitted_at')
+    readonly_fields = ('session_id', 'start_time', 'deadline', 'end_time', 'submitted_at')
     actions = ['delete_selected']
 
     def time_spent_display(self, obj):
@@ -253,6 +267,27 @@ class QuestionBankAdmin(admin.ModelAdmin):
     question_count.short_description = 'Questions'
 
 
+# =========================
+# SYSTEM STATS ADMIN
+# =========================
+@admin.register(SystemStats, site=admin_site)
+class SystemStatsAdmin(admin.ModelAdmin):
+    list_display = ('total_users', 'total_exams', 'total_sessions', 'active_sessions', 'updated_at', 'reconciled_at')
+    actions = ['reconcile']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def reconcile(self, request, queryset):
+        stats = reconcile_system_stats()
+        reconcile_all_exam_stats()
+        self.message_user(request, f'System and exam stats reconciled at {stats.reconciled_at:%Y-%m-%d %H:%M:%S}', messages.SUCCESS)
+    reconcile.short_description = 'Reconcile system stats'
+
+
 # =========================
 # OTHER MODELS
 # =========================
@@ -0,0 +1,214 @@
+"""
+Item analysis satu exam: tingkat kesukaran, daya beda, dan efektivitas
+pengecoh per soal.
+
+Semua jawaban session yang sudah selesai dimuat dengan jumlah query tetap
+(soal, pilihan, session, UserAnswer + ``selected_choices``) ke matrix NumPy students × items berisi skor item 0..1
+(``points_earned / points``; belum dijawab = 0, belum dinilai = NaN), lalu:
+
+- ``p_value``: rata-rata skor item (indeks kesukaran, makin tinggi makin mudah)
+- ``point_biserial``: korelasi skor item dengan skor total tanpa item itu
+- ``discrimination``: rata-rata skor item kelompok atas 27% dikurangi
+  kelompok bawah 27% (diurutkan berdasarkan total poin)
+- ``share`` per Choice: proporsi peserta yang memilihnya, juga untuk
+  kelompok atas/bawah
+
+Hasil di-cache per exam; key ikut berubah kalau soal diedit (versi exam)
+atau ada session yang selesai/dinilai ulang (ExamStats.updated_at).
+"""
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .caching import exam_version
+from .models import Choice, ExamSession, ExamStats, UserAnswer
+from .stats import reconcile_exam_stats
+
+GROUP_FRACTION = 0.27
+CHOICE_TYPES = ('MC', 'MCA', 'TF')
+
+# Batas untuk menandai soal yang perlu ditinjau
+EASY_P = 0.9
+HARD_P = 0.2
+WEAK_DISCRIMINATION = 0.2
+
+
+def _index(keys, values):
+    """Posisi ``values`` di array ``keys`` yang sudah urut, -1 kalau tidak ada"""
+    if not len(keys):
+        return np.full(len(values), -1, dtype=np.int64)
+    positions = np.searchsorted(keys, values)
+    positions[positions >= len(keys)] = 0
+    return np.where(keys[positions] == values, positions, -1)
+
+
+def _round(value, digits=3):
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+def _label(index):
+    return chr(ord('A') + index) if index < 26 else str(index + 1)
+
+
+def load_responses(exam):
+    """
+    Data mentah untuk ``analyze`` dalam 4 query, tanpa query per session/soal.
+    Jawaban dan pilihannya diambil sekaligus (LEFT JOIN ``selected_choices``),
+    jadi jawaban MCA muncul sekali per pilihan.
+    """
+    questions = list(exam.questions.order_by('created_at', 'id').values_list('id', 'question_type', 'points'))
+    session_ids = np.fromiter(
+        ExamSession.objects.filter(exam=exam, is_completed=True).order_by('id').values_list('id', flat=True),
+        dtype=np.int64,
+    )
+    # None (belum dinilai / tanpa pilihan) menjadi NaN
+    responses = np.array(list(UserAnswer.objects.filter(
+        session__exam=exam, session__is_completed=True,
+    ).values_list('session_id', 'question_id', 'points_earned', 'selected_choices')), dtype=np.float64).reshape(-1, 4)
+    choices = list(Choice.objects.filter(question__exam=exam).order_by('question_id', 'order', 'id').values_list(
+        'id', 'question_id', 'text', 'is_correct',
+    ))
+    return session_ids, questions, responses, choices
+
+
+def analyze(session_ids, questions, responses, choices):
+    """
+    Hitung statistik item dari data ``load_responses``. ``responses`` adalah
+    array (session_id, question_id, points_earned, choice_id), NaN untuk
+    poin yang belum dinilai dan jawaban tanpa pilihan.
+    """
+    n, m = len(session_ids), len(questions)
+    question_ids = np.array([question_id for question_id, _, _ in questions], dtype=np.int64)
+    max_points = np.array([points for _, _, points in questions], dtype=np.float64)
+    order = np.argsort(question_ids)
+
+    rows = _index(session_ids, responses[:, 0].astype(np.int64))
+    cols = _index(question_ids[order], responses[:, 1].astype(np.int64))
+    known = (rows >= 0) & (cols >= 0)
+    responses, rows, cols = responses[known], rows[known], order[cols[known]]
+
+    # Poin per sel: belum dijawab = 0, belum dinilai = NaN
+    points = np.zeros((n, m))
+    points[rows, cols] = responses[:, 2]
+    touched = np.zeros((n, m), dtype=bool)
+    touched[rows, cols] = True
+    answered = touched.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.clip(points / np.where(max_points > 0, max_points, np.nan), 0, 1)
+    scores[np.isnan(points)] = np.nan
+    valid = ~np.isnan(scores)
+    filled = np.where(valid, scores, 0.0)
+    totals = np.nansum(points, axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        count = valid.sum(axis=0)
+        p_values = filled.sum(axis=0) / count
+
+        # Point-biserial terkoreksi: skor item vs total tanpa item itu
+        rest = np.where(valid, totals[:, None] - np.nan_to_num(points), 0.0)
+        mean_x = p_values
+        mean_r = rest.sum(axis=0) / count
+        cov = (filled * rest).sum(axis=0) / count - mean_x * mean_r
+        var_x = (filled ** 2).sum(axis=0) / count - mean_x ** 2
+        var_r = (rest ** 2).sum(axis=0) / count - mean_r ** 2
+        denominator = np.sqrt(var_x * var_r)
+        point_biserial = np.where(denominator > 1e-12, cov / denominator, np.nan)
+
+        # Kelompok atas/bawah 27% berdasarkan total poin
+        group = int(np.ceil(GROUP_FRACTION * n)) if n >= 2 else 0
+        ranking = np.argsort(totals, kind='stable')
+        lower, upper = ranking[:group], ranking[n - group:]
+        if group:
+            discrimination = (
+                filled[upper].sum(axis=0) / valid[upper].sum(axis=0)
+                - filled[lower].sum(axis=0) / valid[lower].sum(axis=0)
+            )
+        else:
+            discrimination = np.full(m, np.nan)
+
+    # Proporsi pemilih setiap Choice (seluruh peserta, kelompok atas, kelompok bawah)
+    choice_ids = np.array([choice[0] for choice in choices], dtype=np.int64)
+    picked = ~np.isnan(responses[:, 3])
+    selected_rows = rows[picked]
+    selected_choices = _index(choice_ids, responses[picked, 3].astype(np.int64))
+    keep = selected_choices >= 0
+    selected_rows, selected_choices = selected_rows[keep], selected_choices[keep]
+    in_upper = np.zeros(n, dtype=bool)
+    in_upper[upper] = True
+    in_lower = np.zeros(n, dtype=bool)
+    in_lower[lower] = True
+    k = len(choice_ids)
+    picks = np.bincount(selected_choices, minlength=k)
+    upper_picks = np.bincount(selected_choices[in_upper[selected_rows]], minlength=k)
+    lower_picks = np.bincount(selected_choices[in_lower[selected_rows]], minlength=k)
+
+    choices_by_question = {}
+    for i, (choice_id, question_id, text, is_correct) in enumerate(choices):
+        options = choices_by_question.setdefault(question_id, [])
+        options.append({
+            'id': choice_id,
+            'label': _label(len(options)),
+            'text': text,
+            'is_correct': is_correct,
+            'share': _round(picks[i] / n) if n else None,
+            'upper_share': _round(upper_picks[i] / group) if group else None,
+            'lower_share': _round(lower_picks[i] / group) if group else None,
+        })
+
+    items = []
+    for j, (question_id, question_type, question_points) in enumerate(questions):
+        item = {
+            'question_id': question_id,
+            'number': j + 1,
+            'type': question_type,
+            'points': question_points,
+            'answered': int(answered[j]),
+            'p_value': _round(p_values[j]),
+            'point_biserial': _round(point_biserial[j]),
+            'discrimination': _round(discrimination[j]),
+            'choices': choices_by_question.get(question_id, []) if question_type in CHOICE_TYPES else [],
+        }
+        item['flags'] = _flags(item)
+        items.append(item)
+    return {'sessions': n, 'items': items}
+
+
+def _flags(item):
+    flags = []
+    if item['p_value'] is not None:
+        if item['p_value'] >= EASY_P:
+            flags.append('too easy')
+        elif item['p_value'] <= HARD_P:
+            flags.append('too hard')
+    if item['discrimination'] is not None and item['discrimination'] < WEAK_DISCRIMINATION:
+        flags.append('negative discrimination' if item['discrimination'] < 0 else 'weak discrimination')
+    # Pengecoh yang lebih banyak dipilih kelompok atas daripada kelompok bawah
+    for choice in item['choices']:
+        if not choice['is_correct'] and (choice['upper_share'] or 0) > (choice['lower_share'] or 0):
+            flags.append(f'distractor {choice["label"]} attracts top scorers')
+    return flags
+
+
+def build_item_analysis(exam):
+    return analyze(*load_responses(exam))
+
+
+def _cache_key(exam):
+    stamp = ExamStats.objects.filter(exam=exam).values_list('updated_at', flat=True).first()
+    if stamp is None:
+        stamp = reconcile_exam_stats(exam).updated_at
+    return f'item_analysis:{exam.pk}:{exam_version(exam)}:{int(stamp.timestamp() * 1_000_000)}'
+
+
+def get_item_analysis(exam):
+    """``{'sessions', 'items'}`` untuk ``exam``, dari cache kalau masih berlaku"""
+    key = _cache_key(exam)
+    analysis = cache.get(key)
+    if analysis is None:
+        analysis = build_item_analysis(exam)
+        cache.set(key, analysis, settings.ITEM_ANALYSIS_TIMEOUT)
+    return analysis
+
+
+def item_for_question(analysis, question_id):
+    return next((item for item in analysis['items'] if item['question_id'] == question_id), None)
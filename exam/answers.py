@@ -0,0 +1,386 @@
+"""
+Penyimpanan jawaban student selama ujian berlangsung.
+
+Client mengirim delta kecil ``{question_id, choice_ids, seq}`` (ditambah
+``text`` untuk isian dan ``matching`` untuk menjodohkan/mengurutkan). ``seq``
+naik terus per session, jadi delta yang sama boleh dikirim ulang (retry, tab
+ganda, pindah device) tanpa menimpa jawaban yang lebih baru.
+
+Delta tidak langsung ditulis ke database. Delta di-append ke spool file per
+``ExamSession.session_id`` (write-behind buffer), lalu flusher menggabungkan
+semuanya ke state terakhir per soal dan menulisnya dengan bulk query. Flush
+terjadi paling sering sekali per ``ANSWER_FLUSH_INTERVAL`` per session, lewat
+command ``flush_answers``, dan selalu dipaksa saat submit / timeout.
+
+Spool file butuh ``fcntl.flock`` (POSIX). Di platform tanpa fcntl (Windows)
+delta langsung ditulis ke database seperti sebelum ada buffer.
+"""
+import json
+import os
+import time
+import uuid
+from collections import namedtuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .caching import get_exam_payload
+from .models import ExamSession, UserAnswer
+
+SPOOL_SUFFIX = '.jsonl'
+FLUSHING_SUFFIX = '.flushing'
+
+# File .flushing yang lebih tua dari ini dianggap sisa flusher yang crash
+STALE_FLUSH_SECONDS = 300
+
+MAX_TEXT_ANSWER = 2000
+
+# Satu delta dari client, dan state terakhir satu jawaban
+Delta = namedtuple('Delta', 'question_id choice_ids seq text matching')
+AnswerState = namedtuple('AnswerState', 'choice_ids seq text matching')
+# Jawaban yang sudah ada di database
+StoredAnswer = namedtuple('StoredAnswer', 'answer_pk seq choice_ids text matching points')
+
+
+def parse_deltas(raw):
+    """Validasi bentuk delta dari request body -> list of Delta"""
+    if not isinstance(raw, list):
+        raise ValueError('deltas must be a list')
+
+    deltas = []
+    for item in raw:
+        if not isinstance(item, dict):
+            raise ValueError('each delta must be an object')
+        choice_ids = item.get('choice_ids') or []
+        if not isinstance(choice_ids, list):
+            raise ValueError('choice_ids must be a list')
+        text = item.get('text')
+        if text is not None and not isinstance(text, str):
+            raise ValueError('text must be a string')
+        matching = item.get('matching')
+        if matching is not None and not isinstance(matching, (dict, list)):
+            raise ValueError('matching must be an object or a list')
+        try:
+            deltas.append(Delta(
+                int(item['question_id']),
+                sorted({int(c) for c in choice_ids}),
+                int(item['seq']),
+                text[:MAX_TEXT_ANSWER] if text is not None else None,
+                matching,
+            ))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('delta needs integer question_id and seq')
+    return deltas
+
+
+def coalesce_deltas(deltas):
+    """Ambil state terakhir per soal: {question_id: AnswerState}"""
+    latest = {}
+    for delta in deltas:
+        current = latest.get(delta.question_id)
+        if current is None or delta.seq > current.seq:
+            latest[delta.question_id] = AnswerState(delta.choice_ids, delta.seq, delta.text, delta.matching)
+    return latest
+
+
+def filter_valid_deltas(exam, deltas):
+    """Buang delta untuk soal/pilihan yang bukan milik exam ini"""
+    allowed = valid_choices(exam)
+    return [
+        delta for delta in deltas
+        if delta.question_id in allowed and set(delta.choice_ids) <= allowed[delta.question_id]
+    ]
+
+
+def valid_choices(exam):
+    """{question_id: set(choice_id)} dari payload exam yang sudah di-cache"""
+    return {
+        question['id']: {option['id'] for option in question['options']}
+        for question in get_exam_payload(exam)
+    }
+
+
+# ===== SPOOL FILE =====
+def _spool_dir():
+    path = settings.ANSWER_SPOOL_DIR
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _spool_path(session_uuid):
+    return os.path.join(_spool_dir(), f'{session_uuid}{SPOOL_SUFFIX}')
+
+
+def buffer_answer_deltas(session, deltas):
+    """
+    Append delta yang valid ke spool file session. Return jumlah delta yang
+    diterima. Soal/pilihan yang bukan milik exam ini dibuang di sini, jadi
+    flusher tidak perlu memvalidasi ulang.
+    """
+    valid = filter_valid_deltas(session.exam, deltas)
+    if not valid:
+        return 0
+    if fcntl is None:
+        # Tanpa file lock spool tidak aman dipakai, tulis langsung
+        write_answer_states({
+            (session.pk, question_id): state for question_id, state in coalesce_deltas(valid).items()
+        })
+        return len(valid)
+
+    accepted = [list(delta) for delta in valid]
+    line = json.dumps(accepted, separators=(',', ':')) + '\n'
+    path = _spool_path(session.session_id)
+    while True:
+        with open(path, 'a') as spool:
+            fcntl.flock(spool, fcntl.LOCK_EX)
+            # Kalau file sudah di-rename flusher sebelum lock didapat,
+            # tulis ulang ke file baru supaya delta tidak ikut terhapus
+            try:
+                same_file = os.fstat(spool.fileno()).st_ino == os.stat(path).st_ino
+            except FileNotFoundError:
+                same_file = False
+            if same_file:
+                spool.write(line)
+                return len(accepted)
+
+
+def maybe_flush(session):
+    """Flush buffer session ini kalau sudah lewat ANSWER_FLUSH_INTERVAL"""
+    if cache.add(f'answer_flush:{session.session_id}', 1, settings.ANSWER_FLUSH_INTERVAL):
+        flush_answer_buffers([session.session_id])
+
+
+def _claim_spool_files(session_uuids=None):
+    """Rename spool file jadi .flushing supaya delta baru masuk ke file baru"""
+    spool_dir = _spool_dir()
+    if session_uuids is not None:
+        names = [f'{session_uuid}{SPOOL_SUFFIX}' for session_uuid in session_uuids]
+    else:
+        names = [name for name in os.listdir(spool_dir) if name.endswith(SPOOL_SUFFIX)]
+
+    claimed = []
+    for name in names:
+        source = os.path.join(spool_dir, name)
+        target = os.path.join(spool_dir, f'{name[:-len(SPOOL_SUFFIX)]}.{uuid.uuid4().hex}{FLUSHING_SUFFIX}')
+        try:
+            os.replace(source, target)
+        except FileNotFoundError:
+            continue
+        claimed.append(target)
+
+    if session_uuids is None:
+        # Sisa flusher yang mati di tengah jalan
+        cutoff = time.time() - STALE_FLUSH_SECONDS
+        for name in os.listdir(spool_dir):
+            path = os.path.join(spool_dir, name)
+            if name.endswith(FLUSHING_SUFFIX) and path not in claimed and os.path.getmtime(path) < cutoff:
+                claimed.append(path)
+    return claimed
+
+
+def _read_spool_file(path):
+    with open(path) as spool:
+        # Tunggu writer yang sempat membuka file sebelum di-rename
+        if fcntl is not None:
+            fcntl.flock(spool, fcntl.LOCK_EX)
+        deltas = []
+        for line in spool:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                # Baris lama hanya berisi (question_id, choice_ids, seq)
+                deltas.extend(Delta(*(list(delta) + [None, None])[:5]) for delta in json.loads(line))
+            except (ValueError, TypeError):
+                # Baris terpotong (proses mati saat menulis) dilewati saja
+                continue
+    return deltas
+
+
+def read_buffered_states(session_uuids=None):
+    """
+    Ambil alih spool file dan gabungkan isinya.
+
+    Return ``(states, files)``: ``states`` berbentuk
+    ``{(session_pk, question_id): AnswerState}``, ``files`` harus
+    dihapus lewat ``discard_spool_files`` setelah states tersimpan.
+    """
+    files = _claim_spool_files(session_uuids)
+    if not files:
+        return {}, []
+
+    deltas_by_session = {}
+    for path in files:
+        session_uuid = os.path.basename(path).split('.', 1)[0]
+        deltas_by_session.setdefault(session_uuid, []).extend(_read_spool_file(path))
+
+    session_ids = dict(
+        ExamSession.objects.filter(session_id__in=list(deltas_by_session)).values_list('session_id', 'id')
+    )
+    states = {}
+    for session_uuid, deltas in deltas_by_session.items():
+        session_pk = session_ids.get(uuid.UUID(session_uuid))
+        if session_pk is None:
+            continue
+        for question_id, state in coalesce_deltas(deltas).items():
+            states[(session_pk, question_id)] = state
+    return states, files
+
+
+def discard_spool_files(files):
+    for path in files:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def flush_answer_buffers(session_uuids=None):
+    """
+    Tulis semua delta yang masih di spool ke UserAnswer secara bulk.
+
+    ``session_uuids=None`` berarti semua session. Return jumlah jawaban
+    yang ditulis.
+    """
+    states, files = read_buffered_states(session_uuids)
+    if not files:
+        return 0
+
+    written = write_answer_states(states)
+    discard_spool_files(files)
+    return written
+
+
+def load_answer_states(session_pks):
+    """
+    Jawaban tersimpan dalam bentuk
+    ``{(session_pk, question_id): StoredAnswer}`` (2 query)
+    """
+    stored = {}
+    answer_keys = {}
+    for answer_pk, session_pk, question_id, seq, text, matching, points in UserAnswer.objects.filter(
+        session_id__in=session_pks
+    ).values_list(
+        'id', 'session_id', 'question_id', 'client_seq', 'text_answer', 'matching_data', 'points_earned'
+    ):
+        stored[(session_pk, question_id)] = StoredAnswer(answer_pk, seq, [], text, matching, points)
+        answer_keys[answer_pk] = (session_pk, question_id)
+
+    through = UserAnswer.selected_choices.through
+    for answer_pk, choice_id in through.objects.filter(
+        useranswer__session_id__in=session_pks
+    ).values_list('useranswer_id', 'choice_id'):
+        stored[answer_keys[answer_pk]].choice_ids.append(choice_id)
+    return stored
+
+
+def write_answer_states(states, grades=None, existing=None):
+    """
+    Bulk upsert ``{(session_pk, question_id): AnswerState}`` ke UserAnswer +
+    tabel through ``selected_choices``. State dengan seq yang tidak lebih
+    baru dari yang tersimpan diabaikan.
+
+    ``grades`` (opsional) berisi ``{(session_pk, question_id): (is_correct,
+    points_earned)}`` dan ikut ditulis dalam query upsert yang sama.
+    ``existing`` boleh diisi hasil ``load_answer_states`` supaya tidak query
+    ulang. Return jumlah jawaban yang berubah.
+    """
+    grades = grades or {}
+    if not states and not grades:
+        return 0
+
+    with transaction.atomic():
+        if existing is None:
+            session_pks = {key[0] for key in states}
+            question_ids = {key[1] for key in states}
+            existing = {
+                (session_pk, question_id): StoredAnswer(answer_pk, seq, None, text, matching, None)
+                for answer_pk, session_pk, question_id, seq, text, matching in UserAnswer.objects.filter(
+                    session_id__in=session_pks, question_id__in=question_ids
+                ).values_list('id', 'session_id', 'question_id', 'client_seq', 'text_answer', 'matching_data')
+            }
+
+        fresh = {
+            key: state for key, state in states.items()
+            if key not in existing or existing[key].seq < state.seq
+        }
+        rows = set(fresh) | set(grades)
+        if not rows:
+            return 0
+
+        update_fields = ['client_seq', 'text_answer', 'matching_data']
+        if grades:
+            update_fields += ['is_correct', 'points_earned']
+
+        answers = []
+        for key in rows:
+            session_pk, question_id = key
+            # Baris yang hanya dinilai ulang tetap memakai isi yang tersimpan
+            state = fresh[key] if key in fresh else existing[key]
+            is_correct, points_earned = grades.get(key, (None, None))
+            answers.append(UserAnswer(
+                session_id=session_pk,
+                question_id=question_id,
+                client_seq=state.seq,
+                text_answer=state.text,
+                matching_data=state.matching,
+                is_correct=is_correct,
+                points_earned=points_earned,
+            ))
+        UserAnswer.objects.bulk_create(
+            answers,
+            update_conflicts=True,
+            unique_fields=['session', 'question'],
+            update_fields=update_fields,
+        )
+
+        if not fresh:
+            return 0
+
+        # bulk_create dengan update_conflicts tidak mengembalikan pk,
+        # jadi pk jawaban yang baru dibuat diambil ulang
+        answer_ids = {key: existing[key].answer_pk for key in fresh if key in existing}
+        created = [key for key in fresh if key not in existing]
+        if created:
+            answer_ids.update({
+                (session_pk, question_id): answer_pk
+                for answer_pk, session_pk, question_id in UserAnswer.objects.filter(
+                    session_id__in={key[0] for key in created},
+                    question_id__in={key[1] for key in created},
+                ).values_list('id', 'session_id', 'question_id')
+                if (session_pk, question_id) in fresh
+            })
+
+        through = UserAnswer.selected_choices.through
+        through.objects.filter(useranswer_id__in=list(answer_ids.values())).delete()
+        through.objects.bulk_create([
+            through(useranswer_id=answer_ids[key], choice_id=choice_id)
+            for key, state in fresh.items()
+            for choice_id in state.choice_ids
+        ])
+
+    return len(fresh)
+
+
+def load_saved_answers(session):
+    """
+    Jawaban yang sudah tersimpan untuk resume take_exam:
+    ``({question_id: {'choice_ids', 'text', 'matching'}}, seq terakhir)``
+    """
+    stored = load_answer_states([session.pk])
+    answers = {
+        question_id: {
+            'choice_ids': answer.choice_ids,
+            'text': answer.text,
+            'matching': answer.matching,
+        }
+        for (_, question_id), answer in stored.items()
+    }
+    last_seq = max((answer.seq for answer in stored.values()), default=0)
+    return answers, last_seq
@@ -0,0 +1,181 @@
+"""
+Cache untuk data ujian yang sudah "dikompilasi" (payload soal, dll).
+
+Dua tingkat: LRU in-process per worker di depan Django cache (shared tier).
+Setiap key menyertakan versi konten exam (``Exam.updated_at``, yang ikut
+di-bump setiap kali Question/Choice milik exam tersebut disimpan), jadi
+entry lama otomatis tidak terpakai lagi setelah soal diedit.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Backend yang isinya hanya terlihat oleh satu proses worker
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_shared(alias='default'):
+    """True kalau cache ``alias`` dibagi antar proses (Redis, Memcached, database, file)"""
+    return settings.CACHES[alias]['BACKEND'] not in PROCESS_LOCAL_CACHES
+
+
+class LRUCache:
+    """LRU sederhana yang thread-safe untuk satu proses worker."""
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def exam_version(exam):
+    """Versi konten exam, dipakai sebagai bagian dari cache key."""
+    if not exam.updated_at:
+        return '0'
+    return str(int(exam.updated_at.timestamp() * 1_000_000))
+
+
+class ExamCache:
+    """
+    Cache per exam per versi: LRU lokal -> Django cache -> ``builder(exam)``.
+
+    Nilai yang dikembalikan dipakai bersama oleh semua request, jadi
+    pemanggil tidak boleh memodifikasinya.
+    """
+
+    def __init__(self, namespace, builder, maxsize=None, timeout=None):
+        self.namespace = namespace
+        self.builder = builder
+        self.timeout = timeout
+        self.local = LRUCache(maxsize or getattr(settings, 'EXAM_CACHE_LRU_SIZE', 64))
+
+    def key(self, exam):
+        return f'{self.namespace}:{exam.pk}:{exam_version(exam)}'
+
+    def get(self, exam):
+        key = self.key(exam)
+        value = self.local.get(key)
+        if value is not None:
+            return value
+
+        value = cache.get(key)
+        if value is None:
+            value = self.builder(exam)
+            timeout = self.timeout or getattr(settings, 'EXAM_CACHE_TIMEOUT', 60 * 60 * 6)
+            cache.set(key, value, timeout)
+
+        self.local.set(key, value)
+        return value
+
+    def invalidate(self, exam_id):
+        # Entry shared dengan versi lama cukup dibiarkan expire sendiri,
+        # karena versi baru selalu menghasilkan key yang berbeda.
+        self.local.delete_prefix(f'{self.namespace}:{exam_id}:')
+
+
+_registry = []
+
+
+def register(namespace, builder, **kwargs):
+    exam_cache = ExamCache(namespace, builder, **kwargs)
+    _registry.append(exam_cache)
+    return exam_cache
+
+
+def invalidate_exam(exam_id):
+    """Buang semua data compiled milik exam ini dari LRU lokal."""
+    for exam_cache in _registry:
+        exam_cache.invalidate(exam_id)
+
+
+# ===== PAYLOAD SOAL UNTUK take_exam =====
+def _question_options(question):
+    """
+    Pilihan yang boleh dilihat student. Isian (FB) tidak menampilkan pilihan
+    karena isinya kunci jawaban; menjodohkan (MAT) hanya menampilkan sisi
+    kiri, sisi kanan diacak terpisah sebagai ``targets``.
+    """
+    choices = list(question.choices.all())
+    if question.question_type == 'FB':
+        return [], None
+    if question.question_type == 'MAT':
+        options, targets = [], []
+        for choice in choices:
+            left, right = choice.split_pair(choice.text)
+            options.append({'id': choice.id, 'text': left})
+            if right:
+                targets.append(right)
+        return options, sorted(targets, key=str.casefold)
+    return [{'id': choice.id, 'text': choice.text} for choice in choices], None
+
+
+def build_exam_payload(exam):
+    """Serialisasi semua soal + pilihan exam (tanpa kunci jawaban)."""
+    payload = []
+    for question in exam.questions.all().prefetch_related('choices'):
+        options, targets = _question_options(question)
+        item = {
+            'id': question.id,
+            'type': question.question_type,
+            'text': question.text,
+            'image': question.image.url if question.image else None,
+            'options': options,
+        }
+        if targets is not None:
+            item['targets'] = targets
+        payload.append(item)
+    return payload
+
+
+exam_payload_cache = register('exam_payload', build_exam_payload)
+
+
+def get_exam_payload(exam):
+    return exam_payload_cache.get(exam)
+
+
+# ===== KOMPOSISI SOAL UNTUK exam_details =====
+def build_exam_composition(exam):
+    """Jumlah soal per tipe dan per tingkat kesulitan (satu query)."""
+    types, difficulties = {}, {}
+    rows = exam.questions.order_by().values_list('question_type', 'difficulty')
+    for question_type, difficulty in rows:
+        types[question_type] = types.get(question_type, 0) + 1
+        difficulties[difficulty] = difficulties.get(difficulty, 0) + 1
+    return {'count': len(rows), 'types': types, 'difficulty': difficulties}
+
+
+exam_composition_cache = register('exam_composition', build_exam_composition)
+
+
+def get_exam_composition(exam):
+    return exam_composition_cache.get(exam)
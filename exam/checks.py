@@ -0,0 +1,18 @@
+from django.core.checks import Tags, Warning, register
+
+from .caching import cache_is_shared
+
+
+@register(Tags.caches)
+def shared_cache_check(app_configs, **kwargs):
+    """Heartbeat presence disimpan di cache dan di-flush dari proses lain (lihat exam/presence.py)"""
+    if cache_is_shared():
+        return []
+    return [Warning(
+        'The default cache is process-local (LocMemCache/DummyCache).',
+        hint=(
+            'Heartbeat presence and the flush_heartbeats command need a cache shared by all '
+            'processes. Use Redis or Memcached when running more than one web worker.'
+        ),
+        id='exam.W001',
+    )]
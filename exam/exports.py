@@ -0,0 +1,150 @@
+"""
+Export CSV yang di-stream dan export XLSX di background.
+
+Baris diambil dengan ``values_list().iterator(chunk_size)`` (tanpa membuat
+instance model) dan dikirim per potongan lewat StreamingHttpResponse,
+jadi memori worker tetap datar berapa pun jumlah barisnya. Waktu sampai
+byte pertama dan total durasi dicatat ke logger ``exam.exports``.
+
+XLSX ditulis dengan mode ``constant_memory`` xlsxwriter ke file di
+JOB_OUTPUT_DIR oleh job (exam/jobs.py), bukan di dalam request.
+"""
+import csv
+import io
+import logging
+import time
+
+import xlsxwriter
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import ExamToken
+
+logger = logging.getLogger('exam.exports')
+
+
+def iter_values(queryset, fields, chunk_size=None):
+    """Tuple nilai per baris, diambil per chunk dari database"""
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    return queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+def _csv_chunks(name, header, rows, chunk_size, started):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    count = 0
+    first = True
+
+    def drain():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return data
+
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % chunk_size == 0:
+            if first:
+                logger.info('%s: first byte after %.3fs', name, time.monotonic() - started)
+                first = False
+            yield drain()
+
+    if first:
+        logger.info('%s: first byte after %.3fs', name, time.monotonic() - started)
+    yield drain()
+    logger.info('%s: %d rows in %.3fs', name, count, time.monotonic() - started)
+
+
+def stream_csv(filename, header, rows, chunk_size=None):
+    """
+    StreamingHttpResponse CSV dari iterable ``rows``. ``filename`` tanpa
+    ekstensi, timestamp ditambahkan otomatis.
+    """
+    started = time.monotonic()
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    response = StreamingHttpResponse(
+        _csv_chunks(filename, header, rows, chunk_size, started),
+        content_type='text/csv',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{timestamped(filename, "csv")}"'
+    return response
+
+
+def write_xlsx(path, sheet_name, header, rows, widths=None, progress=None, progress_every=None):
+    """
+    Tulis ``rows`` ke file XLSX di ``path`` dengan mode constant_memory
+    (baris langsung di-flush ke disk, jadi harus ditulis berurutan).
+    ``progress(count)`` dipanggil tiap ``progress_every`` baris. Return jumlah baris.
+    """
+    started = time.monotonic()
+    progress_every = progress_every or settings.EXPORT_CHUNK_SIZE
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'default_date_format': 'yyyy-mm-dd hh:mm'})
+    try:
+        worksheet = workbook.add_worksheet(sheet_name)
+        header_format = workbook.add_format({
+            'bold': True,
+            'bg_color': '#4F46E5',
+            'font_color': 'white',
+            'border': 1
+        })
+        for col, width in (widths or {}).items():
+            worksheet.set_column(col, col, width)
+        worksheet.write_row(0, 0, header, header_format)
+
+        count = 0
+        for count, row in enumerate(rows, start=1):
+            worksheet.write_row(count, 0, row)
+            if progress and count % progress_every == 0:
+                progress(count)
+    finally:
+        workbook.close()
+    logger.info('%s: %d rows written to xlsx in %.3fs', sheet_name, count, time.monotonic() - started)
+    return count
+
+
+def timestamped(filename, extension):
+    return f'{filename}_{timezone.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+
+
+# ========== TOKEN EXPORT ==========
+
+TOKEN_HEADER = ['Token', 'Exam', 'Status', 'Created By', 'Created At', 'Expires At', 'Usage', 'Max Usage', 'Global']
+
+
+def token_rows(usage_format='{used}/{max}'):
+    """Baris export token (terbaru dulu), tanpa membuat instance model"""
+    statuses = dict(ExamToken.TOKEN_STATUS)
+    tokens = iter_values(
+        ExamToken.objects.order_by('-created_at'),
+        ['token', 'exam__title', 'status', 'created_by__username', 'created_at',
+         'expires_at', 'used_count', 'max_usage', 'is_global'],
+    )
+    for token, exam_title, status, created_by, created_at, expires_at, used_count, max_usage, is_global in tokens:
+        yield [
+            token,
+            exam_title,
+            statuses.get(status, status),
+            created_by,
+            created_at.strftime('%Y-%m-%d %H:%M'),
+            expires_at.strftime('%Y-%m-%d %H:%M'),
+            usage_format.format(used=used_count, max=max_usage),
+            max_usage,
+            'Yes' if is_global else 'No'
+        ]
+
+
+def export_tokens_xlsx(job):
+    """Job: semua token ke XLSX"""
+    total = ExamToken.objects.count()
+    job.progress(0, total, force=True)
+    path = job.path('.xlsx')
+    count = write_xlsx(
+        path, 'Tokens', TOKEN_HEADER, token_rows('{used}'),
+        widths={0: 12, 1: 30, 2: 12, 3: 15, 4: 18, 5: 18},
+        progress=job.progress,
+    )
+    job.progress(count, force=True)
+    job.finish(path, timestamped('exam_tokens', 'xlsx'))
@@ -0,0 +1,163 @@
+"""
+Gradebook satu exam: satu baris per ExamSession, satu kolom per soal.
+
+Data diambil dengan jumlah query tetap (soal, pilihan, session,
+UserAnswer, tabel through ``selected_choices``) lalu di-pivot ke matrix
+NumPy berukuran sessions × soal, tanpa query per sel. Isi sel:
+
+- ``answers``: huruf pilihan untuk MC/MCA/TF, teks untuk FB, poin untuk
+  tipe lain
+- ``points``: poin yang didapat untuk semua soal
+
+Matrix dipakai bersama oleh export CSV (stream) dan XLSX (background job).
+"""
+import numpy as np
+
+from .exports import timestamped, write_xlsx
+from .models import Choice, Exam, ExamSession, UserAnswer
+
+MODES = ('answers', 'points')
+CHOICE_TYPES = ('MC', 'MCA', 'TF')
+TEXT_TYPES = ('FB',)
+
+SESSION_COLUMNS = ['Username', 'Name', 'Attempt', 'Status', 'Started']
+TOTAL_COLUMNS = ['Total Points', 'Score (%)', 'Answered', 'Correct', 'Wrong']
+
+
+def _letter(index):
+    return chr(ord('A') + index) if index < 26 else str(index + 1)
+
+
+def _number(value):
+    """Poin sebagai int kalau bulat, supaya CSV/XLSX rapi"""
+    value = round(float(value), 2)
+    return int(value) if value.is_integer() else value
+
+
+class Gradebook:
+    __slots__ = ('exam', 'mode', 'questions', 'sessions', 'cells', 'totals')
+
+    def __init__(self, exam, mode, questions, sessions, cells, totals):
+        self.exam = exam
+        self.mode = mode
+        self.questions = questions
+        self.sessions = sessions
+        self.cells = cells
+        self.totals = totals
+
+    def __len__(self):
+        return len(self.sessions)
+
+    @property
+    def header(self):
+        columns = [f'Q{i} ({question_type})' for i, (_, question_type, _) in enumerate(self.questions, start=1)]
+        return SESSION_COLUMNS + columns + TOTAL_COLUMNS
+
+    def rows(self):
+        statuses = dict(ExamSession.SESSION_STATUS)
+        cells = self.cells.tolist()
+        for i, session in enumerate(self.sessions):
+            _, username, first_name, last_name, attempt, status, start_time, score, answered, correct, wrong = session
+            yield [
+                username,
+                f'{first_name} {last_name}'.strip() or username,
+                attempt,
+                statuses.get(status, status),
+                start_time.strftime('%Y-%m-%d %H:%M') if start_time else '',
+                *cells[i],
+                _number(self.totals[i]),
+                round(score, 2) if score is not None else '',
+                answered,
+                correct,
+                wrong,
+            ]
+
+
+def build_gradebook(exam, mode='answers'):
+    if mode not in MODES:
+        raise ValueError(f'Unknown gradebook mode: {mode}')
+
+    questions = list(exam.questions.order_by('created_at', 'id').values_list('id', 'question_type', 'points'))
+    question_index = {question_id: i for i, (question_id, _, _) in enumerate(questions)}
+    question_types = {question_id: question_type for question_id, question_type, _ in questions}
+
+    sessions = list(ExamSession.objects.filter(exam=exam).order_by('user__username', 'attempt_number').values_list(
+        'id', 'user__username', 'user__first_name', 'user__last_name', 'attempt_number', 'status', 'start_time',
+        'score', 'answered_questions', 'correct_answers', 'wrong_answers',
+    ))
+    session_index = {session[0]: i for i, session in enumerate(sessions)}
+    n, m = len(sessions), len(questions)
+
+    answers = [
+        row for row in UserAnswer.objects.filter(session__exam=exam).values_list(
+            'id', 'session_id', 'question_id', 'text_answer', 'points_earned',
+        )
+        if row[2] in question_index
+    ]
+    rows = np.fromiter((session_index[row[1]] for row in answers), dtype=np.int64, count=len(answers))
+    cols = np.fromiter((question_index[row[2]] for row in answers), dtype=np.int64, count=len(answers))
+
+    points = np.full((n, m), np.nan)
+    points[rows, cols] = np.fromiter(
+        (np.nan if row[4] is None else row[4] for row in answers), dtype=np.float64, count=len(answers),
+    )
+    totals = np.nansum(points, axis=1) if m else np.zeros(n)
+
+    cells = np.full((n, m), '', dtype=object)
+    if mode == 'points':
+        graded = ~np.isnan(points)
+        cells[graded] = [_number(value) for value in points[graded]]
+    else:
+        labels = _choice_labels(exam)
+        selected = {}
+        through = UserAnswer.selected_choices.through
+        for answer_pk, choice_id in through.objects.filter(
+            useranswer__session__exam=exam
+        ).values_list('useranswer_id', 'choice_id'):
+            selected.setdefault(answer_pk, []).append(labels.get(choice_id, '?'))
+
+        values = np.empty(len(answers), dtype=object)
+        for i, (answer_pk, _, question_id, text, earned) in enumerate(answers):
+            question_type = question_types[question_id]
+            if question_type in CHOICE_TYPES:
+                values[i] = ','.join(sorted(selected.get(answer_pk, ())))
+            elif question_type in TEXT_TYPES:
+                values[i] = text or ''
+            else:
+                values[i] = '' if earned is None else _number(earned)
+        cells[rows, cols] = values
+
+    return Gradebook(exam, mode, questions, sessions, cells, totals)
+
+
+def _choice_labels(exam):
+    """choice_id -> huruf (A, B, ...) sesuai urutan pilihan di soalnya"""
+    labels = {}
+    current, position = None, 0
+    for choice_id, question_id in Choice.objects.filter(question__exam=exam).order_by(
+        'question_id', 'order', 'id'
+    ).values_list('id', 'question_id'):
+        if question_id != current:
+            current, position = question_id, 0
+        labels[choice_id] = _letter(position)
+        position += 1
+    return labels
+
+
+def gradebook_filename(exam, mode):
+    return f'gradebook_{exam.pk}_{mode}'
+
+
+def export_gradebook_xlsx(job, exam_id, mode='answers'):
+    """Job: gradebook satu exam ke XLSX"""
+    exam = Exam.objects.get(pk=exam_id)
+    gradebook = build_gradebook(exam, mode)
+    job.progress(0, len(gradebook), force=True)
+    path = job.path('.xlsx')
+    count = write_xlsx(
+        path, 'Gradebook', gradebook.header, gradebook.rows(),
+        widths={0: 15, 1: 25, 2: 8, 3: 12, 4: 16},
+        progress=job.progress,
+    )
+    job.progress(count, force=True)
+    job.finish(path, timestamped(gradebook_filename(exam, mode), 'xlsx'))
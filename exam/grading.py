@@ -0,0 +1,444 @@
+"""
+Penilaian jawaban ujian secara bulk.
+
+Kunci jawaban exam di-compile sekali per versi exam, semua jawaban session
+dinilai di memori, lalu hasilnya ditulis dengan query bulk. Jumlah query per submit tetap,
+tidak bergantung pada jumlah soal.
+"""
+import unicodedata
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .answers import (
+    AnswerState, coalesce_deltas, discard_spool_files, filter_valid_deltas,
+    load_answer_states, read_buffered_states, write_answer_states,
+)
+from .caching import register
+from .models import Choice, ExamSession, Question, UserAnswer
+from .stats import invalidate_student_stats, record_sessions_completed
+
+
+# Jawaban yang dikirim/tersimpan untuk satu soal
+Response = namedtuple('Response', 'question_id choice_ids text matching stored_points')
+
+
+def normalize_text(value):
+    """Bentuk baku jawaban teks: NFKC, case-insensitive, spasi dirapikan"""
+    if value is None:
+        return ''
+    return ' '.join(unicodedata.normalize('NFKC', str(value)).casefold().split())
+
+
+class KeyEntry:
+    """
+    Kunci satu soal.
+
+    ``correct`` id pilihan benar (MC/MCA/TF), ``accepted`` jawaban isian yang
+    sudah dinormalisasi (FB), ``pairs`` {choice_id: teks kanan} (MAT), dan
+    ``sequence`` urutan id pilihan yang benar (ORD).
+    """
+    __slots__ = ('question_id', 'question_type', 'points', 'correct', 'accepted', 'pairs', 'sequence')
+
+    def __init__(self, question_id, question_type, points, correct=frozenset(),
+                 accepted=frozenset(), pairs=None, sequence=()):
+        self.question_id = question_id
+        self.question_type = question_type
+        self.points = points
+        self.correct = correct
+        self.accepted = accepted
+        self.pairs = pairs or {}
+        self.sequence = sequence
+
+
+# Scorer per tipe soal: scorer(entry, response) -> (is_correct, points_earned)
+SCORERS = {}
+
+
+def register_scorer(*question_types):
+    """Daftarkan scorer untuk satu atau beberapa tipe soal"""
+    def decorator(func):
+        for question_type in question_types:
+            SCORERS[question_type] = func
+        return func
+    return decorator
+
+
+def _partial(entry, fraction):
+    fraction = max(0.0, min(1.0, fraction))
+    return fraction == 1.0, float(entry.points) * fraction
+
+
+@register_scorer('MC', 'TF')
+def score_single_choice(entry, response):
+    is_correct = bool(response.choice_ids) and entry.correct == frozenset(response.choice_ids)
+    return is_correct, float(entry.points) if is_correct else 0.0
+
+
+@register_scorer('MCA')
+def score_multiple_answers(entry, response):
+    """Nilai parsial: (benar dipilih - salah dipilih) / jumlah kunci, minimal 0"""
+    if not entry.correct or not response.choice_ids:
+        return False, 0.0
+    selected = frozenset(response.choice_ids)
+    hits = len(selected & entry.correct)
+    wrong = len(selected - entry.correct)
+    return _partial(entry, (hits - wrong) / len(entry.correct))
+
+
+@register_scorer('FB')
+def score_fill_blank(entry, response):
+    is_correct = bool(entry.accepted) and normalize_text(response.text) in entry.accepted
+    return is_correct, float(entry.points) if is_correct else 0.0
+
+
+@register_scorer('MAT')
+def score_matching(entry, response):
+    """Proporsi pasangan yang tepat; ``matching`` berisi {choice_id: teks kanan}"""
+    if not entry.pairs or not isinstance(response.matching, dict):
+        return False, 0.0
+    given = {str(choice_id): normalize_text(right) for choice_id, right in response.matching.items()}
+    hits = sum(1 for choice_id, right in entry.pairs.items() if given.get(str(choice_id)) == right)
+    return _partial(entry, hits / len(entry.pairs))
+
+
+@register_scorer('ORD')
+def score_ordering(entry, response):
+    """Proporsi posisi yang tepat; ``matching`` berisi list id pilihan berurutan"""
+    if not entry.sequence or not isinstance(response.matching, list):
+        return False, 0.0
+    try:
+        given = [int(choice_id) for choice_id in response.matching]
+    except (TypeError, ValueError):
+        return False, 0.0
+    hits = sum(1 for expected, actual in zip(entry.sequence, given) if expected == actual)
+    return _partial(entry, hits / len(entry.sequence))
+
+
+# Tipe soal yang dinilai manual oleh guru, poinnya diambil dari yang tersimpan
+MANUAL_TYPES = {'ESS'}
+
+
+class AnswerKey:
+    """
+    Kunci jawaban compiled untuk satu versi exam.
+
+    Dibuat sekali (2 query) lalu di-cache lewat exam/caching.py, dipakai
+    bersama oleh submit dan regrade.
+    """
+    __slots__ = ('exam_id', 'entries', 'total_points')
+
+    def __init__(self, exam_id, entries):
+        self.exam_id = exam_id
+        self.entries = entries
+        self.total_points = sum(entry.points for entry in entries.values())
+
+    def __contains__(self, question_id):
+        return question_id in self.entries
+
+    def __getitem__(self, question_id):
+        return self.entries[question_id]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def grade(self, response):
+        """
+        (is_correct, points_earned) untuk satu Response. Soal manual (essay)
+        mengembalikan poin yang tersimpan dan is_correct None.
+        """
+        entry = self.entries[response.question_id]
+        if entry.question_type in MANUAL_TYPES:
+            return None, response.stored_points
+        scorer = SCORERS.get(entry.question_type)
+        if scorer is None:
+            return False, 0.0
+        return scorer(entry, response)
+
+    def score(self, earned_points):
+        """Persentase 0-100 dari total poin exam"""
+        return (earned_points / self.total_points) * 100 if self.total_points > 0 else 0
+
+
+def build_answer_key(exam):
+    choices = {}
+    for question_id, choice_id, text, is_correct, order in Choice.objects.filter(
+        question__exam=exam
+    ).values_list('question_id', 'id', 'text', 'is_correct', 'order').order_by('order', 'id'):
+        choices.setdefault(question_id, []).append((choice_id, text, is_correct))
+
+    entries = {}
+    for question_id, question_type, points in Question.objects.filter(
+        exam=exam
+    ).values_list('id', 'question_type', 'points'):
+        rows = choices.get(question_id, [])
+        entry = KeyEntry(
+            question_id, question_type, points,
+            correct=frozenset(choice_id for choice_id, _, is_correct in rows if is_correct),
+        )
+        if question_type == 'FB':
+            # Semua pilihan bertanda benar adalah jawaban yang diterima
+            accepted = [text for _, text, is_correct in rows if is_correct] or [text for _, text, _ in rows]
+            entry.accepted = frozenset(normalize_text(text) for text in accepted)
+        elif question_type == 'MAT':
+            entry.pairs = {
+                choice_id: normalize_text(right)
+                for choice_id, right in (
+                    (choice_id, Choice.split_pair(text)[1]) for choice_id, text, _ in rows
+                )
+                if right is not None
+            }
+        elif question_type == 'ORD':
+            entry.sequence = tuple(choice_id for choice_id, _, _ in rows)
+        entries[question_id] = entry
+    return AnswerKey(exam.pk, entries)
+
+
+answer_key_cache = register('answer_key', build_answer_key)
+
+
+def get_answer_key(exam):
+    return answer_key_cache.get(exam)
+
+
+def grade_batch(answer_key, responses):
+    """
+    Nilai banyak Response sekaligus di memori.
+
+    Return list ``(is_correct, points_earned)`` sejajar dengan ``responses``,
+    ``None`` untuk jawaban soal yang sudah tidak ada di exam.
+    """
+    return [
+        answer_key.grade(response) if response.question_id in answer_key else None
+        for response in responses
+    ]
+
+
+def score_answers(answer_key, responses):
+    """
+    Nilai sekumpulan Response di memori.
+    Return ``(earned_points, correct_count)``.
+    """
+    earned_points = 0.0
+    correct = 0
+    for grade in grade_batch(answer_key, responses):
+        if grade is None:
+            continue
+        is_correct, points = grade
+        earned_points += points or 0
+        correct += bool(is_correct)
+    return earned_points, correct
+
+
+def session_answers(session_pks):
+    """{session_pk: [Response]} dalam 2 query"""
+    answers = {}
+    for (session_pk, question_id), answer in load_answer_states(session_pks).items():
+        answers.setdefault(session_pk, []).append(Response(
+            question_id, answer.choice_ids, answer.text, answer.matching, answer.points,
+        ))
+    return answers
+
+
+def is_answered(state):
+    return bool(state.choice_ids or (state.text or '').strip() or state.matching)
+
+
+# Hasil penilaian satu session
+SessionResult = namedtuple('SessionResult', 'score total_questions answered correct wrong')
+
+
+def grade_sessions(sessions, deltas=None):
+    """
+    Gabungkan jawaban tersimpan, buffer, dan delta dari request
+    (``{session_pk: [Delta]}``) untuk banyak session sekaligus, nilai
+    semuanya di memori lalu tulis dengan satu bulk upsert.
+
+    ``session.exam`` sebaiknya sudah di-select_related. Harus dipanggil di
+    dalam transaksi; return ``({session_pk: SessionResult}, spool_files)``,
+    spool file dibuang pemanggil setelah commit.
+    """
+    deltas = deltas or {}
+    buffered, files = read_buffered_states([session.session_id for session in sessions])
+    existing = load_answer_states([session.pk for session in sessions])
+
+    # State akhir per soal: tersimpan < buffer < delta dari request submit
+    states = {
+        key: AnswerState(answer.choice_ids, answer.seq, answer.text, answer.matching)
+        for key, answer in existing.items()
+    }
+    latest = dict(buffered)
+    for session in sessions:
+        valid = filter_valid_deltas(session.exam, deltas.get(session.pk, ()))
+        for question_id, state in coalesce_deltas(valid).items():
+            key = (session.pk, question_id)
+            if key not in latest or latest[key].seq < state.seq:
+                latest[key] = state
+    for key, state in latest.items():
+        if key not in states or states[key].seq < state.seq:
+            states[key] = state
+
+    # Jawaban untuk soal yang sudah dihapus dari exam tidak dinilai
+    answer_keys = {session.pk: get_answer_key(session.exam) for session in sessions}
+    by_session = {}
+    for key in states:
+        if key[0] in answer_keys and key[1] in answer_keys[key[0]]:
+            by_session.setdefault(key[0], []).append(key)
+    keys = [key for own in by_session.values() for key in own]
+    grades = {}
+    for session_pk, own in by_session.items():
+        responses = [
+            Response(
+                key[1], states[key].choice_ids, states[key].text, states[key].matching,
+                existing[key].points if key in existing else None,
+            )
+            for key in own
+        ]
+        grades.update(zip(own, grade_batch(answer_keys[session_pk], responses)))
+
+    write_answer_states(
+        {key: states[key] for key in keys},
+        grades=grades,
+        existing=existing,
+    )
+
+    totals = {session_pk: [0.0, 0, 0, 0] for session_pk in answer_keys}
+    for key in keys:
+        is_correct, points = grades[key]
+        total = totals[key[0]]
+        total[0] += points or 0
+        if is_answered(states[key]):
+            total[1] += 1
+            total[2] += is_correct is True
+            total[3] += is_correct is False
+
+    results = {
+        session_pk: SessionResult(
+            answer_keys[session_pk].score(earned), len(answer_keys[session_pk]), answered, correct, wrong,
+        )
+        for session_pk, (earned, answered, correct, wrong) in totals.items()
+    }
+    return results, files
+
+
+def submit_session(session, exam, deltas=(), time_spent=0):
+    """
+    Finalisasi session: gabungkan jawaban tersimpan, buffer, dan delta
+    terakhir dari client, nilai semuanya sekaligus, lalu tulis hasilnya.
+
+    Session diklaim dulu dengan UPDATE bersyarat ``is_completed=False``;
+    kalau sudah diselesaikan submit lain atau sweeper, session dikembalikan
+    apa adanya tanpa dinilai ulang.
+    """
+    session.exam = exam
+    now = timezone.now()
+    status = 'completed'
+    end_time = now
+    if session.deadline:
+        # Deadline dari server yang berlaku, bukan timer di browser
+        if now > session.deadline + timedelta(seconds=settings.EXAM_DEADLINE_GRACE_SECONDS):
+            deltas = ()
+            status = 'timeout'
+        end_time = min(now, session.deadline)
+        time_spent = min(int(time_spent or 0), int((end_time - session.start_time).total_seconds()))
+
+    with transaction.atomic():
+        # Klaim session: baris ini terkunci sampai commit, submit lain
+        # menunggu lalu mendapat 0 baris, sweeper melewatinya (skip_locked)
+        claimed = ExamSession.objects.filter(pk=session.pk, is_completed=False).update(
+            is_completed=True, status=status,
+        )
+        if not claimed:
+            session.refresh_from_db()
+            return session
+
+        results, files = grade_sessions([session], {session.pk: deltas})
+        result = results[session.pk]
+
+        session.end_time = end_time
+        session.submitted_at = now
+        session.time_spent = time_spent
+        session.score = result.score
+        session.total_questions = result.total_questions
+        session.answered_questions = result.answered
+        session.correct_answers = result.correct
+        session.wrong_answers = result.wrong
+        session.status = status
+        session.is_completed = True
+
+        # update() langsung, tidak lewat save() supaya signal tidak jalan
+        ExamSession.objects.filter(pk=session.pk).update(
+            end_time=session.end_time,
+            submitted_at=session.submitted_at,
+            time_spent=session.time_spent,
+            score=session.score,
+            total_questions=session.total_questions,
+            answered_questions=session.answered_questions,
+            correct_answers=session.correct_answers,
+            wrong_answers=session.wrong_answers,
+            status=session.status,
+            is_completed=session.is_completed,
+        )
+        invalidate_student_stats(session.user_id)
+        record_sessions_completed([session])
+
+    discard_spool_files(files)
+    return session
+
+
+def close_expired_sessions(now=None, batch_size=None, session_ids=None):
+    """
+    Tutup session in_progress yang deadline-nya sudah lewat sebagai
+    ``timeout``: jawaban di buffer difinalisasi, dinilai, lalu session
+    di-bulk_update per batch. ``session_ids`` membatasi ke session
+    tertentu. Return jumlah session yang ditutup.
+
+    Sama seperti submit_session, hanya session ``is_completed=False`` yang
+    diambil; baris yang sedang diklaim submit terkunci dan dilewati.
+    """
+    now = now or timezone.now()
+    batch_size = batch_size or settings.SESSION_SWEEP_BATCH_SIZE
+    closed = 0
+
+    while True:
+        with transaction.atomic():
+            expired = ExamSession.objects.filter(status='in_progress', is_completed=False, deadline__lte=now)
+            if session_ids is not None:
+                expired = expired.filter(pk__in=session_ids)
+            sessions = list(
+                expired.select_related('exam').select_for_update(
+                    skip_locked=True, of=('self',)
+                ).order_by('deadline')[:batch_size]
+            )
+            if not sessions:
+                break
+
+            results, files = grade_sessions(sessions)
+            for session in sessions:
+                result = results[session.pk]
+                session.end_time = session.deadline
+                session.submitted_at = now
+                session.time_spent = int((session.deadline - session.start_time).total_seconds())
+                session.score = result.score
+                session.total_questions = result.total_questions
+                session.answered_questions = result.answered
+                session.correct_answers = result.correct
+                session.wrong_answers = result.wrong
+                session.status = 'timeout'
+                session.is_completed = True
+
+            ExamSession.objects.bulk_update(sessions, [
+                'end_time', 'submitted_at', 'time_spent', 'score', 'total_questions',
+                'answered_questions', 'correct_answers', 'wrong_answers', 'status', 'is_completed',
+            ])
+            invalidate_student_stats(*(session.user_id for session in sessions))
+            record_sessions_completed(sessions)
+
+        discard_spool_files(files)
+        closed += len(sessions)
+        if len(sessions) < batch_size:
+            break
+    return closed
@@ -0,0 +1,60 @@
+"""
+Hash password PBKDF2 secara paralel untuk import roster.
+
+PBKDF2 sengaja lambat (ratusan ribu iterasi per password), jadi untuk
+ribuan user hashing dibagi ke process pool. Modul ini tidak mengimpor
+model supaya bisa di-load worker ``spawn`` sebelum ``django.setup()``.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+# Di bawah jumlah ini password di-hash langsung tanpa process pool
+PARALLEL_MIN = 16
+
+
+def _init_worker(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+def hash_batch(passwords):
+    return [make_password(password) for password in passwords]
+
+
+class PasswordHasher:
+    """
+    Context manager: worker di-spawn sekali (menjalankan django.setup())
+    lalu dipakai untuk semua chunk selama import.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or settings.USER_IMPORT_HASH_WORKERS
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def hash(self, passwords):
+        """List hash sejajar dengan ``passwords``"""
+        if self.workers <= 1 or len(passwords) < PARALLEL_MIN:
+            return hash_batch(passwords)
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'cbt_system.settings'),),
+            )
+        size = -(-len(passwords) // self.workers)
+        batches = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+        return [hashed for batch in self._pool.map(hash_batch, batches) for hashed in batch]
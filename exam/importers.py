@@ -0,0 +1,450 @@
+"""
+Import soal dan user (roster) dari CSV.
+
+File upload dibaca baris per baris (``TextIOWrapper`` di atas file, tanpa
+``read()`` seluruh isi), setiap baris divalidasi menjadi objek Question dan
+Choice di memori, lalu disimpan per chunk dengan ``bulk_create``. Baris yang
+tidak valid tidak menghentikan import, tapi dicatat di laporan per baris.
+
+Upload dari halaman bulk upload diproses di background oleh
+``import_questions_job`` / ``import_users_job`` (lihat exam/jobs.py).
+
+Format kolom sama dengan template download:
+Question Text, Question Type, Points, Difficulty, Correct Answer, Option A, Option B, ...
+"""
+import csv
+import io
+import os
+from collections import namedtuple
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+
+from .hashing import PasswordHasher
+from .jobs import count_lines
+from .models import Choice, CustomUser, Department, Exam, Question, QuestionBank, refresh_exam_content
+from .stats import record_users_created
+
+CHUNK_SIZE = 500
+
+# Nama tipe di CSV (template lama) -> kode Question.question_type
+QUESTION_TYPE_ALIASES = {
+    'multiple_choice': 'MC',
+    'multiple_answer': 'MCA',
+    'multiple_answers': 'MCA',
+    'true_false': 'TF',
+    'short_answer': 'FB',
+    'fill_in_the_blank': 'FB',
+    'essay': 'ESS',
+}
+IMPORTABLE_TYPES = ('MC', 'MCA', 'TF', 'FB', 'ESS')
+DIFFICULTIES = ('easy', 'medium', 'hard')
+OPTION_START = 5
+
+RowError = namedtuple('RowError', 'row message')
+
+
+class RowInvalid(ValueError):
+    pass
+
+
+class ImportReport:
+    __slots__ = ('rows', 'created', 'errors')
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.errors = []
+
+    def error(self, row, message):
+        self.errors.append(RowError(row, message))
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'errors': [error._asdict() for error in self.errors],
+        }
+
+
+def _iter_all_rows(uploaded_file, encoding):
+    stream = io.TextIOWrapper(uploaded_file, encoding=encoding, newline='')
+    try:
+        yield from enumerate(csv.reader(stream), 1)
+    finally:
+        # Jangan ikut menutup file aslinya
+        stream.detach()
+
+
+def iter_csv_rows(uploaded_file, encoding='utf-8-sig'):
+    """``(nomor_baris, row)`` dari file upload atau file biner, tanpa header"""
+    for row_num, row in _iter_all_rows(uploaded_file, encoding):
+        if row_num > 1:
+            yield row_num, row
+
+
+def parse_question_type(value):
+    value = value.strip()
+    question_type = QUESTION_TYPE_ALIASES.get(value.lower(), value.upper())
+    if question_type not in IMPORTABLE_TYPES:
+        raise RowInvalid(f'Unknown question type "{value}"')
+    return question_type
+
+
+def _letters(value, columns):
+    """Huruf jawaban ke index kolom opsi (A = kolom opsi pertama, kosong atau tidak)"""
+    letters = [letter.strip() for letter in value.upper().split(',') if letter.strip()]
+    indexes = []
+    for letter in letters:
+        index = ord(letter) - ord('A') if len(letter) == 1 else -1
+        if not 0 <= index < len(columns) or not columns[index].strip():
+            raise RowInvalid(f'Correct answer "{letter}" does not match any option')
+        indexes.append(index)
+    return set(indexes)
+
+
+def parse_question_row(row):
+    """
+    Validasi satu baris CSV. Return ``(fields, choices)`` dengan
+    ``choices`` list ``(text, is_correct)``, atau raise RowInvalid.
+    """
+    if len(row) < OPTION_START:
+        raise RowInvalid(f'Expected at least {OPTION_START} columns, got {len(row)}')
+
+    # Teks soal dan pilihan tidak di-strip supaya teks RTL (Arab/Pegon) tetap utuh
+    text = row[0]
+    if not text.strip():
+        raise RowInvalid('Question text is empty')
+    question_type = parse_question_type(row[1])
+
+    points = row[2].strip()
+    if not points:
+        points = 1
+    elif points.isdigit() and int(points) >= 1:
+        points = int(points)
+    else:
+        raise RowInvalid(f'Invalid points "{row[2]}"')
+
+    difficulty = row[3].strip().lower()
+    if difficulty not in DIFFICULTIES:
+        difficulty = 'medium'
+
+    correct_answer = row[4].strip()
+    columns = row[OPTION_START:]
+    options = [option for option in columns if option.strip()]
+
+    if question_type in ('MC', 'MCA'):
+        if len(options) < 2:
+            raise RowInvalid('Multiple choice needs at least 2 options')
+        correct = _letters(correct_answer, columns)
+        if not correct:
+            raise RowInvalid('Correct answer is empty')
+        if question_type == 'MC' and len(correct) > 1:
+            raise RowInvalid('Multiple choice (single answer) has more than one correct answer')
+        # Huruf mengikuti posisi kolom, opsi kosong dibuang setelahnya
+        choices = [(option, i in correct) for i, option in enumerate(columns) if option.strip()]
+    elif question_type == 'TF':
+        answer = correct_answer.upper()
+        if answer not in ('TRUE', 'A', 'FALSE', 'B'):
+            raise RowInvalid(f'True/False answer must be TRUE/FALSE or A/B, got "{correct_answer}"')
+        choices = [('True', answer in ('TRUE', 'A')), ('False', answer in ('FALSE', 'B'))]
+    elif question_type == 'FB':
+        # Jawaban utama + kolom opsi sebagai jawaban alternatif yang diterima
+        if not correct_answer:
+            raise RowInvalid('Fill in the blank needs a correct answer')
+        choices = [(answer, True) for answer in [correct_answer] + [option.strip() for option in options]]
+    else:
+        choices = []
+
+    fields = {'text': text, 'question_type': question_type, 'points': points, 'difficulty': difficulty}
+    return fields, choices
+
+
+def _insert_chunk(pending, exam, created_by, question_bank):
+    questions = Question.objects.bulk_create([
+        Question(exam=exam, question_bank=question_bank, created_by=created_by, **fields)
+        for fields, _ in pending
+    ])
+    Choice.objects.bulk_create([
+        Choice(question=question, text=text, is_correct=is_correct, order=order)
+        for question, (_, choices) in zip(questions, pending)
+        for order, (text, is_correct) in enumerate(choices)
+    ])
+    return len(questions)
+
+
+def import_questions(uploaded_file, exam, created_by, question_bank=None, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Import soal CSV ke ``exam``. Return ImportReport.
+
+    Setiap chunk disimpan dalam satu transaksi. bulk_create tidak memicu
+    signal Question/Choice, jadi versi exam dan total_points diperbarui
+    sekali di akhir. ``progress(report)`` dipanggil setelah setiap chunk.
+    """
+    report = ImportReport()
+    pending = []
+
+    def flush():
+        with transaction.atomic():
+            report.created += _insert_chunk(pending, exam, created_by, question_bank)
+        pending.clear()
+        if progress:
+            progress(report)
+
+    try:
+        for row_num, row in iter_csv_rows(uploaded_file):
+            if not any(cell.strip() for cell in row):
+                continue
+            report.rows += 1
+            try:
+                pending.append(parse_question_row(row))
+            except RowInvalid as e:
+                report.error(row_num, str(e))
+                continue
+            if len(pending) >= chunk_size:
+                flush()
+        if pending:
+            flush()
+    except UnicodeDecodeError:
+        report.error(None, 'File is not valid UTF-8 text')
+    finally:
+        if report.created:
+            refresh_exam_content(exam.pk)
+    return report
+
+
+def import_questions_job(job, path, exam_id, user_id, question_bank_id=None):
+    """Job: import file CSV yang sudah disimpan dengan save_upload, lalu hapus filenya"""
+    try:
+        exam = Exam.objects.get(pk=exam_id)
+        created_by = CustomUser.objects.get(pk=user_id)
+        question_bank = QuestionBank.objects.filter(pk=question_bank_id).first() if question_bank_id else None
+        total = count_lines(path)
+        job.progress(0, total, force=True)
+
+        def progress(report):
+            job.progress(report.rows, max(total, report.rows), errors=len(report.errors))
+
+        with open(path, 'rb') as f:
+            report = import_questions(f, exam, created_by, question_bank=question_bank, progress=progress)
+        job.progress(report.rows, report.rows, errors=len(report.errors), force=True)
+        job.finish(result=report.as_dict())
+    finally:
+        os.remove(path)
+
+
+# ========== ROSTER USER ==========
+#
+# Kolom sesuai download_user_template: username, email, first_name,
+# last_name, role, password, department (kode atau nama, opsional).
+
+USER_CHUNK_SIZE = 500
+USER_ROLES = ('student', 'teacher', 'admin')
+USER_REQUIRED_COLUMNS = ('username', 'password')
+
+
+def iter_csv_dicts(uploaded_file, encoding='utf-8-sig'):
+    """``(nomor_baris, {kolom: nilai})`` dengan nama kolom dari header (lowercase)"""
+    header = None
+    for row_num, row in _iter_all_rows(uploaded_file, encoding):
+        if header is None:
+            header = [column.strip().lower() for column in row]
+            missing = [column for column in USER_REQUIRED_COLUMNS if column not in header]
+            if missing:
+                raise RowInvalid(f'Missing column(s): {", ".join(missing)}')
+            continue
+        yield row_num, dict(zip(header, row))
+
+
+def _department_lookup():
+    """kode/nama department (lowercase) -> id, satu query"""
+    lookup = {}
+    for department_id, code, name in Department.objects.values_list('id', 'code', 'name'):
+        lookup.setdefault(name.strip().lower(), department_id)
+        lookup[code.strip().lower()] = department_id
+    return lookup
+
+
+def parse_user_row(values, departments):
+    """
+    Validasi satu baris roster. Return ``(fields, password)`` atau raise RowInvalid.
+    """
+    username = (values.get('username') or '').strip()
+    if not username:
+        raise RowInvalid('Username is empty')
+    if len(username) > 150:
+        raise RowInvalid('Username is longer than 150 characters')
+
+    email = CustomUser.objects.normalize_email((values.get('email') or '').strip())
+    if email:
+        try:
+            validate_email(email)
+        except ValidationError:
+            raise RowInvalid(f'Invalid email "{email}"')
+
+    role = (values.get('role') or 'student').strip().lower() or 'student'
+    if role not in USER_ROLES:
+        raise RowInvalid(f'Unknown role "{role}"')
+
+    password = values.get('password') or ''
+    if not password.strip():
+        raise RowInvalid('Password is empty')
+
+    department = (values.get('department') or '').strip()
+    department_id = None
+    if department:
+        department_id = departments.get(department.lower())
+        if department_id is None:
+            raise RowInvalid(f'Unknown department "{department}"')
+
+    fields = {
+        'username': username,
+        'email': email,
+        'first_name': (values.get('first_name') or '').strip()[:150],
+        'last_name': (values.get('last_name') or '').strip()[:150],
+        'user_type': role,
+        'is_staff': role == 'admin',
+        'department_id': department_id,
+    }
+    return fields, password
+
+
+def _existing(pending):
+    """Username dan email (lowercase) di chunk ini yang sudah dipakai user lain, 2 query"""
+    usernames = {fields['username'] for _, fields, _ in pending}
+    emails = {fields['email'].lower() for _, fields, _ in pending if fields['email']}
+    taken_usernames = set(CustomUser.objects.filter(username__in=usernames).values_list('username', flat=True))
+    taken_emails = set()
+    if emails:
+        taken_emails = set(CustomUser.objects.annotate(email_lower=Lower('email')).filter(
+            email_lower__in=emails
+        ).values_list('email_lower', flat=True))
+    return taken_usernames, taken_emails
+
+
+def _report_taken(row_num, fields, taken_usernames, taken_emails, report):
+    """Catat error kalau username/email baris ini sudah dipakai, return True kalau bentrok"""
+    if fields['username'] in taken_usernames:
+        report.error(row_num, f'Username "{fields["username"]}" already exists')
+    elif fields['email'] and fields['email'].lower() in taken_emails:
+        report.error(row_num, f'Email "{fields["email"]}" already exists')
+    else:
+        return False
+    return True
+
+
+def _insert_one_by_one(accepted, users, report):
+    """
+    Fallback kalau bulk_create satu chunk gagal: simpan user satu per satu
+    (savepoint per baris) supaya hanya baris yang benar-benar bentrok yang
+    dilaporkan. Return user yang berhasil disimpan.
+    """
+    created = []
+    for (row_num, fields, password), user in zip(accepted, users):
+        try:
+            with transaction.atomic():
+                CustomUser.objects.bulk_create([user])
+        except IntegrityError:
+            if not _report_taken(row_num, fields, *_existing([(row_num, fields, password)]), report):
+                report.error(row_num, 'Username or email already exists')
+            continue
+        created.append(user)
+    return created
+
+
+def _insert_users(pending, report, hasher):
+    taken_usernames, taken_emails = _existing(pending)
+    accepted = [
+        (row_num, fields, password) for row_num, fields, password in pending
+        if not _report_taken(row_num, fields, taken_usernames, taken_emails, report)
+    ]
+    if not accepted:
+        return
+
+    hashes = hasher.hash([password for _, _, password in accepted])
+    users = [CustomUser(password=hashed, **fields) for (_, fields, _), hashed in zip(accepted, hashes)]
+    try:
+        with transaction.atomic():
+            CustomUser.objects.bulk_create(users)
+    except IntegrityError:
+        # Bentrok dengan user yang dibuat bersamaan di tempat lain
+        users = _insert_one_by_one(accepted, users, report)
+    # bulk_create tidak memicu signal post_save, counter dicatat di sini
+    record_users_created(user.user_type for user in users)
+    report.created += len(users)
+
+
+def import_users(uploaded_file, chunk_size=USER_CHUNK_SIZE, progress=None, workers=None):
+    """
+    Import roster user dari CSV. Return ImportReport.
+
+    Konflik username/email dicek per chunk dengan query ``__in`` (dan
+    duplikat di dalam file dengan set), password di-hash paralel, lalu
+    user disimpan dengan bulk_create per chunk.
+    """
+    report = ImportReport()
+    departments = _department_lookup()
+    seen_usernames, seen_emails = set(), set()
+    pending = []
+
+    with PasswordHasher(workers) as hasher:
+        def flush():
+            _insert_users(pending, report, hasher)
+            pending.clear()
+            if progress:
+                progress(report)
+
+        try:
+            for row_num, values in iter_csv_dicts(uploaded_file):
+                if not any((value or '').strip() for value in values.values()):
+                    continue
+                report.rows += 1
+                try:
+                    fields, password = parse_user_row(values, departments)
+                except RowInvalid as e:
+                    report.error(row_num, str(e))
+                    continue
+
+                email = fields['email'].lower()
+                if fields['username'] in seen_usernames:
+                    report.error(row_num, f'Duplicate username "{fields["username"]}" in file')
+                    continue
+                if email and email in seen_emails:
+                    report.error(row_num, f'Duplicate email "{fields["email"]}" in file')
+                    continue
+                seen_usernames.add(fields['username'])
+                if email:
+                    seen_emails.add(email)
+
+                pending.append((row_num, fields, password))
+                if len(pending) >= chunk_size:
+                    flush()
+            if pending:
+                flush()
+        except RowInvalid as e:
+            report.error(1, str(e))
+        except UnicodeDecodeError:
+            report.error(None, 'File is not valid UTF-8 text')
+
+    # Konflik dengan database baru diketahui saat flush chunk
+    report.errors.sort(key=lambda error: error.row or 0)
+    return report
+
+
+def import_users_job(job, path):
+    """Job: import roster user dari file yang disimpan dengan save_upload, lalu hapus filenya"""
+    try:
+        total = count_lines(path)
+        job.progress(0, total, force=True)
+
+        def progress(report):
+            job.progress(report.rows, max(total, report.rows), errors=len(report.errors))
+
+        with open(path, 'rb') as f:
+            report = import_users(f, progress=progress)
+        job.progress(report.rows, report.rows, errors=len(report.errors), force=True)
+        job.finish(result=report.as_dict())
+    finally:
+        os.remove(path)
@@ -0,0 +1,251 @@
+"""
+Background job sederhana untuk export/import besar.
+
+Job dijalankan di thread pool milik proses web, jadi request cukup
+mendaftarkan job lalu langsung kembali dengan job id. State job (status,
+progress, file hasil) disimpan sebagai file JSON di JOB_OUTPUT_DIR, di
+sebelah file hasilnya, jadi polling dan download bisa dilayani worker mana
+pun yang memakai direktori yang sama (tidak bergantung pada cache).
+
+State menyimpan host dan pid proses yang menjalankan job. Kalau proses itu
+sudah mati (worker restart) sebelum job selesai, ``get_job`` menandai job
+sebagai failed supaya halaman yang polling mendapat pesan error, bukan
+menunggu selamanya.
+
+Upload besar (import soal/user) disimpan dulu ke disk dengan
+``save_upload`` lalu diproses job, jadi request upload langsung selesai.
+
+Untuk test (atau deployment tanpa thread), ``JOBS_RUN_INLINE = True``
+menjalankan job langsung di dalam request.
+"""
+import json
+import logging
+import os
+import re
+import socket
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+logger = logging.getLogger('exam.jobs')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+HOST = socket.gethostname()
+JOB_ID_RE = re.compile(r'[0-9a-f]{32}')
+# Job yang sedang dijalankan proses ini
+_active = set()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.JOB_WORKERS, thread_name_prefix='exam-job')
+        return _executor
+
+
+def job_path(job_id, suffix=''):
+    os.makedirs(settings.JOB_OUTPUT_DIR, exist_ok=True)
+    return os.path.join(settings.JOB_OUTPUT_DIR, f'{job_id}{suffix}')
+
+
+def save_upload(uploaded_file, suffix='.csv'):
+    """Simpan file upload per chunk ke JOB_OUTPUT_DIR, return path-nya"""
+    path = job_path(f'upload_{uuid.uuid4().hex}', suffix)
+    with open(path, 'wb') as destination:
+        for chunk in uploaded_file.chunks():
+            destination.write(chunk)
+    return path
+
+
+def count_lines(path):
+    """Perkiraan jumlah baris data (tanpa header) untuk progress/ETA"""
+    lines = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            lines += block.count(b'\n')
+    return max(lines - 1, 0)
+
+
+def _state_path(job_id):
+    return job_path(job_id, '.json')
+
+
+def _worker_alive(state):
+    """Apakah proses yang menjalankan job masih ada (hanya bisa dicek di host yang sama)"""
+    if state.get('host') != HOST or not state.get('pid'):
+        return True
+    if state['pid'] == os.getpid():
+        return state['id'] in _active
+    try:
+        os.kill(state['pid'], 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def get_job(job_id):
+    if not JOB_ID_RE.fullmatch(job_id):
+        return None
+    try:
+        with open(_state_path(job_id)) as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if time.time() - state['created'] > settings.JOB_STATE_TIMEOUT:
+        return None
+    if state['status'] in ('pending', 'running') and not _worker_alive(state):
+        state.update({
+            'status': 'failed',
+            'finished': time.time(),
+            'message': 'The worker running this job stopped before it finished. Please start it again.',
+        })
+        _save(state)
+    return state
+
+
+def _save(state):
+    # Tulis ke file sementara lalu rename, supaya pembaca tidak melihat JSON setengah jadi
+    path = _state_path(state['id'])
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+class Job:
+    """Handle yang diterima fungsi job untuk melaporkan progress dan hasil"""
+
+    def __init__(self, state):
+        self.state = state
+        self._last_save = 0.0
+
+    @property
+    def id(self):
+        return self.state['id']
+
+    def path(self, suffix=''):
+        return job_path(self.id, suffix)
+
+    def progress(self, processed, total=None, errors=None, force=False):
+        self.state['processed'] = processed
+        if total is not None:
+            self.state['total'] = total
+        if errors is not None:
+            self.state['errors'] = errors
+        # File state ditulis paling sering 2x per detik
+        now = time.monotonic()
+        if force or now - self._last_save >= 0.5:
+            self._last_save = now
+            _save(self.state)
+
+    def finish(self, file_path=None, filename=None, result=None):
+        self.state.update({
+            'status': 'done',
+            'finished': time.time(),
+            'file': file_path,
+            'filename': filename,
+            'result': result,
+        })
+        _save(self.state)
+
+
+def _run(func, state, args, kwargs):
+    job = Job(state)
+    state['status'] = 'running'
+    state['started'] = time.time()
+    _save(state)
+    try:
+        func(job, *args, **kwargs)
+        if state['status'] == 'running':
+            job.finish()
+    except Exception as e:
+        logger.error('Job %s (%s) failed:\n%s', state['id'], state['kind'], traceback.format_exc())
+        state.update({'status': 'failed', 'finished': time.time(), 'message': str(e)})
+        _save(state)
+    finally:
+        _active.discard(state['id'])
+        close_old_connections()
+
+
+def purge_job_files(max_age=None):
+    """Hapus file job yang lebih tua dari JOB_STATE_TIMEOUT (link-nya sudah tidak berlaku)"""
+    max_age = max_age or settings.JOB_STATE_TIMEOUT
+    if not os.path.isdir(settings.JOB_OUTPUT_DIR):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for entry in os.scandir(settings.JOB_OUTPUT_DIR):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+def submit_job(kind, func, *args, owner=None, **kwargs):
+    """Daftarkan ``func(job, *args, **kwargs)`` ke background worker, return job id"""
+    if cache.add('job_purge', 1, 60 * 60):
+        purge_job_files()
+
+    state = {
+        'id': uuid.uuid4().hex,
+        'kind': kind,
+        'owner': owner,
+        'host': HOST,
+        'pid': os.getpid(),
+        'status': 'pending',
+        'processed': 0,
+        'total': None,
+        'errors': 0,
+        'created': time.time(),
+        'started': None,
+        'finished': None,
+        'file': None,
+        'filename': None,
+        'result': None,
+        'message': '',
+    }
+    _active.add(state['id'])
+    _save(state)
+
+    if settings.JOBS_RUN_INLINE:
+        _run(func, state, args, kwargs)
+    else:
+        _get_executor().submit(_run, func, state, args, kwargs)
+    return state['id']
+
+
+def job_summary(state):
+    """Data job untuk endpoint polling: progress, jumlah error, dan ETA (detik)"""
+    total = state.get('total')
+    processed = state.get('processed') or 0
+    eta = None
+    if state['status'] == 'running' and total and processed and state.get('started'):
+        elapsed = time.time() - state['started']
+        eta = round(elapsed / processed * (total - processed), 1)
+    return {
+        'id': state['id'],
+        'kind': state['kind'],
+        'status': state['status'],
+        'processed': processed,
+        'total': total,
+        'percent': round(processed / total * 100, 1) if total else None,
+        'errors': state.get('errors') or 0,
+        'eta_seconds': eta,
+        'message': state.get('message') or '',
+        'result': state.get('result'),
+        'ready': state['status'] == 'done' and bool(state.get('file')),
+    }
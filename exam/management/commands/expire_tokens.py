@@ -0,0 +1,24 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from exam.tokens import expire_tokens
+
+
+class Command(BaseCommand):
+    help = 'Mark lapsed (past expires_at or used up) active tokens as expired in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running and expire every --interval seconds')
+        parser.add_argument('--interval', type=int, default=settings.TOKEN_EXPIRY_INTERVAL)
+
+    def handle(self, *args, **options):
+        while True:
+            count = expire_tokens()
+            self.stdout.write(
+                self.style.SUCCESS(f'Successfully expired {count} tokens')
+            )
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
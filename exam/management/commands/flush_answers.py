@@ -0,0 +1,24 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from exam.answers import flush_answer_buffers
+
+
+class Command(BaseCommand):
+    help = 'Flush buffered answer deltas to UserAnswer in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running and flush every --interval seconds')
+        parser.add_argument('--interval', type=int, default=settings.ANSWER_FLUSH_INTERVAL)
+
+    def handle(self, *args, **options):
+        while True:
+            written = flush_answer_buffers()
+            self.stdout.write(
+                self.style.SUCCESS(f'Successfully flushed {written} answers')
+            )
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
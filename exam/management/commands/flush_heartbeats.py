@@ -0,0 +1,34 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from exam.caching import cache_is_shared
+from exam.presence import flush_heartbeats
+
+
+class Command(BaseCommand):
+    help = (
+        'Write cached heartbeat presence (time spent, last seen) to ExamSession in bulk. '
+        'Requires a cache shared with the web workers (Redis/Memcached), not LocMemCache.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running and flush every --interval seconds')
+        parser.add_argument('--interval', type=int, default=settings.HEARTBEAT_FLUSH_INTERVAL)
+
+    def handle(self, *args, **options):
+        if not cache_is_shared():
+            raise CommandError(
+                'The default cache is process-local, so heartbeats recorded by the web workers are not '
+                'visible here. Configure a shared cache backend (Redis/Memcached) in CACHES.'
+            )
+
+        while True:
+            updated = flush_heartbeats()
+            self.stdout.write(
+                self.style.SUCCESS(f'Successfully flushed {updated} heartbeats')
+            )
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
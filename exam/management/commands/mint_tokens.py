@@ -0,0 +1,45 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from exam.models import CustomUser, Exam
+from exam.tokens import mint_tokens
+
+
+class Command(BaseCommand):
+    help = 'Mint a batch of exam access tokens (e.g. one single-use token per student)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int)
+        parser.add_argument('quantity', type=int)
+        parser.add_argument('--created-by', required=True, help='Username of the admin/teacher minting the tokens')
+        parser.add_argument('--duration', type=int, default=60, help='Token lifetime in minutes')
+        parser.add_argument('--max-usage', type=int, default=1)
+        parser.add_argument('--global', dest='is_global', action='store_true')
+        parser.add_argument('--output', help='Write minted tokens to this CSV file')
+
+    def handle(self, *args, **options):
+        try:
+            exam = Exam.objects.get(pk=options['exam_id'])
+            created_by = CustomUser.objects.get(username=options['created_by'])
+        except (Exam.DoesNotExist, CustomUser.DoesNotExist) as e:
+            raise CommandError(str(e))
+
+        try:
+            tokens = mint_tokens(
+                exam, created_by, options['quantity'],
+                duration_minutes=options['duration'],
+                max_usage=options['max_usage'],
+                is_global=options['is_global'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            with open(options['output'], 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['Token', 'Exam', 'Max Usage'])
+                writer.writerows([token.token, exam.title, token.max_usage] for token in tokens)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully minted {len(tokens)} tokens for "{exam.title}"')
+        )
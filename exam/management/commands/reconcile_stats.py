@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from exam.stats import reconcile_all_exam_stats, reconcile_system_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the system and per-exam stats rollups from the source tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running and reconcile every --interval seconds')
+        parser.add_argument('--interval', type=int, default=settings.STATS_RECONCILE_INTERVAL)
+
+    def handle(self, *args, **options):
+        while True:
+            stats = reconcile_system_stats()
+            exams = reconcile_all_exam_stats()
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Successfully reconciled stats: {stats.total_users} users, '
+                    f'{stats.total_exams} exams ({exams} exam rollups), {stats.total_sessions} sessions'
+                )
+            )
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
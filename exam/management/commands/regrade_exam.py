@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from exam.models import Exam
+from exam.regrade import BATCH_SIZE, regrade_exam
+
+
+class Command(BaseCommand):
+    help = 'Regrade all completed sessions of an exam after answer key corrections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_ids', nargs='+', type=int)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        for exam_id in options['exam_ids']:
+            try:
+                exam = Exam.objects.get(pk=exam_id)
+            except Exam.DoesNotExist:
+                raise CommandError(f'Exam {exam_id} does not exist')
+
+            report = regrade_exam(exam, batch_size=options['batch_size'])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Regraded "{exam.title}": {report.sessions} sessions, '
+                    f'{report.sessions_changed} sessions and {report.answers_changed} answers changed'
+                )
+            )
+            for change in report.pass_changes:
+                status = 'PASSED' if change.passed else 'FAILED'
+                old_score = f'{change.old_score:.2f}' if change.old_score is not None else '-'
+                self.stdout.write(f'  {status}: {change.username} ({old_score} -> {change.new_score:.2f})')
@@ -1,19 +1,12 @@
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from exam.models import ExamToken
+from exam.tokens import expire_tokens
 
 class Command(BaseCommand):
-    help = 'Automatically rotate expired tokens'
+    help = 'Automatically rotate expired tokens (alias of expire_tokens)'
     
     def handle(self, *args, **options):
-        expired_tokens = ExamToken.objects.filter(
-            status='active',
-            expires_at__lte=timezone.now()
-        )
-        
-        count = expired_tokens.count()
-        expired_tokens.update(status='expired')
+        count = expire_tokens()
         
         self.stdout.write(
             self.style.SUCCESS(f'Successfully rotated {count} expired tokens')
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from exam.grading import close_expired_sessions
+
+
+class Command(BaseCommand):
+    help = 'Close in-progress sessions past their deadline as timeout and grade them in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running and sweep every --interval seconds')
+        parser.add_argument('--interval', type=int, default=settings.SESSION_SWEEP_INTERVAL)
+        parser.add_argument('--batch-size', type=int, default=settings.SESSION_SWEEP_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        while True:
+            closed = close_expired_sessions(batch_size=options['batch_size'])
+            self.stdout.write(
+                self.style.SUCCESS(f'Successfully closed {closed} expired sessions')
+            )
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.25 on 2026-10-18 02:41
+
+import secrets
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import exam.models
+
+
+def fill_shuffle_seeds(apps, schema_editor):
+    # AddField memberi satu nilai default yang sama ke semua baris lama
+    ExamSession = apps.get_model('exam', 'ExamSession')
+    sessions = []
+    for session in ExamSession.objects.only('pk').iterator(chunk_size=2000):
+        session.shuffle_seed = secrets.randbits(31)
+        sessions.append(session)
+        if len(sessions) >= 2000:
+            ExamSession.objects.bulk_update(sessions, ['shuffle_seed'])
+            sessions = []
+    ExamSession.objects.bulk_update(sessions, ['shuffle_seed'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examsession',
+            name='shuffle_seed',
+            field=models.PositiveIntegerField(default=exam.models.generate_shuffle_seed, editable=False, help_text='Seed urutan soal/pilihan, supaya resume menampilkan urutan yang sama'),
+        ),
+        migrations.RunPython(fill_shuffle_seeds, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='examsession',
+            name='exam',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sessions', to='exam.exam'),
+        ),
+        migrations.AlterField(
+            model_name='examsession',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exam_sessions', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.25 on 2026-10-18 02:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0002_examsession_shuffle_seed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useranswer',
+            name='client_seq',
+            field=models.PositiveIntegerField(default=0, help_text='Nomor urut delta autosave terakhir dari client'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.25 on 2026-10-18 02:53
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_total_points(apps, schema_editor):
+    Exam = apps.get_model('exam', 'Exam')
+    Question = apps.get_model('exam', 'Question')
+    total_points = Question.objects.filter(
+        exam=OuterRef('pk')
+    ).order_by().values('exam').annotate(total=Sum('points')).values('total')
+    Exam.objects.update(total_points=Coalesce(Subquery(total_points), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0003_useranswer_client_seq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='total_points',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Jumlah poin semua soal, diperbarui otomatis'),
+        ),
+        migrations.RunPython(fill_total_points, migrations.RunPython.noop),
+    ]
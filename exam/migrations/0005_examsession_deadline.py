@@ -0,0 +1,40 @@
+# Generated by Django 4.2.25 on 2026-10-18 02:55
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def fill_deadlines(apps, schema_editor):
+    ExamSession = apps.get_model('exam', 'ExamSession')
+    sessions = []
+    for session in ExamSession.objects.filter(deadline__isnull=True).select_related('exam').iterator(chunk_size=2000):
+        session.deadline = min(
+            session.start_time + timedelta(minutes=session.exam.duration_minutes),
+            session.exam.end_time,
+        )
+        sessions.append(session)
+        if len(sessions) >= 2000:
+            ExamSession.objects.bulk_update(sessions, ['deadline'])
+            sessions = []
+    ExamSession.objects.bulk_update(sessions, ['deadline'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0004_exam_total_points'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examsession',
+            name='deadline',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Batas waktu dari server: start + durasi, maksimal Exam.end_time', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='examsession',
+            index=models.Index(fields=['status', 'deadline'], name='exam_examse_status_f1d277_idx'),
+        ),
+        migrations.RunPython(fill_deadlines, migrations.RunPython.noop),
+    ]
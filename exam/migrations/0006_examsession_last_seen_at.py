@@ -0,0 +1,18 @@
+# Generated by Django 4.2.25 on 2026-10-18 02:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0005_examsession_deadline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examsession',
+            name='last_seen_at',
+            field=models.DateTimeField(blank=True, help_text='Heartbeat terakhir dari student', null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.25 on 2026-10-18 03:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0006_examsession_last_seen_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='examtoken',
+            index=models.Index(fields=['status', 'expires_at'], name='exam_examto_status_745d1a_idx'),
+        ),
+    ]
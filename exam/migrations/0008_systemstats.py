@@ -0,0 +1,37 @@
+# Generated by Django 4.2.25 on 2026-10-18 03:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0007_examtoken_status_expires_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SystemStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_users', models.PositiveIntegerField(default=0)),
+                ('total_students', models.PositiveIntegerField(default=0)),
+                ('total_teachers', models.PositiveIntegerField(default=0)),
+                ('total_exams', models.PositiveIntegerField(default=0)),
+                ('total_sessions', models.PositiveIntegerField(default=0)),
+                ('active_sessions', models.IntegerField(default=0)),
+                ('completed_sessions', models.PositiveIntegerField(default=0)),
+                ('passed_sessions', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0)),
+                ('scored_sessions', models.PositiveIntegerField(default=0)),
+                ('today_date', models.DateField(blank=True, null=True)),
+                ('today_exams', models.PositiveIntegerField(default=0)),
+                ('today_sessions', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'System stats',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.25 on 2026-10-18 03:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0008_systemstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamStats',
+            fields=[
+                ('exam', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='exam.exam')),
+                ('total_attempts', models.PositiveIntegerField(default=0)),
+                ('completed_attempts', models.PositiveIntegerField(default=0)),
+                ('passed_attempts', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0)),
+                ('scored_attempts', models.PositiveIntegerField(default=0)),
+                ('passing_score', models.IntegerField(default=60)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Exam stats',
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Trim
 from django.contrib.auth.models import User, AbstractUser
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -7,6 +8,7 @@ from django.utils.text import slugify
 from datetime import timedelta
 import secrets
 import string
+import hashlib
 
 # Custom User Model untuk extended functionality
 
@@ -123,6 +125,7 @@ class Exam(models.Model):
     require_webcam = models.BooleanField(default=False)
     require_microphone = models.BooleanField(default=False)
     enable_proctoring = models.BooleanField(default=False)
+    total_points = models.PositiveIntegerField(default=0, editable=False, help_text="Jumlah poin semua soal, diperbarui otomatis")
     
     # Relations
     subject = models.ForeignKey(
@@ -164,19 +167,14 @@ class Exam(models.Model):
     
     def generate_token(self):
         """Generate 6-digit random token"""
-        import random
-        import string
-        
         while True:
-            # Generate 6-digit alphanumeric token (uppercase letters + digits)
-            token = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-            
-            # Check if token already exists
-            if not Exam.objects.filter(access_token=token).exists():
-                self.access_token = token
-                break
-        
-        return token
+            # Beberapa kandidat sekaligus, dicek bentrok dengan satu query
+            candidates = {ExamToken.generate_token() for _ in range(8)}
+            taken = set(Exam.objects.filter(access_token__in=candidates).values_list('access_token', flat=True))
+            available = candidates - taken
+            if available:
+                self.access_token = available.pop()
+                return self.access_token
 
     def is_token_valid(self):
         """Check if token is still valid"""
@@ -271,6 +269,9 @@ class Question(models.Model):
         return f"{self.text[:50]}... ({self.get_question_type_display()})"
 
 class Choice(models.Model):
+    # Soal menjodohkan (MAT) menyimpan pasangan di teks pilihan: "kiri | kanan"
+    PAIR_SEPARATOR = '|'
+
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='choices')
     text = models.CharField(max_length=500)
     is_correct = models.BooleanField(default=False)
@@ -283,6 +284,22 @@ class Choice(models.Model):
     def __str__(self):
         return f"{self.text[:50]}... ({'Correct' if self.is_correct else 'Incorrect'})"
 
+    @classmethod
+    def split_pair(cls, text):
+        """'kiri | kanan' -> ('kiri', 'kanan'), kanan None jika tidak ada pemisah"""
+        left, sep, right = text.partition(cls.PAIR_SEPARATOR)
+        return left.strip(), (right.strip() if sep else None)
+
+def generate_shuffle_seed():
+    return secrets.randbits(31)
+
+
+def _shuffle_key(seed, *ids):
+    """Sort key deterministik untuk shuffle berbasis seed"""
+    raw = ':'.join(str(i) for i in (seed,) + ids).encode()
+    return hashlib.blake2b(raw, digest_size=8).digest()
+
+
 class ExamSession(models.Model):
     SESSION_STATUS = (
         ('in_progress', 'In Progress'),
@@ -301,7 +318,12 @@ class ExamSession(models.Model):
     start_time = models.DateTimeField(auto_now_add=True)
     end_time = models.DateTimeField(blank=True, null=True)
     submitted_at = models.DateTimeField(blank=True, null=True)
+    deadline = models.DateTimeField(
+        blank=True, null=True, editable=False,
+        help_text="Batas waktu dari server: start + durasi, maksimal Exam.end_time"
+    )
     time_spent = models.IntegerField(default=0, help_text="Time spent in seconds")
+    last_seen_at = models.DateTimeField(blank=True, null=True, help_text="Heartbeat terakhir dari student")
 
     # === Results ===
     score = models.FloatField(
@@ -317,6 +339,10 @@ class ExamSession(models.Model):
     status = models.CharField(max_length=20, choices=SESSION_STATUS, default='in_progress')
     is_completed = models.BooleanField(default=False)
     attempt_number = models.IntegerField(default=1)
+    shuffle_seed = models.PositiveIntegerField(
+        default=generate_shuffle_seed, editable=False,
+        help_text="Seed urutan soal/pilihan, supaya resume menampilkan urutan yang sama"
+    )
 
     # === Security ===
     ip_address = models.GenericIPAddressField(blank=True, null=True)
@@ -325,10 +351,23 @@ class ExamSession(models.Model):
     class Meta:
         unique_together = ['exam', 'user', 'attempt_number']
         ordering = ['-start_time']
+        indexes = [
+            # Untuk sweeper: session in_progress yang deadline-nya sudah lewat
+            models.Index(fields=['status', 'deadline']),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.exam.title} (Attempt {self.attempt_number})"
 
+    def save(self, *args, **kwargs):
+        if self.deadline is None and self.exam_id:
+            self.deadline = self.compute_deadline(self.exam, self.start_time or timezone.now())
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def compute_deadline(exam, start):
+        return min(start + timedelta(minutes=exam.duration_minutes), exam.end_time)
+
     # === Properties ===
     @property
     def completed(self):
@@ -357,10 +396,10 @@ class ExamSession(models.Model):
 
     @property
     def time_remaining(self):
-        """Sisa waktu exam (kalau sedang berlangsung)"""
-        if self.is_ongoing and self.end_time:
-            return self.end_time - timezone.now()
-        return None
+        """Sisa waktu sampai deadline (kalau sedang berlangsung)"""
+        if self.is_completed or not self.deadline:
+            return None
+        return max(self.deadline - timezone.now(), timedelta(0))
 
     @property
     def is_passed(self):
@@ -368,22 +407,68 @@ class ExamSession(models.Model):
         return self.score >= self.exam.passing_score if self.score is not None else False
 
     # === Methods ===
+    def order_questions(self, payload, shuffle_questions=True, shuffle_choices=True):
+        """
+        Urutkan payload soal (lihat exam/caching.py) sesuai seed session ini.
+
+        Urutan diturunkan dari hash (seed, question_id), jadi stabil walaupun
+        halaman di-reload dan tidak butuh ORDER BY RANDOM() di database.
+        """
+        questions = list(payload)
+        if shuffle_questions:
+            questions.sort(key=lambda q: _shuffle_key(self.shuffle_seed, q['id']))
+
+        # Soal mengurutkan (ORD) selalu diacak, urutan aslinya adalah kunci jawaban
+        return [
+            {
+                **q,
+                'options': sorted(
+                    q['options'],
+                    key=lambda o, qid=q['id']: _shuffle_key(self.shuffle_seed, qid, o['id'])
+                ),
+            }
+            if shuffle_choices or q.get('type') == 'ORD' else q
+            for q in questions
+        ]
+
     def calculate_score(self):
-        """Hitung skor berdasarkan jawaban yang sudah disimpan"""
+        """
+        Tulis skor dan counter dari jawaban yang sudah dinilai:
+        2 query + 1 update(), tidak lewat save() jadi signal tidak jalan lagi.
+        Jawaban kosong (tanpa pilihan, teks, atau pasangan) tidak dihitung
+        dijawab/benar/salah, sama seperti grading.is_answered.
+        """
         if not self.is_completed:
             return None
 
-        total_points = sum(q.points for q in self.exam.questions.all())
-        earned_points = sum(
-            a.points_earned for a in self.user_answers.all()
-            if a.points_earned is not None
+        has_choice = models.Exists(
+            UserAnswer.selected_choices.through.objects.filter(useranswer_id=models.OuterRef('pk'))
+        )
+        answered = (
+            models.Q(has_choice=True)
+            | (models.Q(trimmed_text__isnull=False) & ~models.Q(trimmed_text=''))
+            | (models.Q(matching_data__isnull=False) & ~models.Q(matching_data={}) & ~models.Q(matching_data=[]))
+        )
+        stats = self.user_answers.annotate(
+            has_choice=has_choice, trimmed_text=Trim('text_answer'),
+        ).aggregate(
+            earned=models.Sum('points_earned'),
+            answered=models.Count('id', filter=answered),
+            correct=models.Count('id', filter=answered & models.Q(is_correct=True)),
+            wrong=models.Count('id', filter=answered & models.Q(is_correct=False)),
+        )
+        total_points = Exam.objects.filter(pk=self.exam_id).values_list('total_points', flat=True).first() or 0
+        self.score = ((stats['earned'] or 0) / total_points) * 100 if total_points > 0 else 0
+        self.answered_questions = stats['answered']
+        self.correct_answers = stats['correct']
+        self.wrong_answers = stats['wrong']
+
+        ExamSession.objects.filter(pk=self.pk).update(
+            score=self.score,
+            answered_questions=self.answered_questions,
+            correct_answers=self.correct_answers,
+            wrong_answers=self.wrong_answers,
         )
-
-        if total_points > 0:
-            self.score = (earned_points / total_points) * 100
-        else:
-            self.score = 0
-        self.save(update_fields=['score'])
         return self.score
 class UserAnswer(models.Model):
     session = models.ForeignKey(ExamSession, on_delete=models.CASCADE, related_name='user_answers')
@@ -407,6 +492,7 @@ class UserAnswer(models.Model):
     # Metadata
     answered_at = models.DateTimeField(auto_now_add=True)
     time_spent = models.IntegerField(default=0, help_text="Time spent on this question in seconds")
+    client_seq = models.PositiveIntegerField(default=0, help_text="Nomor urut delta autosave terakhir dari client")
     
     class Meta:
         unique_together = ['session', 'question']
@@ -479,21 +565,109 @@ class SystemLog(models.Model):
     def __str__(self):
         return f"{self.get_level_display()} - {self.action}"
 
+
+class SystemStats(models.Model):
+    """
+    Rollup statistik sistem untuk dashboard admin (satu baris, pk=1).
+    Diperbarui incremental dengan F() saat user/exam/session dibuat dan
+    session selesai, lalu dicocokkan ulang berkala oleh reconcile_stats
+    (lihat exam/stats.py).
+    """
+    total_users = models.PositiveIntegerField(default=0)
+    total_students = models.PositiveIntegerField(default=0)
+    total_teachers = models.PositiveIntegerField(default=0)
+    total_exams = models.PositiveIntegerField(default=0)
+    total_sessions = models.PositiveIntegerField(default=0)
+    active_sessions = models.IntegerField(default=0)
+    completed_sessions = models.PositiveIntegerField(default=0)
+    passed_sessions = models.PositiveIntegerField(default=0)
+    # Untuk rata-rata skor: score_sum / scored_sessions
+    score_sum = models.FloatField(default=0)
+    scored_sessions = models.PositiveIntegerField(default=0)
+    # Counter harian, di-reset saat today_date berganti
+    today_date = models.DateField(null=True, blank=True)
+    today_exams = models.PositiveIntegerField(default=0)
+    today_sessions = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'System stats'
+
+    def __str__(self):
+        return f"System stats ({self.updated_at:%Y-%m-%d %H:%M})"
+
+
+class ExamStats(models.Model):
+    """
+    Rollup statistik semua session satu exam (sama untuk semua viewer
+    exam_details). Diperbarui dengan F() saat session dibuat, selesai, atau
+    dinilai ulang; dihitung ulang penuh kalau passing_score exam berubah
+    dan berkala oleh reconcile_stats (lihat exam/stats.py).
+    """
+    exam = models.OneToOneField(Exam, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    total_attempts = models.PositiveIntegerField(default=0)
+    completed_attempts = models.PositiveIntegerField(default=0)
+    passed_attempts = models.PositiveIntegerField(default=0)
+    # Untuk rata-rata skor session selesai: score_sum / scored_attempts
+    score_sum = models.FloatField(default=0)
+    scored_attempts = models.PositiveIntegerField(default=0)
+    # passing_score yang dipakai menghitung passed_attempts
+    passing_score = models.IntegerField(default=60)
+    updated_at = models.DateTimeField(auto_now=True)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'Exam stats'
+
+    def __str__(self):
+        return f"Stats {self.exam_id}"
+
 # Signal handlers untuk automation
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.db.models.functions import Coalesce
 from django.dispatch import receiver
+from .caching import invalidate_exam
 
 @receiver(post_save, sender=ExamSession)
 def update_exam_session_stats(sender, instance, **kwargs):
     if instance.is_completed and instance.status == 'completed':
-        # Update question counts
-        instance.answered_questions = instance.user_answers.count()
-        instance.correct_answers = instance.user_answers.filter(is_correct=True).count()
-        instance.wrong_answers = instance.answered_questions - instance.correct_answers
-        instance.save()
-        
-        # Calculate final score
+        # calculate_score() menulis lewat update(), jadi signal ini tidak terpanggil ulang
         instance.calculate_score()
+    if instance.is_completed:
+        from .stats import invalidate_student_stats
+        invalidate_student_stats(instance.user_id)
+
+
+def refresh_exam_content(exam_id):
+    """
+    Bump versi konten exam supaya payload yang di-cache ikut diperbarui,
+    sekaligus hitung ulang Exam.total_points dalam query yang sama.
+    Dipanggil manual setelah bulk_create soal (tidak memicu signal).
+    """
+    total_points = Question.objects.filter(
+        exam=models.OuterRef('pk')
+    ).order_by().values('exam').annotate(total=models.Sum('points')).values('total')
+    Exam.objects.filter(pk=exam_id).update(
+        updated_at=timezone.now(),
+        total_points=Coalesce(models.Subquery(total_points), 0),
+    )
+    invalidate_exam(exam_id)
+
+
+@receiver([post_save, post_delete], sender=Question)
+def touch_exam_on_question_change(sender, instance, **kwargs):
+    if instance.exam_id:
+        refresh_exam_content(instance.exam_id)
+
+
+@receiver([post_save, post_delete], sender=Choice)
+def touch_exam_on_choice_change(sender, instance, **kwargs):
+    exam_ids = list(Exam.objects.filter(questions=instance.question_id).values_list('id', flat=True))
+    if exam_ids:
+        Exam.objects.filter(pk__in=exam_ids).update(updated_at=timezone.now())
+        for exam_id in exam_ids:
+            invalidate_exam(exam_id)
 
 class StudentAnswer(models.Model):
     session = models.ForeignKey('ExamSession', on_delete=models.CASCADE, related_name='answers')
@@ -541,6 +715,10 @@ class ExamToken(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Untuk job expiry (lihat exam/tokens.py expire_tokens)
+            models.Index(fields=['status', 'expires_at']),
+        ]
     
     def __str__(self):
         return f"{self.token} - {self.exam.title}"
@@ -548,6 +726,16 @@ class ExamToken(models.Model):
     @property
     def is_expired(self):
         return timezone.now() > self.expires_at or self.used_count >= self.max_usage
+
+    @property
+    def effective_status(self):
+        """Status untuk ditampilkan: expires_at yang berlaku, walaupun job expiry belum jalan"""
+        if self.status == 'active' and self.is_expired:
+            return 'expired'
+        return self.status
+
+    def get_effective_status_display(self):
+        return dict(self.TOKEN_STATUS)[self.effective_status]
     
     @property
     def time_remaining(self):
@@ -561,10 +749,24 @@ class ExamToken(models.Model):
         characters = string.ascii_uppercase + string.digits
         return ''.join(secrets.choice(characters) for _ in range(6))
     
+    @classmethod
+    def generate_unique_tokens(cls, quantity):
+        """
+        ``quantity`` token baru yang belum dipakai. Kandidat dibuat per
+        batch dan dicek bentrok dengan satu query, kekurangannya diisi ulang.
+        """
+        tokens = set()
+        while len(tokens) < quantity:
+            shortfall = quantity - len(tokens)
+            candidates = {cls.generate_token() for _ in range(shortfall + shortfall // 10 + 1)} - tokens
+            taken = set(cls.objects.filter(token__in=candidates).values_list('token', flat=True))
+            tokens |= candidates - taken
+        return list(tokens)[:quantity]
+
     @classmethod
     def create_token(cls, exam, created_by, duration_minutes=15, is_global=False, max_usage=100):
         """Create new token with automatic expiry"""
-        token = cls.generate_token()
+        token = cls.generate_unique_tokens(1)[0]
         expires_at = timezone.now() + timedelta(minutes=duration_minutes)
         
         return cls.objects.create(
@@ -589,7 +791,7 @@ class ExamToken(models.Model):
 
     def refresh_token(self):
         """Refresh expired token dengan durasi yang sama"""
-        if self.status == 'expired':
+        if self.effective_status == 'expired':
             # Hitung durasi original
             original_duration = (self.expires_at - self.created_at).total_seconds() / 60
 
@@ -601,3 +803,52 @@ class ExamToken(models.Model):
             return True
 
         return False
+
+
+# Index token akses di cache (lihat exam/tokens.py) dibuang setiap kali
+# token dibuat, di-revoke, di-renew, atau access_token exam berubah
+@receiver([post_save, post_delete], sender=ExamToken)
+def invalidate_exam_token_index(sender, instance, **kwargs):
+    from .tokens import invalidate_tokens
+    invalidate_tokens(instance.token)
+
+
+@receiver(pre_save, sender=Exam)
+def remember_previous_access_token(sender, instance, **kwargs):
+    instance._previous_access_token = None
+    if instance.pk:
+        instance._previous_access_token = Exam.objects.filter(pk=instance.pk).values_list(
+            'access_token', flat=True
+        ).first()
+
+
+@receiver([post_save, post_delete], sender=Exam)
+def invalidate_exam_access_token_index(sender, instance, **kwargs):
+    from .tokens import invalidate_tokens
+    invalidate_tokens(instance.access_token, getattr(instance, '_previous_access_token', None))
+
+
+# Rollup SystemStats (lihat exam/stats.py). Perubahan lewat update()/bulk_create
+# dicatat langsung oleh pemanggilnya, sisanya dirapikan reconcile_stats.
+@receiver(post_save, sender=CustomUser)
+def count_new_user(sender, instance, created, **kwargs):
+    if created:
+        from .stats import record_users_created
+        record_users_created([instance.user_type])
+
+
+@receiver(post_save, sender=Exam)
+def count_new_exam(sender, instance, created, **kwargs):
+    if created:
+        from .stats import bump_system_stats
+        bump_system_stats(total_exams=1, today_exams=1)
+
+
+@receiver(post_save, sender=ExamSession)
+def count_new_session(sender, instance, created, **kwargs):
+    if created:
+        from .stats import bump_exam_stats, bump_system_stats
+        bump_system_stats(
+            total_sessions=1, today_sessions=1, active_sessions=int(instance.status == 'in_progress'),
+        )
+        bump_exam_stats(instance.exam_id, total_attempts=1)
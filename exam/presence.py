@@ -0,0 +1,133 @@
+"""
+Heartbeat student selama ujian.
+
+Setiap ping hanya menulis ke cache, satu key per session
+(``heartbeat:<session_pk>``): kapan terakhir terlihat dan akumulasi waktu
+pengerjaan. Ping bersamaan dari session yang sama (tab ganda, retry)
+diserialkan dengan lock ``cache.add``, jadi tidak saling menimpa. ExamSession.time_spent dan
+last_seen_at diperbarui berkala oleh command ``flush_heartbeats --loop``
+dengan bulk_update, jadi tidak ada write database per ping.
+
+Butuh cache yang dibagi semua proses (Redis/Memcached). Dengan LocMemCache
+setiap worker punya state heartbeat sendiri dan command flush tidak melihat
+apa pun; system check ``exam.W001`` memperingatkan konfigurasi ini.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import ExamSession
+
+FLUSH_BATCH_SIZE = 1000
+# Lock per session selama read-modify-write state heartbeat
+LOCK_TIMEOUT = 5
+
+
+def _key(session_pk):
+    return f'heartbeat:{session_pk}'
+
+
+def _max_gap():
+    # Jeda lebih dari ini dianggap tidak aktif (tab ditutup, offline)
+    return settings.EXAM_HEARTBEAT_INTERVAL * 2 + 5
+
+
+def record_heartbeat(session, now=None):
+    """Catat ping satu session, return state heartbeat terbaru"""
+    now = (now or timezone.now()).timestamp()
+    key = _key(session.pk)
+    lock = f'{key}:lock'
+    if not cache.add(lock, 1, LOCK_TIMEOUT):
+        # Ping lain untuk session ini sedang ditulis, ping ini cukup dilewati
+        return cache.get(key) or {'last_seen': now, 'time_spent': session.time_spent}
+    try:
+        state = cache.get(key)
+        if state is None:
+            state = {'last_seen': now, 'time_spent': session.time_spent}
+        else:
+            elapsed = now - state['last_seen']
+            if 0 < elapsed <= _max_gap():
+                state['time_spent'] += elapsed
+            state['last_seen'] = max(state['last_seen'], now)
+        cache.set(key, state, settings.HEARTBEAT_CACHE_TIMEOUT)
+    finally:
+        cache.delete(lock)
+    return state
+
+
+def heartbeat_time_spent(session):
+    """Akumulasi waktu dari heartbeat (detik), None kalau belum ada ping"""
+    state = cache.get(_key(session.pk))
+    return int(state['time_spent']) if state else None
+
+
+def clear_heartbeat(session):
+    cache.delete(_key(session.pk))
+
+
+def _as_datetime(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+
+
+def flush_heartbeats(batch_size=FLUSH_BATCH_SIZE):
+    """
+    Tulis state heartbeat semua session in_progress ke database
+    (cache.get_many + bulk_update per batch). Return jumlah session yang diperbarui.
+    """
+    sessions = ExamSession.objects.filter(status='in_progress').values_list(
+        'id', 'time_spent', 'last_seen_at'
+    )
+    updated = 0
+    batch = []
+    for row in sessions.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            updated += _flush_batch(batch)
+            batch = []
+    if batch:
+        updated += _flush_batch(batch)
+    return updated
+
+
+def _flush_batch(rows):
+    states = cache.get_many([_key(session_pk) for session_pk, _, _ in rows])
+    changed = []
+    for session_pk, time_spent, last_seen_at in rows:
+        state = states.get(_key(session_pk))
+        if state is None:
+            continue
+        new_time = int(state['time_spent'])
+        new_seen = _as_datetime(state['last_seen'])
+        if new_time == time_spent and last_seen_at and abs((new_seen - last_seen_at).total_seconds()) < 1:
+            continue
+        changed.append(ExamSession(id=session_pk, time_spent=new_time, last_seen_at=new_seen))
+    ExamSession.objects.bulk_update(changed, ['time_spent', 'last_seen_at'])
+    return len(changed)
+
+
+def exam_presence(exam, now=None):
+    """Status online session in_progress satu exam untuk proctor (1 query + 1 get_many)"""
+    now = now or timezone.now()
+    sessions = list(ExamSession.objects.filter(exam=exam, status='in_progress').values_list(
+        'id', 'user__username', 'user__first_name', 'user__last_name', 'time_spent', 'last_seen_at', 'deadline',
+    ))
+    states = cache.get_many([_key(row[0]) for row in sessions])
+
+    presence = []
+    for session_pk, username, first_name, last_name, time_spent, last_seen_at, deadline in sessions:
+        state = states.get(_key(session_pk))
+        if state:
+            last_seen_at = _as_datetime(state['last_seen'])
+            time_spent = int(state['time_spent'])
+        presence.append({
+            'session_id': session_pk,
+            'username': username,
+            'name': f'{first_name} {last_name}'.strip() or username,
+            'online': bool(last_seen_at) and (now - last_seen_at).total_seconds() <= _max_gap(),
+            'last_seen': last_seen_at.isoformat() if last_seen_at else None,
+            'time_spent': time_spent,
+            'remaining': max(0, int((deadline - now).total_seconds())) if deadline else None,
+        })
+    return presence
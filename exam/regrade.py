@@ -0,0 +1,205 @@
+"""
+Regrade semua session satu exam setelah kunci jawaban dikoreksi.
+
+Seluruh jawaban exam dimuat sekaligus ke array NumPy (satu baris per
+UserAnswer), soal pilihan (MC/TF/MCA) dinilai ulang dalam satu operasi
+vektor, lalu hanya baris yang berubah ditulis dengan ``bulk_update``.
+Soal FB/MAT/ORD tetap memakai scorer di exam/grading.py, essay tidak
+disentuh.
+"""
+from collections import namedtuple
+
+import numpy as np
+from django.db import transaction
+
+from .grading import MANUAL_TYPES, Response, build_answer_key
+from .models import ExamSession, UserAnswer
+from .stats import invalidate_student_stats, record_score_changes
+
+CHOICE_TYPES = ('MC', 'TF', 'MCA')
+BATCH_SIZE = 1000
+
+# Session yang status lulus/tidaknya berubah karena regrade
+PassChange = namedtuple('PassChange', 'session_pk username old_score new_score passed')
+
+
+class RegradeReport:
+    __slots__ = ('exam_id', 'sessions', 'answers_changed', 'sessions_changed', 'pass_changes')
+
+    def __init__(self, exam_id):
+        self.exam_id = exam_id
+        self.sessions = 0
+        self.answers_changed = 0
+        self.sessions_changed = 0
+        self.pass_changes = []
+
+    @property
+    def newly_passed(self):
+        return [change for change in self.pass_changes if change.passed]
+
+    @property
+    def newly_failed(self):
+        return [change for change in self.pass_changes if not change.passed]
+
+
+def _load_responses(exam):
+    """
+    Semua jawaban session yang sudah selesai: ``(rows, selections)``.
+
+    ``rows`` berisi tuple (answer_pk, session_pk, question_id, text,
+    matching, is_correct, points_earned), ``selections`` pasangan
+    (answer_pk, choice_id) dari tabel through. Total 2 query.
+    """
+    rows = list(UserAnswer.objects.filter(
+        session__exam=exam, session__is_completed=True
+    ).values_list(
+        'id', 'session_id', 'question_id', 'text_answer', 'matching_data', 'is_correct', 'points_earned'
+    ).order_by('id'))
+
+    through = UserAnswer.selected_choices.through
+    selections = list(through.objects.filter(
+        useranswer__session__exam=exam, useranswer__session__is_completed=True
+    ).values_list('useranswer_id', 'choice_id'))
+    return rows, selections
+
+
+def _grade_choice_rows(answer_key, question_ids, row_index, selections):
+    """
+    Nilai semua baris sekaligus untuk soal pilihan.
+    Return array ``(selected_count, is_correct, points)``.
+    """
+    n = len(question_ids)
+    correct_choices = {
+        choice_id
+        for entry in answer_key.entries.values()
+        for choice_id in entry.correct
+    }
+    sel_rows = np.fromiter((row_index[answer_pk] for answer_pk, _ in selections), dtype=np.int64, count=len(selections))
+    sel_hits = np.fromiter((choice_id in correct_choices for _, choice_id in selections), dtype=np.float64, count=len(selections))
+
+    selected = np.bincount(sel_rows, minlength=n).astype(np.float64)
+    hits = np.bincount(sel_rows, weights=sel_hits, minlength=n)
+    wrong = selected - hits
+
+    key_size = np.array([len(answer_key[qid].correct) if qid in answer_key else 0 for qid in question_ids], dtype=np.float64)
+    points = np.array([answer_key[qid].points if qid in answer_key else 0 for qid in question_ids], dtype=np.float64)
+    partial = np.array([qid in answer_key and answer_key[qid].question_type == 'MCA' for qid in question_ids])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.where(key_size > 0, (hits - wrong) / key_size, 0.0)
+    exact = (key_size > 0) & (hits == key_size) & (wrong == 0)
+    fraction = np.where(partial, np.clip(fraction, 0.0, 1.0), exact.astype(np.float64))
+    return selected, exact, points * fraction
+
+
+def regrade_exam(exam, batch_size=BATCH_SIZE):
+    """Nilai ulang semua session selesai milik ``exam``, return RegradeReport"""
+    report = RegradeReport(exam.pk)
+    # Kunci dibangun ulang langsung dari database, bukan dari cache
+    answer_key = build_answer_key(exam)
+
+    sessions = list(ExamSession.objects.filter(exam=exam, is_completed=True).values_list(
+        'id', 'user__username', 'score', 'answered_questions', 'correct_answers', 'wrong_answers', 'total_questions',
+        'user_id',
+    ))
+    report.sessions = len(sessions)
+    if not sessions:
+        return report
+
+    rows, selections = _load_responses(exam)
+    n = len(rows)
+    session_index = {session[0]: i for i, session in enumerate(sessions)}
+    row_index = {row[0]: i for i, row in enumerate(rows)}
+    question_ids = [row[2] for row in rows]
+
+    selected, exact, choice_points = _grade_choice_rows(answer_key, question_ids, row_index, selections)
+
+    # state: 1 benar, 0 salah, -1 belum dinilai (essay / soal sudah dihapus)
+    new_state = np.full(n, -1, dtype=np.int8)
+    new_points = np.zeros(n, dtype=np.float64)
+    answered = selected > 0
+    choice_ids = {}
+    for answer_pk, choice_id in selections:
+        choice_ids.setdefault(answer_pk, []).append(choice_id)
+
+    # Soal pilihan langsung dari hasil array, loop hanya untuk baris lainnya
+    is_choice = np.array([
+        qid in answer_key and answer_key[qid].question_type in CHOICE_TYPES for qid in question_ids
+    ], dtype=bool)
+    new_state[is_choice] = exact[is_choice]
+    new_points[is_choice] = choice_points[is_choice]
+
+    for i in np.flatnonzero(~is_choice):
+        answer_pk, _, question_id, text, matching, _, stored_points = rows[i]
+        entry = answer_key.entries.get(question_id)
+        if entry is None:
+            continue
+        answered[i] = answered[i] or bool((text or '').strip() or matching)
+        if entry.question_type in MANUAL_TYPES:
+            new_points[i] = stored_points or 0
+            continue
+        is_correct, points = answer_key.grade(Response(
+            question_id, choice_ids.get(answer_pk, []), text, matching, stored_points,
+        ))
+        new_state[i] = is_correct
+        new_points[i] = points
+
+    old_state = np.array([-1 if row[5] is None else int(row[5]) for row in rows], dtype=np.int8)
+    old_points = np.array([np.nan if row[6] is None else row[6] for row in rows], dtype=np.float64)
+    graded = new_state >= 0
+    changed_rows = np.flatnonzero(graded & (
+        (old_state != new_state) | ~np.isclose(np.nan_to_num(old_points, nan=-1.0), new_points)
+    ))
+
+    # Agregasi per session dengan bincount
+    owner = np.array([session_index[row[1]] for row in rows], dtype=np.int64)
+    m = len(sessions)
+    earned = np.bincount(owner, weights=new_points, minlength=m)
+    answered_count = np.bincount(owner, weights=answered, minlength=m).astype(np.int64)
+    correct_count = np.bincount(owner, weights=answered & (new_state == 1), minlength=m).astype(np.int64)
+    wrong_count = np.bincount(owner, weights=answered & (new_state == 0), minlength=m).astype(np.int64)
+    total_points = answer_key.total_points
+    new_scores = earned / total_points * 100 if total_points > 0 else np.zeros(m)
+
+    updated_answers = [
+        UserAnswer(id=rows[i][0], is_correct=bool(new_state[i]), points_earned=float(new_points[i]))
+        for i in changed_rows
+    ]
+
+    updated_sessions = []
+    changed_users = []
+    score_changes = []
+    for i, (session_pk, username, old_score, *old_counts, user_pk) in enumerate(sessions):
+        new_score = float(new_scores[i])
+        new_counts = [int(answered_count[i]), int(correct_count[i]), int(wrong_count[i]), len(answer_key)]
+        if old_score is not None and np.isclose(old_score, new_score) and old_counts == new_counts:
+            continue
+        changed_users.append(user_pk)
+        score_changes.append((old_score, new_score))
+        updated_sessions.append(ExamSession(
+            id=session_pk,
+            score=new_score,
+            answered_questions=new_counts[0],
+            correct_answers=new_counts[1],
+            wrong_answers=new_counts[2],
+            total_questions=new_counts[3],
+        ))
+        old_passed = old_score is not None and old_score >= exam.passing_score
+        new_passed = new_score >= exam.passing_score
+        if old_passed != new_passed:
+            report.pass_changes.append(PassChange(session_pk, username, old_score, new_score, new_passed))
+
+    # bulk_update tidak memicu signal post_save
+    with transaction.atomic():
+        UserAnswer.objects.bulk_update(updated_answers, ['is_correct', 'points_earned'], batch_size=batch_size)
+        ExamSession.objects.bulk_update(
+            updated_sessions,
+            ['score', 'answered_questions', 'correct_answers', 'wrong_answers', 'total_questions'],
+            batch_size=batch_size,
+        )
+        invalidate_student_stats(*changed_users)
+        record_score_changes(exam, score_changes)
+
+    report.answers_changed = len(updated_answers)
+    report.sessions_changed = len(updated_sessions)
+    return report
@@ -0,0 +1,271 @@
+"""
+Statistik dashboard.
+
+Statistik student (jumlah ujian selesai, lulus, rata-rata) dihitung dengan
+satu aggregate bersyarat dan di-cache per user (``student_stats:<pk>``).
+Entry dibuang setiap kali session user itu selesai atau nilainya berubah
+(submit, sweeper timeout, regrade, save dari admin).
+
+Statistik sistem untuk dashboard admin dibaca dari satu baris
+SystemStats, statistik semua session satu exam (exam_details) dari satu
+baris ExamStats. Counter-nya dinaikkan dengan F() di tempat data berubah
+(signal create, submit, sweeper, regrade, import) dan dihitung ulang
+penuh oleh ``reconcile_system_stats``/``reconcile_exam_stats`` (command
+reconcile_stats).
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Case, Count, F, Q, Sum, Value, When
+from django.utils import timezone
+
+from .models import CustomUser, Exam, ExamSession, ExamStats, SystemStats
+
+# Batas lulus yang dipakai statistik sistem (dashboard admin)
+SYSTEM_PASS_SCORE = 60
+DAILY_FIELDS = ('today_exams', 'today_sessions')
+
+
+def _student_key(user_pk):
+    return f'student_stats:{user_pk}'
+
+
+def compute_student_stats(user):
+    completed = Q(is_completed=True)
+    stats = ExamSession.objects.filter(user=user).aggregate(
+        completed=Count('id', filter=completed),
+        passed=Count('id', filter=completed & Q(score__gte=F('exam__passing_score'))),
+        average_score=Avg('score', filter=completed & Q(score__isnull=False)),
+    )
+    stats['average_score'] = round(stats['average_score'] or 0, 2)
+    stats['success_rate'] = round(stats['passed'] / stats['completed'] * 100, 2) if stats['completed'] else 0
+    return stats
+
+
+def student_stats(user):
+    """``{'completed', 'passed', 'average_score', 'success_rate'}`` untuk satu student"""
+    key = _student_key(user.pk)
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_student_stats(user)
+        cache.set(key, stats, settings.STUDENT_STATS_TIMEOUT)
+    return stats
+
+
+def invalidate_student_stats(*user_pks):
+    """
+    Buang cache statistik user. Dibuang lagi setelah transaksi commit,
+    supaya request lain yang membaca di antaranya tidak menyimpan data lama.
+    """
+    keys = [_student_key(user_pk) for user_pk in set(user_pks)]
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+# ========== SYSTEM STATS ==========
+
+def bump_system_stats(**deltas):
+    """
+    Tambah counter SystemStats secara atomik, misalnya
+    ``bump_system_stats(total_exams=1, today_exams=1)``. Counter harian
+    mulai dari 0 lagi kalau today_date sudah berganti.
+    """
+    today = timezone.localdate()
+    changes = {}
+    for field, delta in deltas.items():
+        if not delta:
+            continue
+        if field in DAILY_FIELDS:
+            changes[field] = Case(When(today_date=today, then=F(field) + delta), default=Value(delta))
+        else:
+            changes[field] = F(field) + delta
+    if not changes:
+        return
+    for field in DAILY_FIELDS:
+        if field not in changes:
+            changes[field] = Case(When(today_date=today, then=F(field)), default=Value(0))
+    changes['today_date'] = today
+    changes['updated_at'] = timezone.now()
+    # Kalau baris belum ada, get_system_stats() akan membuatnya lewat reconcile
+    SystemStats.objects.filter(pk=1).update(**changes)
+
+
+def record_users_created(user_types):
+    """Counter untuk user baru (signal post_save atau bulk_create importer)"""
+    user_types = list(user_types)
+    bump_system_stats(
+        total_users=len(user_types),
+        total_students=user_types.count('student'),
+        total_teachers=user_types.count('teacher'),
+    )
+
+
+def record_sessions_completed(sessions):
+    """
+    Counter untuk session in_progress yang baru selesai. ``sessions`` adalah
+    ExamSession dengan skor baru dan ``exam`` sudah ter-load.
+    """
+    sessions = list(sessions)
+    graded = [session.score for session in sessions if session.score is not None]
+    bump_system_stats(
+        active_sessions=-len(sessions),
+        completed_sessions=len(sessions),
+        passed_sessions=sum(1 for score in graded if score >= SYSTEM_PASS_SCORE),
+        score_sum=sum(graded),
+        scored_sessions=len(graded),
+    )
+
+    by_exam = defaultdict(list)
+    for session in sessions:
+        by_exam[session.exam].append(session.score)
+    for exam, scores in by_exam.items():
+        graded = [score for score in scores if score is not None]
+        bump_exam_stats(
+            exam.pk,
+            completed_attempts=len(scores),
+            passed_attempts=sum(1 for score in graded if score >= exam.passing_score),
+            score_sum=sum(graded),
+            scored_attempts=len(graded),
+        )
+
+
+def _passed_delta(changes, passing_score):
+    return sum(
+        int(new >= passing_score) - int(old is not None and old >= passing_score)
+        for old, new in changes
+    )
+
+
+def record_score_changes(exam, changes):
+    """Counter untuk skor session selesai ``exam`` yang berubah (regrade): list ``(old, new)``"""
+    changes = list(changes)
+    score_sum = sum(new - (old or 0) for old, new in changes)
+    newly_scored = sum(1 for old, _ in changes if old is None)
+    bump_system_stats(
+        passed_sessions=_passed_delta(changes, SYSTEM_PASS_SCORE),
+        score_sum=score_sum,
+        scored_sessions=newly_scored,
+    )
+    bump_exam_stats(
+        exam.pk,
+        passed_attempts=_passed_delta(changes, exam.passing_score),
+        score_sum=score_sum,
+        scored_attempts=newly_scored,
+    )
+
+
+def reconcile_system_stats():
+    """Hitung ulang semua counter dari tabel sumber (4 query) dan simpan"""
+    today = timezone.localdate()
+    users = CustomUser.objects.aggregate(
+        total_users=Count('id'),
+        total_students=Count('id', filter=Q(user_type='student')),
+        total_teachers=Count('id', filter=Q(user_type='teacher')),
+    )
+    exams = Exam.objects.aggregate(
+        total_exams=Count('id'),
+        today_exams=Count('id', filter=Q(created_at__date=today)),
+    )
+    sessions = ExamSession.objects.aggregate(
+        total_sessions=Count('id'),
+        active_sessions=Count('id', filter=Q(status='in_progress')),
+        completed_sessions=Count('id', filter=Q(is_completed=True)),
+        passed_sessions=Count('id', filter=Q(is_completed=True, score__gte=SYSTEM_PASS_SCORE)),
+        score_sum=Sum('score'),
+        scored_sessions=Count('score'),
+        today_sessions=Count('id', filter=Q(start_time__date=today)),
+    )
+    sessions['score_sum'] = sessions['score_sum'] or 0
+    stats, _ = SystemStats.objects.update_or_create(pk=1, defaults={
+        **users, **exams, **sessions, 'today_date': today, 'reconciled_at': timezone.now(),
+    })
+    return stats
+
+
+def get_system_stats():
+    """Statistik dashboard admin dari rollup, satu query"""
+    stats = SystemStats.objects.filter(pk=1).first() or reconcile_system_stats()
+    is_today = stats.today_date == timezone.localdate()
+    return {
+        'total_users': stats.total_users,
+        'total_students': stats.total_students,
+        'total_teachers': stats.total_teachers,
+        'total_exams': stats.total_exams,
+        'total_sessions': stats.total_sessions,
+        'active_sessions': max(stats.active_sessions, 0),
+        'completed_sessions': stats.completed_sessions,
+        'today_exams': stats.today_exams if is_today else 0,
+        'today_sessions': stats.today_sessions if is_today else 0,
+        'avg_score': round(stats.score_sum / stats.scored_sessions, 2) if stats.scored_sessions else 0,
+        'pass_rate': round(stats.passed_sessions / stats.completed_sessions * 100, 2) if stats.completed_sessions else 0,
+        'updated_at': stats.updated_at,
+    }
+
+
+# ========== EXAM STATS ==========
+
+def bump_exam_stats(exam_id, **deltas):
+    """Tambah counter ExamStats satu exam secara atomik (baris dibuat saat pertama dibaca)"""
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if changes:
+        ExamStats.objects.filter(exam_id=exam_id).update(updated_at=timezone.now(), **changes)
+
+
+def _exam_counters(passing_score=F('exam__passing_score')):
+    completed = Q(is_completed=True)
+    return {
+        'total_attempts': Count('id'),
+        'completed_attempts': Count('id', filter=completed),
+        'passed_attempts': Count('id', filter=completed & Q(score__gte=passing_score)),
+        'score_sum': Sum('score', filter=completed),
+        'scored_attempts': Count('score', filter=completed),
+    }
+
+
+def reconcile_exam_stats(exam):
+    """Hitung ulang ExamStats satu exam (1 aggregate) dan simpan"""
+    counters = ExamSession.objects.filter(exam=exam).aggregate(**_exam_counters(exam.passing_score))
+    counters['score_sum'] = counters['score_sum'] or 0
+    stats, _ = ExamStats.objects.update_or_create(exam=exam, defaults={
+        **counters, 'passing_score': exam.passing_score, 'reconciled_at': timezone.now(),
+    })
+    return stats
+
+
+def reconcile_all_exam_stats(batch_size=1000):
+    """Hitung ulang ExamStats semua exam dengan satu aggregate GROUP BY exam, lalu upsert"""
+    now = timezone.now()
+    counters = {
+        row.pop('exam_id'): row
+        for row in ExamSession.objects.order_by().values('exam_id').annotate(**_exam_counters())
+    }
+    empty = dict.fromkeys(_exam_counters(), 0)
+    rows = []
+    for exam_id, passing_score in Exam.objects.values_list('id', 'passing_score'):
+        values = counters.get(exam_id, empty)
+        rows.append(ExamStats(
+            exam_id=exam_id, passing_score=passing_score, reconciled_at=now, updated_at=now,
+            **{**values, 'score_sum': values['score_sum'] or 0},
+        ))
+    ExamStats.objects.bulk_create(
+        rows, batch_size=batch_size, update_conflicts=True, unique_fields=['exam'],
+        update_fields=[*empty, 'passing_score', 'reconciled_at', 'updated_at'],
+    )
+    return len(rows)
+
+
+def get_exam_stats(exam):
+    """Statistik semua session ``exam`` untuk exam_details, satu query"""
+    stats = ExamStats.objects.filter(exam=exam).first()
+    if stats is None or stats.passing_score != exam.passing_score:
+        stats = reconcile_exam_stats(exam)
+    completed = stats.completed_attempts
+    return {
+        'total_attempts': stats.total_attempts,
+        'overall_average_score': round(stats.score_sum / stats.scored_attempts, 2) if stats.scored_attempts else 0,
+        'pass_rate': round(stats.passed_attempts / completed * 100, 2) if completed else 0,
+        'completion_rate': round(completed / stats.total_attempts * 100, 2) if completed else 0,
+    }
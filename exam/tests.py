@@ -1,3 +1,1190 @@
 from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
 
 # Create your tests here.
+import csv
+import importlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from unittest import mock
+from datetime import timedelta
+
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    Choice, CustomUser, Department, Exam, ExamSession, ExamStats, ExamToken, Question, UserAnswer,
+)
+from .answers import Delta, buffer_answer_deltas, coalesce_deltas, flush_answer_buffers, parse_deltas
+from .caching import build_exam_payload, exam_version
+from .grading import close_expired_sessions, get_answer_key, submit_session
+from .gradebook import build_gradebook
+from .jobs import get_job, submit_job
+from .checks import shared_cache_check
+from .presence import flush_heartbeats, heartbeat_time_spent, record_heartbeat
+from .analysis import build_item_analysis, get_item_analysis
+from .stats import get_exam_stats, get_system_stats, reconcile_exam_stats, reconcile_system_stats, student_stats
+from .regrade import regrade_exam
+from .tokens import active_exam_token, expire_tokens, mint_tokens
+from . import importers
+from .admin import ExamAdmin, admin_site
+
+
+class ExamTestMixin:
+    """Data minimal: 1 teacher, 1 student, 1 exam yang sedang berlangsung"""
+
+    def setUp(self):
+        cache.clear()
+        self.spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spool_dir, ignore_errors=True)
+        self.job_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.job_dir, ignore_errors=True)
+        override = self.settings(ANSWER_SPOOL_DIR=self.spool_dir, JOB_OUTPUT_DIR=self.job_dir, JOBS_RUN_INLINE=True)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.department = Department.objects.create(name='Informatika', code='INF')
+        self.teacher = CustomUser.objects.create_user('teacher', password='secret', user_type='teacher')
+        self.student = CustomUser.objects.create_user(
+            'student', password='secret', user_type='student', department=self.department
+        )
+        now = timezone.now()
+        self.exam = Exam.objects.create(
+            title='Ujian', description='-', duration_minutes=60, status='published',
+            start_time=now - timedelta(hours=1), end_time=now + timedelta(hours=2),
+            created_by=self.teacher,
+        )
+
+    def add_questions(self, count, exam=None):
+        exam = exam or self.exam
+        questions = []
+        for i in range(count):
+            question = Question.objects.create(
+                question_type='MC', text=f'Soal {i}', exam=exam, created_by=self.teacher
+            )
+            for j in range(4):
+                Choice.objects.create(question=question, text=f'Pilihan {j}', is_correct=(j == 0), order=j)
+            questions.append(question)
+        return questions
+
+    def start_session(self):
+        self.client.force_login(self.student)
+        self.client.get(reverse('exam:take_exam', args=[self.exam.id]))
+        return ExamSession.objects.get(user=self.student, exam=self.exam)
+
+    def submit(self, deltas):
+        return self.client.post(
+            reverse('exam:submit_exam', args=[self.exam.id]),
+            json.dumps({'deltas': deltas, 'time_spent': 120}),
+            content_type='application/json',
+        )
+
+
+class ExamCacheTests(ExamTestMixin, TestCase):
+    def version(self):
+        self.exam.refresh_from_db()
+        return exam_version(self.exam)
+
+    def test_question_and_choice_changes_bump_version(self):
+        question = self.add_questions(1)[0]
+        versions = [self.version()]
+
+        question.text = 'Soal baru'
+        question.save()
+        versions.append(self.version())
+        choice = question.choices.first()
+        choice.text = 'Pilihan baru'
+        choice.save()
+        versions.append(self.version())
+        choice.delete()
+        versions.append(self.version())
+        question.delete()
+        versions.append(self.version())
+
+        self.assertEqual(len(set(versions)), 5)
+
+    def test_take_exam_serves_fresh_payload_after_edit(self):
+        question = self.add_questions(1)[0]
+        self.start_session()
+        response = self.client.get(reverse('exam:take_exam', args=[self.exam.id]))
+        self.assertIn('Soal 0', response.context['questions_data'])
+
+        question.text = 'Soal diperbaiki'
+        question.save()
+        choice = question.choices.get(order=1)
+        choice.text = 'Pilihan diperbaiki'
+        choice.save()
+
+        data = self.client.get(reverse('exam:take_exam', args=[self.exam.id])).context['questions_data']
+        self.assertIn('Soal diperbaiki', data)
+        self.assertIn('Pilihan diperbaiki', data)
+        self.assertNotIn('Soal 0', data)
+
+    def test_payload_leaves_out_fill_blank_answers(self):
+        question = Question.objects.create(question_type='FB', text='Ibu kota?', exam=self.exam, created_by=self.teacher)
+        Choice.objects.create(question=question, text='Jakarta', is_correct=True)
+        self.exam.refresh_from_db()
+
+        payload = build_exam_payload(self.exam)
+
+        self.assertEqual(payload[0]['options'], [])
+        self.assertNotIn('Jakarta', json.dumps(payload))
+
+class QuestionChunkTests(ExamTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_questions(6)
+        self.start_session()
+        self.url = reverse('exam:exam_questions_chunk', args=[self.exam.id])
+
+    def chunk(self, **params):
+        return self.client.get(self.url, params).json()
+
+    def test_start_and_count_are_clamped(self):
+        ids = [question['id'] for question in self.chunk(start=0, count=6)['questions']]
+
+        with self.settings(EXAM_QUESTION_CHUNK_MAX=4):
+            data = self.chunk(start=2, count=2)
+            self.assertEqual((data['total'], data['start']), (6, 2))
+            self.assertEqual([question['id'] for question in data['questions']], ids[2:4])
+            self.assertEqual(len(self.chunk(start=0, count=100)['questions']), 4)
+            self.assertEqual(len(self.chunk(start=0, count=0)['questions']), 1)
+            self.assertEqual(self.chunk(start=-5, count=2)['start'], 0)
+            self.assertEqual([question['id'] for question in self.chunk(start=5, count=4)['questions']], ids[5:])
+            self.assertEqual(self.chunk(start=10)['questions'], [])
+        self.assertEqual(self.client.get(self.url, {'start': 'x'}).status_code, 400)
+
+    def test_matching_etag_returns_not_modified(self):
+        response = self.client.get(self.url, {'start': 0, 'count': 2})
+        etag = response['ETag']
+
+        response = self.client.get(self.url, {'start': 0, 'count': 2}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        # Range lain punya ETag sendiri
+        self.assertEqual(self.client.get(self.url, {'start': 2, 'count': 2}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_rejects_student_without_own_open_session(self):
+        other = CustomUser.objects.create_user('student2', password='secret', user_type='student')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+        self.client.force_login(self.student)
+        ExamSession.objects.filter(user=self.student).update(end_time=timezone.now(), is_completed=True)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class SubmitExamTests(ExamTestMixin, TestCase):
+    # Batas query submit_exam, tidak boleh naik mengikuti jumlah soal
+    # (termasuk UPDATE klaim session dan counter SystemStats/ExamStats)
+    QUERY_BUDGET = 23
+
+    def build_deltas(self, questions, correct):
+        deltas = []
+        for seq, question in enumerate(questions, start=1):
+            choices = list(question.choices.order_by('order'))
+            choice = choices[0] if seq <= correct else choices[1]
+            deltas.append({'question_id': question.id, 'choice_ids': [choice.id], 'seq': seq})
+        return deltas
+
+    def test_submit_grades_all_answers(self):
+        questions = self.add_questions(10)
+        session = self.start_session()
+
+        response = self.submit(self.build_deltas(questions, correct=7))
+
+        self.assertEqual(response.status_code, 200)
+        session.refresh_from_db()
+        self.assertTrue(session.is_completed)
+        self.assertEqual(session.status, 'completed')
+        self.assertEqual(session.answered_questions, 10)
+        self.assertEqual(session.correct_answers, 7)
+        self.assertEqual(session.wrong_answers, 3)
+        self.assertAlmostEqual(session.score, 70.0)
+        self.assertEqual(UserAnswer.objects.filter(session=session, is_correct=True).count(), 7)
+        self.assertEqual(UserAnswer.selected_choices.through.objects.filter(useranswer__session=session).count(), 10)
+
+    def test_submit_query_count_is_constant(self):
+        questions = self.add_questions(50)
+        self.start_session()
+        deltas = self.build_deltas(questions, correct=25)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.submit(deltas)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(queries), self.QUERY_BUDGET, [q['sql'] for q in queries])
+
+    def test_submit_keeps_newer_autosaved_answer(self):
+        question = self.add_questions(1)[0]
+        session = self.start_session()
+        correct, wrong = list(question.choices.order_by('order'))[:2]
+
+        self.client.post(
+            reverse('exam:autosave_answers', args=[self.exam.id]),
+            json.dumps({'deltas': [{'question_id': question.id, 'choice_ids': [correct.id], 'seq': 5}]}),
+            content_type='application/json',
+        )
+        self.submit([{'question_id': question.id, 'choice_ids': [wrong.id], 'seq': 4}])
+
+        session.refresh_from_db()
+        self.assertEqual(session.correct_answers, 1)
+
+
+    def test_second_submit_does_not_regrade_or_count_twice(self):
+        questions = self.add_questions(4)
+        session = self.start_session()
+        # Objek yang dibaca request kedua sebelum request pertama selesai
+        stale = ExamSession.objects.get(pk=session.pk)
+        self.submit(self.build_deltas(questions, correct=3))
+        system_before = get_system_stats()
+        exam_before = get_exam_stats(self.exam)
+        attempts = ExamStats.objects.values_list('completed_attempts', 'score_sum').get(exam=self.exam)
+
+        submit_session(stale, self.exam, parse_deltas(self.build_deltas(questions, correct=0)))
+
+        session.refresh_from_db()
+        self.assertAlmostEqual(session.score, 75.0)
+        self.assertAlmostEqual(stale.score, 75.0)
+        self.assertEqual(UserAnswer.objects.filter(session=session, is_correct=True).count(), 3)
+        self.assertEqual(get_system_stats(), system_before)
+        self.assertEqual(get_exam_stats(self.exam), exam_before)
+        self.assertEqual(ExamStats.objects.values_list('completed_attempts', 'score_sum').get(exam=self.exam), attempts)
+        self.assertEqual(close_expired_sessions(), 0)
+
+
+class ShuffleOrderTests(ExamTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.exam.shuffle_questions = True
+        self.exam.save()
+        self.add_questions(20)
+
+    def question_order(self, user):
+        self.client.force_login(user)
+        self.client.get(reverse('exam:take_exam', args=[self.exam.id]))
+        response = self.client.get(reverse('exam:exam_questions_chunk', args=[self.exam.id]), {'count': 20})
+        return [question['id'] for question in response.json()['questions']]
+
+    def test_each_session_has_its_own_stable_order(self):
+        other = CustomUser.objects.create_user('student2', password='secret', user_type='student')
+
+        first = self.question_order(self.student)
+        self.assertNotEqual(self.question_order(other), first)
+        # Reload / resume memakai seed yang sama
+        self.assertEqual(self.question_order(self.student), first)
+
+    def test_migration_gives_existing_sessions_their_own_seed(self):
+        other = CustomUser.objects.create_user('student2', password='secret', user_type='student')
+        for user in (self.student, other):
+            ExamSession.objects.create(user=user, exam=self.exam, start_time=timezone.now())
+        ExamSession.objects.update(shuffle_seed=42)
+
+        migration = importlib.import_module('exam.migrations.0002_examsession_shuffle_seed')
+        migration.fill_shuffle_seeds(django_apps, None)
+
+        self.assertEqual(len(set(ExamSession.objects.values_list('shuffle_seed', flat=True))), 2)
+
+
+class AutosaveTests(ExamTestMixin, TestCase):
+    def autosave(self, deltas):
+        return self.client.post(
+            reverse('exam:autosave_answers', args=[self.exam.id]),
+            json.dumps({'deltas': deltas}),
+            content_type='application/json',
+        )
+
+    def test_parse_deltas_rejects_malformed_input(self):
+        for raw in (
+            {'question_id': 1},
+            ['delta'],
+            [{'question_id': 1, 'choice_ids': 5, 'seq': 1}],
+            [{'question_id': 1, 'choice_ids': [], 'seq': 1, 'text': 5}],
+            [{'question_id': 1, 'choice_ids': [], 'seq': 1, 'matching': 'a'}],
+            [{'question_id': 1, 'choice_ids': []}],
+            [{'question_id': 'satu', 'choice_ids': [], 'seq': 1}],
+            [{'question_id': 1, 'choice_ids': ['x'], 'seq': 1}],
+        ):
+            with self.subTest(raw=raw), self.assertRaises(ValueError):
+                parse_deltas(raw)
+
+        self.assertEqual(parse_deltas([{'question_id': '3', 'choice_ids': [9, '2', 9], 'seq': 4}]),
+                         [Delta(3, [2, 9], 4, None, None)])
+
+    def test_out_of_order_seq_is_ignored(self):
+        question = self.add_questions(1)[0]
+        first, second = list(question.choices.order_by('order'))[:2]
+        session = self.start_session()
+
+        latest = coalesce_deltas(parse_deltas([
+            {'question_id': question.id, 'choice_ids': [second.id], 'seq': 5},
+            {'question_id': question.id, 'choice_ids': [first.id], 'seq': 3},
+        ]))
+        self.assertEqual(latest[question.id].choice_ids, [second.id])
+
+        response = self.autosave([
+            {'question_id': question.id, 'choice_ids': [second.id], 'seq': 5},
+            {'question_id': question.id, 'choice_ids': [first.id], 'seq': 3},
+        ])
+        self.assertEqual(response.json(), {'saved': 2, 'acked_seq': 5})
+        # Delta lama yang datang belakangan (retry) tidak menimpa jawaban
+        self.assertEqual(self.autosave([{'question_id': question.id, 'choice_ids': [first.id], 'seq': 4}]).json(),
+                         {'saved': 1, 'acked_seq': 4})
+        flush_answer_buffers()
+
+        answer = UserAnswer.objects.get(session=session)
+        self.assertEqual(answer.client_seq, 5)
+        self.assertEqual(list(answer.selected_choices.values_list('id', flat=True)), [second.id])
+
+    def test_flush_writes_buffered_deltas_in_bulk(self):
+        mca = Question.objects.create(question_type='MCA', text='MCA', exam=self.exam, created_by=self.teacher)
+        options = [Choice.objects.create(question=mca, text=str(i), is_correct=i < 2, order=i) for i in range(3)]
+        essay = Question.objects.create(question_type='ESS', text='Essay', exam=self.exam, created_by=self.teacher)
+        session = self.start_session()
+        session.exam = self.exam
+
+        saved = buffer_answer_deltas(session, parse_deltas([
+            {'question_id': mca.id, 'choice_ids': [options[0].id], 'seq': 1},
+            {'question_id': mca.id, 'choice_ids': [options[0].id, options[2].id], 'seq': 2},
+            {'question_id': essay.id, 'choice_ids': [], 'text': 'Jawaban', 'seq': 3},
+            # Pilihan milik soal lain dibuang
+            {'question_id': essay.id, 'choice_ids': [options[1].id], 'seq': 4},
+        ]))
+        self.assertEqual(saved, 3)
+        self.assertFalse(UserAnswer.objects.filter(session=session).exists())
+
+        call_command('flush_answers', stdout=io.StringIO())
+
+        answers = {answer.question_id: answer for answer in UserAnswer.objects.filter(session=session)}
+        self.assertEqual((answers[mca.id].client_seq, answers[essay.id].client_seq), (2, 3))
+        self.assertEqual(answers[essay.id].text_answer, 'Jawaban')
+        self.assertEqual(
+            sorted(UserAnswer.selected_choices.through.objects.filter(
+                useranswer__session=session,
+            ).values_list('useranswer__question_id', 'choice_id')),
+            [(mca.id, options[0].id), (mca.id, options[2].id)],
+        )
+        self.assertEqual(os.listdir(self.spool_dir), [])
+
+    def test_without_fcntl_deltas_are_written_directly(self):
+        question = self.add_questions(1)[0]
+        choice = question.choices.get(order=0)
+        session = self.start_session()
+        session.exam = self.exam
+
+        with mock.patch('exam.answers.fcntl', None):
+            saved = buffer_answer_deltas(session, parse_deltas([
+                {'question_id': question.id, 'choice_ids': [choice.id], 'seq': 1},
+            ]))
+
+        self.assertEqual(saved, 1)
+        self.assertEqual(os.listdir(self.spool_dir), [])
+        answer = UserAnswer.objects.get(session=session)
+        self.assertEqual(list(answer.selected_choices.values_list('id', flat=True)), [choice.id])
+
+    def test_invalid_request_body_is_rejected(self):
+        self.start_session()
+        self.assertEqual(self.autosave({'question_id': 1}).status_code, 400)
+
+class GradingEngineTests(ExamTestMixin, TestCase):
+    def add_question(self, question_type, choices, points=4):
+        question = Question.objects.create(
+            question_type=question_type, text=question_type, points=points,
+            exam=self.exam, created_by=self.teacher,
+        )
+        return question, [
+            Choice.objects.create(question=question, text=text, is_correct=is_correct, order=order)
+            for order, (text, is_correct) in enumerate(choices)
+        ]
+
+    def test_mixed_question_types(self):
+        mca, options = self.add_question('MCA', [('A', True), ('B', True), ('C', False), ('D', False)])
+        fb, _ = self.add_question('FB', [('Jakarta', True), ('DKI Jakarta', True)])
+        mat, pairs = self.add_question('MAT', [('1 | satu', False), ('2 | dua', False)])
+        ord_, steps = self.add_question('ORD', [('a', False), ('b', False), ('c', False), ('d', False)])
+        session = self.start_session()
+
+        self.submit([
+            # Delta seq 2 menimpa seq 1: 1 dari 2 kunci -> setengah poin
+            {'question_id': mca.id, 'choice_ids': [options[0].id, options[2].id], 'seq': 1},
+            {'question_id': mca.id, 'choice_ids': [options[0].id], 'seq': 2},
+            {'question_id': fb.id, 'choice_ids': [], 'text': '  jakarta ', 'seq': 3},
+            {'question_id': mat.id, 'choice_ids': [], 'seq': 4,
+             'matching': {str(pairs[0].id): 'Satu', str(pairs[1].id): 'satu'}},
+            {'question_id': ord_.id, 'choice_ids': [], 'seq': 5,
+             'matching': [steps[0].id, steps[1].id, steps[3].id, steps[2].id]},
+        ])
+
+        answers = {a.question_id: a for a in UserAnswer.objects.filter(session=session)}
+        self.assertEqual(answers[mca.id].points_earned, 2.0)
+        self.assertFalse(answers[mca.id].is_correct)
+        self.assertTrue(answers[fb.id].is_correct)
+        self.assertEqual(answers[mat.id].points_earned, 2.0)
+        self.assertEqual(answers[ord_.id].points_earned, 2.0)
+
+        session.refresh_from_db()
+        self.assertEqual(session.answered_questions, 4)
+        self.assertEqual(session.correct_answers, 1)
+        self.assertAlmostEqual(session.score, 10 / 16 * 100)
+
+    def test_cached_answer_key_is_rebuilt_after_choice_edit(self):
+        question, choices = self.add_question('MC', [('A', True), ('B', False)])
+        self.exam.refresh_from_db()
+        self.assertEqual(get_answer_key(self.exam)[question.id].correct, {choices[0].id})
+
+        # Admin membetulkan kunci jawaban
+        choices[0].is_correct = False
+        choices[0].save()
+        choices[1].is_correct = True
+        choices[1].save()
+
+        self.exam.refresh_from_db()
+        self.assertEqual(get_answer_key(self.exam)[question.id].correct, {choices[1].id})
+        session = self.start_session()
+        self.submit([{'question_id': question.id, 'choice_ids': [choices[1].id], 'seq': 1}])
+        session.refresh_from_db()
+        self.assertAlmostEqual(session.score, 100.0)
+
+    def test_payload_hides_answer_key(self):
+        self.add_question('FB', [('Jakarta', True)])
+        self.add_question('MAT', [('1 | satu', False)])
+        self.start_session()
+
+        response = self.client.get(
+            reverse('exam:exam_questions_chunk', args=[self.exam.id]), {'start': 0, 'count': 10}
+        )
+
+        body = response.content.decode()
+        self.assertNotIn('Jakarta', body)
+        self.assertIn('"targets": ["satu"]', body)
+
+
+class RegradeExamTests(ExamTestMixin, TestCase):
+    def test_regrade_after_key_correction(self):
+        questions = self.add_questions(10)
+        session = self.start_session()
+        deltas = []
+        for seq, question in enumerate(questions, start=1):
+            choices = list(question.choices.order_by('order'))
+            # 5 soal pertama dijawab pilihan kedua
+            choice = choices[1] if seq <= 5 else choices[0]
+            deltas.append({'question_id': question.id, 'choice_ids': [choice.id], 'seq': seq})
+        self.submit(deltas)
+        session.refresh_from_db()
+        self.assertAlmostEqual(session.score, 50.0)
+
+        # Kunci soal pertama ternyata pilihan kedua
+        first = list(questions[0].choices.order_by('order'))
+        first[0].is_correct = False
+        first[0].save()
+        first[1].is_correct = True
+        first[1].save()
+        self.exam.refresh_from_db()
+
+        with CaptureQueriesContext(connection) as queries:
+            report = regrade_exam(self.exam)
+
+        session.refresh_from_db()
+        self.assertAlmostEqual(session.score, 60.0)
+        self.assertEqual(session.correct_answers, 6)
+        self.assertEqual(report.answers_changed, 1)
+        self.assertEqual([change.session_pk for change in report.newly_passed], [session.pk])
+        self.assertLessEqual(len(queries), 11)
+
+
+    def test_admin_action_posts_one_capped_message(self):
+        questions = self.add_questions(1)
+        question = questions[0]
+        first, second = list(question.choices.order_by('order'))[:2]
+        for i in range(4):
+            user = CustomUser.objects.create_user(f'siswa{i}', password='secret', user_type='student')
+            session = ExamSession.objects.create(user=user, exam=self.exam, start_time=timezone.now())
+            submit_session(session, self.exam, parse_deltas([
+                {'question_id': question.id, 'choice_ids': [first.id], 'seq': 1},
+            ]))
+        Choice.objects.filter(pk=first.pk).update(is_correct=False)
+        second.is_correct = True
+        second.save()
+
+        model_admin = ExamAdmin(Exam, admin_site)
+        with mock.patch.object(ExamAdmin, 'message_user') as message_user, \
+                mock.patch('exam.admin.REGRADE_MESSAGE_NAMES', 2):
+            model_admin.regrade_exams(None, Exam.objects.filter(pk=self.exam.pk))
+
+        message_user.assert_called_once()
+        message = message_user.call_args.args[1]
+        self.assertIn('4 now failed', message)
+        self.assertEqual(message.count('(failed)'), 2)
+        self.assertIn('(failed) and 2 more', message)
+        self.assertIn(f'regrade_exam {self.exam.pk}', message)
+
+class ScoreMaterializationTests(ExamTestMixin, TestCase):
+    def test_total_points_follows_questions(self):
+        questions = self.add_questions(3)
+        questions[0].points = 5
+        questions[0].save()
+        self.exam.refresh_from_db()
+        self.assertEqual(self.exam.total_points, 7)
+
+        questions[1].delete()
+        self.exam.refresh_from_db()
+        self.assertEqual(self.exam.total_points, 6)
+
+    def test_completing_session_materializes_score_once(self):
+        questions = self.add_questions(4)
+        session = self.start_session()
+        for question in questions[:3]:
+            answer = UserAnswer.objects.create(
+                session=session, question=question, is_correct=question is not questions[2],
+                points_earned=1 if question is not questions[2] else 0,
+            )
+            answer.selected_choices.add(question.choices.get(order=0 if question is not questions[2] else 1))
+        # Jawaban yang sudah dikosongkan lagi tidak dihitung dijawab/salah
+        UserAnswer.objects.create(session=session, question=questions[3], is_correct=False, points_earned=0, text_answer='  ')
+
+        session.is_completed = True
+        session.status = 'completed'
+        with CaptureQueriesContext(connection) as queries:
+            session.save()
+
+        session.refresh_from_db()
+        self.assertAlmostEqual(session.score, 50.0)
+        self.assertEqual(session.answered_questions, 3)
+        self.assertEqual(session.correct_answers, 2)
+        self.assertEqual(session.wrong_answers, 1)
+        # save + aggregate + exam + update
+        self.assertLessEqual(len(queries), 4)
+
+
+class SessionDeadlineTests(ExamTestMixin, TestCase):
+    def test_deadline_is_capped_by_exam_end(self):
+        self.exam.end_time = timezone.now() + timedelta(minutes=15)
+        self.exam.save()
+        session = self.start_session()
+        self.assertEqual(session.deadline, self.exam.end_time)
+
+    def test_sweeper_closes_expired_sessions_with_buffered_answers(self):
+        questions = self.add_questions(2)
+        session = self.start_session()
+        correct = questions[0].choices.get(is_correct=True)
+        self.client.post(
+            reverse('exam:autosave_answers', args=[self.exam.id]),
+            json.dumps({'deltas': [{'question_id': questions[0].id, 'choice_ids': [correct.id], 'seq': 1}]}),
+            content_type='application/json',
+        )
+        ExamSession.objects.filter(pk=session.pk).update(deadline=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(close_expired_sessions(), 1)
+
+        session.refresh_from_db()
+        self.assertEqual(session.status, 'timeout')
+        self.assertTrue(session.is_completed)
+        self.assertEqual(session.end_time, session.deadline)
+        self.assertAlmostEqual(session.score, 50.0)
+        self.assertEqual(close_expired_sessions(), 0)
+
+    def test_sweeper_skips_session_claimed_by_submit(self):
+        session = self.start_session()
+        ExamSession.objects.filter(pk=session.pk).update(
+            deadline=timezone.now() - timedelta(minutes=1), is_completed=True,
+        )
+
+        self.assertEqual(close_expired_sessions(), 0)
+        session.refresh_from_db()
+        self.assertEqual(session.status, 'in_progress')
+
+    def test_autosave_after_deadline_is_rejected(self):
+        question = self.add_questions(1)[0]
+        session = self.start_session()
+        ExamSession.objects.filter(pk=session.pk).update(deadline=timezone.now() - timedelta(minutes=5))
+
+        response = self.client.post(
+            reverse('exam:autosave_answers', args=[self.exam.id]),
+            json.dumps({'deltas': [{'question_id': question.id, 'choice_ids': [], 'seq': 1}]}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 409)
+
+
+class HeartbeatTests(ExamTestMixin, TestCase):
+    def test_heartbeats_accumulate_in_cache_and_flush_in_bulk(self):
+        session = self.start_session()
+        start = timezone.now()
+        record_heartbeat(session, now=start)
+        with CaptureQueriesContext(connection) as queries:
+            record_heartbeat(session, now=start + timedelta(seconds=10))
+            # Jeda terlalu lama (offline) tidak dihitung
+            record_heartbeat(session, now=start + timedelta(minutes=10))
+        self.assertEqual(len(queries), 0)
+
+        self.assertEqual(flush_heartbeats(), 1)
+        session.refresh_from_db()
+        self.assertEqual(session.time_spent, 10)
+        self.assertEqual(session.last_seen_at, start + timedelta(minutes=10))
+        self.assertEqual(flush_heartbeats(), 0)
+
+    def test_concurrent_pings_do_not_overwrite_each_other(self):
+        session = self.start_session()
+        other_student = CustomUser.objects.create_user('student2', password='secret', user_type='student')
+        other = ExamSession.objects.create(user=other_student, exam=self.exam, start_time=timezone.now())
+        start = timezone.now()
+        record_heartbeat(session, now=start)
+        record_heartbeat(other, now=start)
+
+        # Ping yang datang saat ping lain session ini sedang ditulis dilewati
+        cache.add(f'heartbeat:{session.pk}:lock', 1)
+        self.assertEqual(record_heartbeat(session, now=start + timedelta(seconds=5))['time_spent'], 0)
+        cache.delete(f'heartbeat:{session.pk}:lock')
+
+        record_heartbeat(session, now=start + timedelta(seconds=10))
+        record_heartbeat(other, now=start + timedelta(seconds=20))
+        self.assertEqual(heartbeat_time_spent(session), 10)
+        self.assertEqual(heartbeat_time_spent(other), 20)
+
+    def test_presence_for_proctor(self):
+        self.client.force_login(self.student)
+        self.start_session()
+        self.client.post(reverse('exam:exam_heartbeat', args=[self.exam.id]))
+
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('exam:exam_presence', args=[self.exam.id]))
+
+        data = response.json()
+        self.assertEqual(data['online'], 1)
+        self.assertEqual(data['sessions'][0]['username'], 'student')
+
+        other = CustomUser.objects.create_user('teacher2', password='secret', user_type='teacher')
+        self.client.force_login(other)
+        response = self.client.get(reverse('exam:exam_presence', args=[self.exam.id]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_flush_command_requires_shared_cache(self):
+        self.assertEqual([message.id for message in shared_cache_check(None)], ['exam.W001'])
+        with self.assertRaises(CommandError):
+            call_command('flush_heartbeats', stdout=io.StringIO())
+
+
+class TokenValidationTests(ExamTestMixin, TestCase):
+    def validate(self, token):
+        return self.client.post(
+            reverse('exam:validate_exam_token'), json.dumps({'token': token}), content_type='application/json'
+        ).json()
+
+    def test_usage_is_consumed_atomically_up_to_max_usage(self):
+        token = ExamToken.create_token(self.exam, self.teacher, max_usage=2)
+        self.client.force_login(self.student)
+
+        self.assertTrue(self.validate(token.token)['valid'])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(self.validate(token.token.lower())['valid'])
+        # Token sudah ada di index cache, sisa query hanya UPDATE kuota
+        token_queries = [q['sql'] for q in queries if 'exam_examtoken' in q['sql']]
+        self.assertEqual(len(token_queries), 1, token_queries)
+
+        self.assertFalse(self.validate(token.token)['valid'])
+
+        token.refresh_from_db()
+        self.assertEqual(token.used_count, 2)
+        self.assertEqual(token.effective_status, 'expired')
+
+    def test_revoked_token_is_dropped_from_index(self):
+        token = ExamToken.create_token(self.exam, self.teacher)
+        self.client.force_login(self.student)
+        self.assertTrue(self.validate(token.token)['valid'])
+
+        token.revoke_token()
+
+        self.assertFalse(self.validate(token.token)['valid'])
+
+    def test_creating_new_token_drops_replaced_token_from_index(self):
+        token = ExamToken.create_token(self.exam, self.teacher)
+        self.client.force_login(self.student)
+        self.assertTrue(self.validate(token.token)['valid'])
+
+        admin = CustomUser.objects.create_user('admin', password='secret', user_type='admin')
+        self.client.force_login(admin)
+        self.client.post(reverse('exam:token_management'), {
+            'action': 'create_token', 'exam_id': self.exam.id, 'duration': 15, 'max_usage': 10,
+        })
+
+        self.assertIsNone(active_exam_token(token.token))
+        self.client.force_login(self.student)
+        self.assertFalse(self.validate(token.token)['valid'])
+
+    def test_access_exam_with_token_uses_index(self):
+        self.exam.access_token = 'ABC123'
+        self.exam.save()
+        self.client.force_login(self.student)
+
+        response = self.client.get(reverse('exam:access_exam_with_token', args=['abc123']))
+        self.assertRedirects(response, reverse('exam:take_exam', args=[self.exam.id]), fetch_redirect_response=False)
+
+        self.exam.access_token = 'XYZ789'
+        self.exam.save()
+        response = self.client.get(reverse('exam:access_exam_with_token', args=['ABC123']))
+        self.assertRedirects(response, reverse('exam:my_exams'), fetch_redirect_response=False)
+
+
+class TokenMintingTests(ExamTestMixin, TestCase):
+    def test_mint_tokens_in_bulk(self):
+        existing = ExamToken.create_token(self.exam, self.teacher)
+
+        with CaptureQueriesContext(connection) as queries:
+            tokens = [token.token for token in mint_tokens(self.exam, self.teacher, 2500, batch_size=1000)]
+
+        self.assertEqual(len(set(tokens)), 2500)
+        self.assertNotIn(existing.token, tokens)
+        self.assertEqual(ExamToken.objects.filter(token__in=tokens, max_usage=1).count(), 2500)
+        # Bentrok dicek dengan satu query set-based, bukan exists() per token
+        selects = [q['sql'] for q in queries if q['sql'].startswith('SELECT')]
+        self.assertLessEqual(len(selects), 2)
+
+    def test_bulk_generate_streams_csv(self):
+        admin = CustomUser.objects.create_user('admin', password='secret', user_type='admin')
+        self.client.force_login(admin)
+
+        response = self.client.post(reverse('exam:bulk_generate_tokens'), {
+            'exam_id': self.exam.id, 'quantity': 150, 'duration': 30, 'max_usage': 1, 'download': 'csv',
+        })
+
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(len(rows), 151)
+        self.assertEqual(ExamToken.objects.filter(exam=self.exam).count(), 150)
+        # Expires At sama dengan nilai yang tersimpan di token
+        stored = ExamToken.objects.get(token=rows[1][0]).expires_at
+        self.assertEqual(rows[1][2], stored.strftime('%Y-%m-%d %H:%M'))
+
+
+class TokenExpiryTests(ExamTestMixin, TestCase):
+    def test_expiry_job_and_read_only_admin_page(self):
+        lapsed = ExamToken.create_token(self.exam, self.teacher)
+        used_up = ExamToken.create_token(self.exam, self.teacher, max_usage=1)
+        fresh = ExamToken.create_token(self.exam, self.teacher)
+        ExamToken.objects.filter(pk=lapsed.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+        ExamToken.objects.filter(pk=used_up.pk).update(used_count=1)
+
+        admin = CustomUser.objects.create_user('admin', password='secret', user_type='admin')
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('exam:token_management'))
+        self.assertFalse([q['sql'] for q in queries if q['sql'].startswith('UPDATE "exam_examtoken"')])
+        self.assertEqual(response.context['active_tokens'], 1)
+        self.assertEqual(response.context['expired_tokens'], 2)
+
+        self.assertEqual(expire_tokens(), 2)
+        self.assertEqual(
+            dict(ExamToken.objects.values_list('pk', 'status')),
+            {lapsed.pk: 'expired', used_up.pk: 'expired', fresh.pk: 'active'},
+        )
+        self.assertEqual(expire_tokens(), 0)
+
+
+class StreamingExportTests(ExamTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = CustomUser.objects.create_user('admin', password='secret', user_type='admin', is_staff=True)
+        self.client.force_login(self.admin)
+
+    def test_export_users_streams_rows(self):
+        response = self.client.get(reverse('exam:export_users'))
+
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'Username,Email,First Name,Last Name,User Type,Status,Registration Date')
+        self.assertEqual(len(lines), 1 + CustomUser.objects.count())
+
+    def test_export_tokens_csv_streams_rows(self):
+        mint_tokens(self.exam, self.teacher, 5)
+
+        with self.settings(EXPORT_CHUNK_SIZE=2):
+            response = self.client.get(reverse('exam:export_tokens'), {'format': 'csv'})
+            chunks = list(response.streaming_content)
+
+        self.assertGreater(len(chunks), 1)
+        lines = b''.join(chunks).decode().splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertIn('Ujian,Active,teacher', lines[1])
+
+    def test_export_tokens_excel_runs_as_background_job(self):
+        tokens = [token.token for token in mint_tokens(self.exam, self.teacher, 5)]
+
+        with self.settings(EXPORT_CHUNK_SIZE=2):
+            response = self.client.get(
+                reverse('exam:export_tokens'), {'format': 'excel'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+            )
+            self.assertEqual(response.status_code, 202)
+            job = response.json()
+
+            status = self.client.get(job['status_url']).json()
+            self.assertEqual(status['status'], 'done')
+            self.assertEqual((status['processed'], status['total']), (5, 5))
+
+            download = self.client.get(job['download_url'])
+            content = b''.join(download.streaming_content)
+
+            self.client.force_login(self.student)
+            self.assertEqual(self.client.get(job['status_url']).status_code, 404)
+
+        self.assertIn('.xlsx', download['Content-Disposition'])
+
+        # State job ada di file, bukan di cache worker yang menjalankannya
+        cache.clear()
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(job['status_url']).json()['status'], 'done')
+        with zipfile.ZipFile(io.BytesIO(content)) as workbook:
+            sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        for token in tokens:
+            self.assertIn(token, sheet)
+
+
+class GradebookExportTests(ExamTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.questions = self.add_questions(3)
+        self.start_session()
+        first, second, _ = self.questions
+        self.submit([
+            {'question_id': first.id, 'choice_ids': [first.choices.get(order=0).id], 'seq': 1},
+            {'question_id': second.id, 'choice_ids': [second.choices.get(order=1).id], 'seq': 2},
+        ])
+
+    def test_csv_has_one_row_per_session_and_column_per_question(self):
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('exam:export_gradebook', args=[self.exam.id]), {'format': 'csv'})
+
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][5:8], ['Q1 (MC)', 'Q2 (MC)', 'Q3 (MC)'])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][0], 'student')
+        self.assertEqual(rows[1][5:8], ['A', 'B', ''])
+        self.assertEqual(rows[1][8:], ['1', '33.33', '2', '1', '1'])
+
+    def test_points_mode(self):
+        self.client.force_login(self.teacher)
+        response = self.client.get(
+            reverse('exam:export_gradebook', args=[self.exam.id]), {'format': 'csv', 'mode': 'points'},
+        )
+
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[1][5:8], ['1', '0', ''])
+
+    def test_query_count_does_not_depend_on_size(self):
+        self.add_questions(20)
+        with self.assertNumQueries(5):
+            build_gradebook(self.exam, 'answers')
+        with self.assertNumQueries(3):
+            build_gradebook(self.exam, 'points')
+
+    def test_other_teacher_cannot_export(self):
+        other = CustomUser.objects.create_user('other', password='secret', user_type='teacher')
+        self.client.force_login(other)
+        response = self.client.get(reverse('exam:export_gradebook', args=[self.exam.id]))
+        self.assertEqual(response.status_code, 404)
+
+
+class QuestionImportTests(ExamTestMixin, TestCase):
+    HEADER = 'Question Text,Question Type,Points,Difficulty,Correct Answer,Option A,Option B,Option C,Option D\n'
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.teacher)
+
+    def upload(self, body):
+        """Upload lewat fetch(), return status job import"""
+        response = self.client.post(reverse('exam:bulk_upload_questions'), {
+            'exam_id': self.exam.id,
+            'file': SimpleUploadedFile('soal.csv', (self.HEADER + body).encode('utf-8-sig'), 'text/csv'),
+        }, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 202)
+        return self.client.get(response.json()['status_url']).json()
+
+    def test_import_creates_questions_and_choices_in_bulk(self):
+        rows = ''.join(f'Soal {i},multiple_choice,2,easy,B,satu,dua,tiga,empat\n' for i in range(50))
+        with CaptureQueriesContext(connection) as queries:
+            job = self.upload(rows + 'Python interpreted?,true_false,1,easy,A,,,,\nIbu kota?,short_answer,3,,Jakarta,DKI Jakarta,,,\n')
+
+        self.assertLess(len(queries), 25)
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual((job['processed'], job['total'], job['errors']), (52, 52, 0))
+        self.assertEqual(self.exam.questions.count(), 52)
+        mc = self.exam.questions.filter(question_type='MC').first()
+        self.assertEqual(list(mc.choices.values_list('text', 'is_correct')),
+                         [('satu', False), ('dua', True), ('tiga', False), ('empat', False)])
+        fb = self.exam.questions.get(question_type='FB')
+        self.assertEqual(sorted(fb.choices.values_list('text', flat=True)), ['DKI Jakarta', 'Jakarta'])
+        self.exam.refresh_from_db()
+        self.assertEqual(self.exam.total_points, 50 * 2 + 1 + 3)
+        # File upload dihapus setelah diproses, yang tersisa hanya state job
+        self.assertEqual([name for name in os.listdir(self.job_dir) if not name.endswith('.json')], [])
+
+    def test_invalid_rows_are_reported(self):
+        job = self.upload(
+            'Soal ok,multiple_choice,1,easy,A,x,y,,\n'
+            ',multiple_choice,1,easy,A,x,y,,\n'
+            'Soal tipe,matching,1,easy,A,x,y,,\n'
+            'Soal jawaban,multiple_choice,1,easy,E,x,y,,\n'
+        )
+
+        self.assertEqual(job['errors'], 3)
+        self.assertEqual((job['result']['rows'], job['result']['created']), (4, 1))
+        self.assertEqual([error['row'] for error in job['result']['errors']], [3, 4, 5])
+        self.assertEqual(self.exam.questions.count(), 1)
+
+    def test_answer_letters_follow_option_columns(self):
+        job = self.upload(
+            'Soal celah,multiple_choice,1,easy,C,x,,y,\n'
+            'Soal kosong,multiple_choice,1,easy,B,x,,y,\n'
+        )
+
+        self.assertEqual((job['result']['created'], job['errors']), (1, 1))
+        self.assertEqual(job['result']['errors'][0]['row'], 3)
+        question = self.exam.questions.get()
+        self.assertEqual(list(question.choices.values_list('text', 'is_correct')), [('x', False), ('y', True)])
+
+    def test_upload_without_js_redirects_to_progress_page(self):
+        response = self.client.post(reverse('exam:bulk_upload_questions'), {
+            'exam_id': self.exam.id,
+            'file': SimpleUploadedFile('soal.csv', self.HEADER.encode(), 'text/csv'),
+        })
+        self.assertTrue(response['Location'].startswith(reverse('exam:bulk_upload_questions') + '?job='))
+
+
+class UserImportTests(ExamTestMixin, TestCase):
+    HEADER = 'username,email,first_name,last_name,role,password,department\n'
+
+    def setUp(self):
+        super().setUp()
+        self.admin = CustomUser.objects.create_user('admin', password='secret', user_type='admin', is_staff=True)
+        self.client.force_login(self.admin)
+
+    def upload(self, body):
+        response = self.client.post(reverse('exam:import_users'), {
+            'file': SimpleUploadedFile('roster.csv', (self.HEADER + body).encode('utf-8-sig'), 'text/csv'),
+        }, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 202)
+        return self.client.get(response.json()['status_url']).json()
+
+    def test_import_hashes_passwords_in_process_pool(self):
+        rows = ''.join(f'siswa{i},siswa{i}@sekolah.id,Siswa,{i},student,rahasia{i},INF\n' for i in range(16))
+
+        with self.settings(USER_IMPORT_HASH_WORKERS=2):
+            job = self.upload(rows)
+
+        self.assertEqual((job['result']['created'], job['errors']), (16, 0))
+        user = CustomUser.objects.get(username='siswa7')
+        self.assertTrue(user.check_password('rahasia7'))
+        self.assertEqual((user.user_type, user.department), ('student', self.department))
+
+    def test_conflicts_and_invalid_rows_are_reported(self):
+        with self.settings(USER_IMPORT_HASH_WORKERS=1):
+            job = self.upload(
+                'baru,baru@sekolah.id,Baru,,student,rahasia,informatika\n'
+                'student,lain@sekolah.id,,,student,rahasia,\n'
+                'dobel,BARU@sekolah.id,,,student,rahasia,\n'
+                'guru,guru@sekolah.id,,,teacher,rahasia,XYZ\n'
+                'kepala,kepala@sekolah.id,,,principal,rahasia,\n'
+            )
+
+        self.assertEqual(job['result']['created'], 1)
+        self.assertEqual([error['row'] for error in job['result']['errors']], [3, 4, 5, 6])
+        self.assertEqual(CustomUser.objects.get(username='baru').department, self.department)
+
+
+    def test_concurrent_conflict_rejects_only_the_duplicate_row(self):
+        real_existing = importers._existing
+
+        def stale_existing(pending):
+            if len(pending) > 1:
+                # User "balapan" dibuat di tempat lain setelah pengecekan konflik chunk
+                CustomUser.objects.create_user('balapan', password='secret')
+                return set(), set()
+            return real_existing(pending)
+
+        with self.settings(USER_IMPORT_HASH_WORKERS=1), mock.patch('exam.importers._existing', stale_existing):
+            job = self.upload(
+                'satu,satu@sekolah.id,,,student,rahasia,\n'
+                'balapan,balapan@sekolah.id,,,student,rahasia,\n'
+                'dua,dua@sekolah.id,,,student,rahasia,\n'
+            )
+
+        self.assertEqual(job['result']['created'], 2)
+        self.assertEqual([error['row'] for error in job['result']['errors']], [3])
+        self.assertIn('"balapan" already exists', job['result']['errors'][0]['message'])
+        self.assertEqual(CustomUser.objects.filter(username__in=['satu', 'dua']).count(), 2)
+
+class JobStateTests(ExamTestMixin, TestCase):
+    def test_job_of_stopped_worker_is_marked_failed(self):
+        with self.settings(JOBS_RUN_INLINE=False):
+            with mock.patch('exam.jobs._get_executor'):
+                job_id = submit_job('noop', lambda job: None, owner=self.teacher.pk)
+        self.assertEqual(get_job(job_id)['status'], 'pending')
+
+        # Proses yang menjalankan job restart: job tidak lagi terdaftar aktif
+        with mock.patch('exam.jobs._active', set()):
+            state = get_job(job_id)
+        self.assertEqual(state['status'], 'failed')
+        self.assertIn('stopped', state['message'])
+        self.assertIsNone(get_job('../../etc/passwd'))
+
+
+class StudentStatsTests(ExamTestMixin, TestCase):
+    def test_stats_are_cached_and_refreshed_after_submit(self):
+        question = self.add_questions(1)[0]
+        self.start_session()
+
+        first = student_stats(self.student)
+        with self.assertNumQueries(0):
+            self.assertEqual(student_stats(self.student), first)
+        self.assertEqual(first['completed'], 0)
+
+        self.submit([{'question_id': question.id, 'choice_ids': [question.choices.get(order=0).id], 'seq': 1}])
+
+        stats = student_stats(self.student)
+        self.assertEqual((stats['completed'], stats['passed'], stats['average_score']), (1, 1, 100.0))
+        self.assertEqual(stats['success_rate'], 100.0)
+
+    def test_dashboard_uses_single_aggregate(self):
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('exam:student_dashboard'))
+        self.assertEqual(response.context['total_exams_taken'], 0)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('exam:student_dashboard'))
+        self.assertFalse([q for q in queries if 'AVG(' in q['sql']])
+
+
+class SystemStatsTests(ExamTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        reconcile_system_stats()
+
+    def test_counters_follow_creates_and_submit(self):
+        question = self.add_questions(1)[0]
+        CustomUser.objects.create_user('student2', password='secret', user_type='student')
+        self.start_session()
+
+        stats = get_system_stats()
+        self.assertEqual((stats['total_users'], stats['total_students'], stats['total_teachers']), (3, 2, 1))
+        self.assertEqual((stats['total_exams'], stats['today_exams']), (1, 1))
+        self.assertEqual((stats['total_sessions'], stats['active_sessions']), (1, 1))
+
+        self.submit([{'question_id': question.id, 'choice_ids': [question.choices.get(order=0).id], 'seq': 1}])
+        stats = get_system_stats()
+        self.assertEqual((stats['active_sessions'], stats['completed_sessions']), (0, 1))
+        self.assertEqual((stats['avg_score'], stats['pass_rate']), (100.0, 100.0))
+
+        # Hasil incremental sama dengan hitung ulang penuh
+        reconcile_system_stats()
+        self.assertEqual({**get_system_stats(), 'updated_at': None}, {**stats, 'updated_at': None})
+
+    def test_admin_dashboards_read_one_row(self):
+        admin = CustomUser.objects.create_user('admin', password='secret', user_type='admin')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('exam:admin_dashboard'))
+        self.assertEqual(response.context['total_users'], 3)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('exam:admin_dashboard'))
+            self.client.get(reverse('exam:admin_stats'))
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql'] or 'AVG(' in q['sql']])
+
+
+class ExamStatsTests(ExamTestMixin, TestCase):
+    def answer(self, question, correct=True):
+        return {'question_id': question.id, 'choice_ids': [question.choices.get(order=0 if correct else 1).id], 'seq': 1}
+
+    def test_rollup_follows_sessions_and_regrade(self):
+        question = self.add_questions(1)[0]
+        reconcile_exam_stats(self.exam)
+        self.start_session()
+        self.assertEqual(get_exam_stats(self.exam)['total_attempts'], 1)
+
+        self.submit([self.answer(question, correct=False)])
+        stats = get_exam_stats(self.exam)
+        self.assertEqual((stats['completion_rate'], stats['pass_rate'], stats['overall_average_score']), (100.0, 0, 0.0))
+
+        choices = list(question.choices.order_by('order'))
+        choices[0].is_correct = False
+        choices[0].save()
+        choices[1].is_correct = True
+        choices[1].save()
+        self.exam.refresh_from_db()
+        regrade_exam(self.exam)
+        stats = get_exam_stats(self.exam)
+        self.assertEqual((stats['pass_rate'], stats['overall_average_score']), (100.0, 100.0))
+
+        # passing_score berubah: rollup dihitung ulang
+        self.exam.passing_score = 100
+        self.exam.save()
+        reconciled = reconcile_exam_stats(self.exam)
+        self.assertEqual(reconciled.passed_attempts, 1)
+        self.exam.passing_score = 101
+        self.assertEqual(get_exam_stats(self.exam)['pass_rate'], 0)
+
+    def test_exam_details_skips_whole_exam_queries(self):
+        self.add_questions(3)
+        self.start_session()
+        response = self.client.get(reverse('exam:exam_details', args=[self.exam.id]))
+        self.assertEqual(response.context['question_count'], 3)
+        self.assertEqual(response.context['question_types'], {'MC': 3})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('exam:exam_details', args=[self.exam.id]))
+        self.assertEqual(response.context['total_attempts'], 1)
+        self.assertFalse([q for q in queries if 'GROUP BY' in q['sql'] or 'AVG(' in q['sql']])
+        self.assertFalse([q for q in queries if 'FROM "exam_question"' in q['sql']])
+        # Hanya session milik user yang dibaca
+        self.assertEqual(len([q for q in queries if 'FROM "exam_examsession"' in q['sql']]), 1)
+
+
+class ItemAnalysisTests(ExamTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.questions = self.add_questions(2)
+        # Pilihan yang dipilih 4 student: Q1 benar 2 orang, Q2 benar 1 orang
+        picks = [(0, 0), (0, 1), (1, 2), (1, 2)]
+        for i, picked in enumerate(picks):
+            user = CustomUser.objects.create_user(f'peserta{i}', password='secret', user_type='student')
+            session = ExamSession.objects.create(exam=self.exam, user=user)
+            for question, order in zip(self.questions, picked):
+                answer = UserAnswer.objects.create(
+                    session=session, question=question, is_correct=order == 0, points_earned=int(order == 0),
+                )
+                answer.selected_choices.add(question.choices.get(order=order))
+        ExamSession.objects.filter(exam=self.exam).update(is_completed=True, status='completed')
+
+    def test_difficulty_discrimination_and_distractors(self):
+        with self.assertNumQueries(4):
+            analysis = build_item_analysis(self.exam)
+        self.assertEqual(analysis['sessions'], 4)
+        first, second = analysis['items']
+        self.assertEqual((first['p_value'], first['discrimination']), (0.5, 1.0))
+        self.assertEqual((second['p_value'], second['discrimination']), (0.25, 0.5))
+        self.assertEqual(first['point_biserial'], 0.577)
+
+        shares = {choice['label']: (choice['share'], choice['upper_share'], choice['lower_share']) for choice in first['choices']}
+        self.assertEqual(shares['A'], (0.5, 1.0, 0.0))
+        self.assertEqual(shares['B'], (0.5, 0.0, 1.0))
+        self.assertEqual(shares['C'], (0.0, 0.0, 0.0))
+
+    def test_cached_and_shown_to_exam_owner(self):
+        get_item_analysis(self.exam)
+        with self.assertNumQueries(1):
+            get_item_analysis(self.exam)
+
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('exam:exam_details', args=[self.exam.id]))
+        self.assertEqual(len(response.context['item_analysis']['items']), 2)
+        response = self.client.get(reverse('exam:edit_question', args=[self.questions[1].id]))
+        self.assertEqual(response.context['item']['p_value'], 0.25)
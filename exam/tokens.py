@@ -0,0 +1,156 @@
+"""
+Lookup token akses ujian.
+
+Setiap string token punya satu entry cache (``exam_token:<TOKEN>``) berisi
+ExamToken aktif dan/atau Exam yang memakai string itu sebagai
+``access_token``. Entry dibuang oleh signal saat token dibuat, di-revoke
+atau di-renew. Cache hanya petunjuk: pemakaian token tetap dikonsumsi
+dengan satu UPDATE bersyarat, jadi ``max_usage`` tidak bisa terlewati
+walaupun ratusan student memasukkan token yang sama bersamaan.
+
+``mint_tokens`` membuat token dalam jumlah besar dengan bulk_create.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Exam, ExamToken
+
+TOKEN_LENGTH = 6
+
+# Token yang tidak ditemukan di-cache lebih singkat
+MISSING_TIMEOUT = 30
+
+MINT_BATCH_SIZE = 1000
+EXPIRE_BATCH_SIZE = 5000
+
+
+def normalize_token(value):
+    return (value or '').strip().upper()
+
+
+def _key(token):
+    return f'exam_token:{token}'
+
+
+def _build_entry(token):
+    exam_token = ExamToken.objects.filter(token=token, status='active').values(
+        'id', 'exam_id', 'exam__title', 'expires_at', 'is_global', 'max_usage',
+    ).first()
+    exam = Exam.objects.filter(access_token=token, is_active=True, status='published').values(
+        'id', 'title', 'token_expiry', 'start_time', 'end_time',
+    ).first()
+    return {'token': exam_token, 'exam': exam}
+
+
+def lookup_token(token):
+    """Entry index untuk satu string token: ``{'token': ..., 'exam': ...}``"""
+    token = normalize_token(token)
+    if len(token) != TOKEN_LENGTH:
+        return {'token': None, 'exam': None}
+
+    entry = cache.get(_key(token))
+    if entry is None:
+        entry = _build_entry(token)
+        found = entry['token'] or entry['exam']
+        cache.set(_key(token), entry, settings.TOKEN_INDEX_TIMEOUT if found else MISSING_TIMEOUT)
+    return entry
+
+
+def invalidate_tokens(*tokens):
+    keys = [_key(normalize_token(token)) for token in tokens if token]
+    if keys:
+        cache.delete_many(keys)
+
+
+def active_exam_token(token, now=None):
+    """Data ExamToken aktif dan belum lewat expires_at, atau None"""
+    now = now or timezone.now()
+    data = lookup_token(token)['token']
+    if data is None or data['expires_at'] <= now:
+        return None
+    return data
+
+
+def exam_for_access_token(token, now=None):
+    """Data Exam untuk ``Exam.access_token`` yang masih berlaku, atau None"""
+    now = now or timezone.now()
+    data = lookup_token(token)['exam']
+    if data is None or (data['token_expiry'] and now > data['token_expiry']):
+        return None
+    return data
+
+
+def consume_token(token_pk, now=None):
+    """
+    Pakai satu kuota token secara atomik. Return True kalau berhasil.
+
+    Kondisi status, kuota dan expiry dicek di dalam UPDATE yang sama, jadi
+    tidak ada increment yang hilang dan ``max_usage`` berlaku persis.
+    """
+    now = now or timezone.now()
+    return ExamToken.objects.filter(
+        pk=token_pk,
+        status='active',
+        used_count__lt=F('max_usage'),
+        expires_at__gt=now,
+    ).update(used_count=F('used_count') + 1) == 1
+
+
+def expire_tokens(now=None, batch_size=EXPIRE_BATCH_SIZE):
+    """
+    Job expiry: ubah status token active yang sudah lewat expires_at atau
+    habis kuotanya menjadi expired, per batch. Return jumlah token.
+
+    Status di database hanya dirapikan di sini; pembacaan (validasi,
+    halaman admin) selalu memakai expires_at sebagai acuan.
+    """
+    now = now or timezone.now()
+    expired = 0
+    while True:
+        rows = list(ExamToken.objects.filter(status='active').filter(
+            Q(expires_at__lte=now) | Q(used_count__gte=F('max_usage'))
+        ).values_list('id', 'token')[:batch_size])
+        if not rows:
+            break
+        ExamToken.objects.filter(pk__in=[pk for pk, _ in rows], status='active').update(status='expired')
+        invalidate_tokens(*(token for _, token in rows))
+        expired += len(rows)
+        if len(rows) < batch_size:
+            break
+    return expired
+
+
+def mint_tokens(exam, created_by, quantity, duration_minutes=15, max_usage=1, is_global=False,
+                batch_size=MINT_BATCH_SIZE):
+    """
+    Buat ``quantity`` ExamToken sekaligus (misalnya satu token sekali pakai
+    per student). Return list ExamToken yang dibuat (dengan ``expires_at``
+    yang tersimpan).
+    """
+    if not 1 <= quantity <= settings.TOKEN_MINT_MAX:
+        raise ValueError(f'Quantity must be between 1 and {settings.TOKEN_MINT_MAX}')
+
+    tokens = ExamToken.generate_unique_tokens(quantity)
+    expires_at = timezone.now() + timedelta(minutes=duration_minutes)
+    with transaction.atomic():
+        created = ExamToken.objects.bulk_create([
+            ExamToken(
+                token=token,
+                exam=exam,
+                created_by=created_by,
+                expires_at=expires_at,
+                is_global=is_global,
+                max_usage=max_usage,
+                status='active',
+            )
+            for token in tokens
+        ], batch_size=batch_size)
+
+    # bulk_create tidak memicu signal, entry "tidak ditemukan" dibuang manual
+    invalidate_tokens(*tokens)
+    return created
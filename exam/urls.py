@@ -18,6 +18,11 @@ urlpatterns = [
     path('student/exam/<int:exam_id>/', views.take_exam, name='take_exam'),
     path('exam/<int:exam_id>/take/', views.take_exam, name='take_exam'),
     path('exam/<int:exam_id>/submit/', views.submit_exam, name='submit_exam'),
+    path('exam/<int:exam_id>/questions/', views.exam_questions_chunk, name='exam_questions_chunk'),
+    path('exam/<int:exam_id>/autosave/', views.autosave_answers, name='autosave_answers'),
+    path('exam/<int:exam_id>/heartbeat/', views.exam_heartbeat, name='exam_heartbeat'),
+    path('exam/<int:exam_id>/presence/', views.exam_presence_status, name='exam_presence'),
+    path('exam/<int:exam_id>/gradebook/', views.export_gradebook, name='export_gradebook'),
     path('results/<int:session_id>/', views.exam_results, name='exam_results'),
     path('student/dashboard/', views.student_dashboard, name='student_dashboard'),
     path('student/exam-token/', views.exam_token_access, name='exam_token_access'),
@@ -66,12 +71,18 @@ urlpatterns = [
     path('admin/users/<int:user_id>/toggle/', views.user_management_toggle, name='admin_user_toggle'),
     path('admin/users/<int:user_id>/delete/', views.user_management_delete, name='admin_user_delete'),
     path('admin/users/download-template/', views.download_user_template, name='admin_user_download'),
+    path('admin/users/export/', views.export_users, name='export_users'),
+    path('admin/users/import/', views.import_users, name='import_users'),
 
     # token management actions
     path('admin/tokens/refresh/<int:token_id>/', views.refresh_token, name='refresh_token'),
     path('admin/tokens/export/', views.export_tokens, name='export_tokens'),
     path('admin/tokens/bulk-generate/', views.bulk_generate_tokens, name='bulk_generate_tokens'),
 
+    # background jobs (export/import besar)
+    path('jobs/<str:job_id>/', views.job_status, name='job_status'),
+    path('jobs/<str:job_id>/download/', views.job_download, name='job_download'),
+
     # ===== FALLBACK REDIRECTS =====
     path('teacher/', lambda request: redirect('exam:teacher_dashboard')),
     path('student/', lambda request: redirect('exam:my-exams')),
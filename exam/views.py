@@ -1,13 +1,14 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required,user_passes_test
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, FileResponse, Http404
+from django.urls import reverse
 from django.utils import timezone
 from django.db.models import Count, Avg, Q,F,Max
 from datetime import timedelta
 from django.db import models
 from .models import Exam, ExamSession, Question, Choice, UserAnswer, QuestionBank, StudentAnswer
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseNotModified
 from django.utils.encoding import smart_str
 from django.conf import settings
 from django.db import transaction
@@ -15,6 +16,7 @@ from .forms import ExamForm, AdminUserForm, AdminCreateUserForm, AdminUserEditFo
 from .decorators import student_required
 from exam.decorators import teacher_required
 from django.contrib.auth import logout
+from django.core.exceptions import PermissionDenied
 from django.views.decorators.csrf import csrf_exempt
 from exam.models import ExamToken
 from .decorators import admin_required
@@ -24,11 +26,20 @@ from django.views.decorators.cache import cache_control
 from django.contrib.auth import get_user_model
 from django.core.paginator import Paginator
 from django.contrib.sessions.models import Session
+from .caching import get_exam_payload, get_exam_composition, exam_version
+from .answers import parse_deltas, buffer_answer_deltas, maybe_flush, flush_answer_buffers, load_saved_answers
+from .grading import close_expired_sessions, submit_session
+from .tokens import lookup_token, consume_token, exam_for_access_token, mint_tokens, expire_tokens, invalidate_tokens
+from .exports import iter_values, stream_csv, token_rows, export_tokens_xlsx, TOKEN_HEADER
+from .jobs import submit_job, get_job, job_summary, save_upload
+from .importers import import_questions_job, import_users_job
+from .gradebook import MODES as GRADEBOOK_MODES, build_gradebook, export_gradebook_xlsx, gradebook_filename
+from .stats import get_exam_stats, get_system_stats, student_stats
+from .analysis import get_item_analysis, item_for_question
+from .presence import record_heartbeat, heartbeat_time_spent, clear_heartbeat, exam_presence
 import json
+import os
 import csv
-import io
-import xlsxwriter
-from io import BytesIO
 
 # GET User Data
 User = get_user_model()
@@ -125,10 +136,6 @@ def student_dashboard(request):
     """
     Dashboard untuk student dengan statistik lengkap
     """
-    print(f"User: {request.user.username}")
-    print(f"Authenticated: {request.user.is_authenticated}")
-    print(f"User type: {request.user.user_type}")
-
     # Kalau bukan student, arahkan ke dashboard sesuai tipe user
     if request.user.user_type != 'student':
         if request.user.user_type == 'teacher':
@@ -146,12 +153,8 @@ def student_dashboard(request):
 
     try:
         # ===== Statistik Ujian =====
-        # ✅ GUNAKAN 'sessions' BUKAN 'session'
-        total_exams_taken = ExamSession.objects.filter(user=user, is_completed=True).count()
-        passed_exams = ExamSession.objects.filter(user=user, is_completed=True, score__gte=F('exam__passing_score')).count()
-        avg_result = ExamSession.objects.filter(user=user, is_completed=True, score__isnull=False).aggregate(avg_score=Avg('score'))
-        average_score = avg_result['avg_score'] or 0
-        success_rate = round((passed_exams / total_exams_taken) * 100, 2) if total_exams_taken > 0 else 0
+        # Satu aggregate, di-cache per user (lihat exam/stats.py)
+        stats = student_stats(user)
 
         # ===== Aktivitas Terbaru =====
         recent_sessions = ExamSession.objects.filter(user=user).select_related('exam', 'exam__subject').order_by('-start_time')[:5]
@@ -172,10 +175,10 @@ def student_dashboard(request):
 
         # ===== Context untuk template =====
         context = {
-            'total_exams_taken': total_exams_taken,
-            'passed_exams': passed_exams,
-            'average_score': round(average_score, 2),
-            'success_rate': success_rate,
+            'total_exams_taken': stats['completed'],
+            'passed_exams': stats['passed'],
+            'average_score': stats['average_score'],
+            'success_rate': stats['success_rate'],
             'recent_sessions': recent_sessions,
             'available_exams': available_exams,
             'current_date': now,
@@ -219,13 +222,14 @@ def my_exams(request):
         sessions__user=user,  # Gunakan 'sessions' bukan 'examsession'
         sessions__is_completed=True
     ).distinct().select_related('subject', 'created_by')
+    available_exams = list(available_exams)
     
     # Dapatkan sesi yang sedang berlangsung
-    ongoing_sessions = ExamSession.objects.filter(
+    ongoing_sessions = list(ExamSession.objects.filter(
         user=user,
         end_time__isnull=True,
         is_completed=False
-    ).select_related('exam')
+    ).select_related('exam'))
     
     # Dapatkan sesi yang sudah selesai
     completed_sessions = ExamSession.objects.filter(
@@ -246,15 +250,9 @@ def my_exams(request):
         Q(allowed_users=user)
     ).distinct().select_related('subject').order_by('start_time')[:5]
     
-    # Hitung statistik
-    total_exams = available_exams.count() + ongoing_sessions.count() + completed_sessions.count()
-    
-    # Hitung rata-rata skor
-    avg_score = completed_sessions.aggregate(avg_score=Avg('score'))['avg_score'] or 0
-    
-    # Hitung tingkat keberhasilan
-    passed_exams = completed_sessions.filter(score__gte=F('exam__passing_score')).count()
-    success_rate = round((passed_exams / completed_sessions.count() * 100), 2) if completed_sessions.count() > 0 else 0
+    # Hitung statistik (aggregate yang di-cache, lihat exam/stats.py)
+    stats = student_stats(user)
+    total_exams = len(available_exams) + len(ongoing_sessions) + stats['completed']
     
     context = {
         'available_exams': available_exams,
@@ -262,8 +260,8 @@ def my_exams(request):
         'completed_sessions': completed_sessions,
         'upcoming_exams': upcoming_exams,
         'total_exams': total_exams,
-        'average_score': round(avg_score, 2),
-        'success_rate': success_rate,
+        'average_score': stats['average_score'],
+        'success_rate': stats['success_rate'],
         'current_date': now,
     }
     
@@ -346,6 +344,11 @@ def take_exam(request, exam_id):
         end_time__isnull=True
     ).first()
     
+    # Session yang sudah lewat deadline ditutup dulu (kalau belum disapu sweeper)
+    if ongoing_session and ongoing_session.deadline and ongoing_session.deadline <= timezone.now():
+        close_expired_sessions(session_ids=[ongoing_session.pk])
+        return redirect('exam:exam_results', session_id=ongoing_session.id)
+
     if not ongoing_session:
         ongoing_session = ExamSession.objects.create(
             user=request.user,
@@ -354,40 +357,53 @@ def take_exam(request, exam_id):
             attempt_number=completed_sessions + 1
         )
     
-    # Prepare questions data for JavaScript
+    # Payload soal di-compile sekali per versi exam (lihat exam/caching.py),
+    # di sini tinggal diurutkan sesuai seed session (stabil saat resume)
+    questions = ongoing_session.order_questions(
+        get_exam_payload(exam),
+        shuffle_questions=exam.shuffle_questions,
+        shuffle_choices=exam.shuffle_choices,
+    )
+
+    # Jawaban yang sudah di-autosave (resume / pindah device)
+    flush_answer_buffers([ongoing_session.session_id])
+    saved_answers, last_seq = load_saved_answers(ongoing_session)
+
+    # Hanya chunk pertama yang di-embed ke HTML, sisanya diambil lewat
+    # exam_questions_chunk supaya halaman bisa langsung tampil
+    chunk_size = settings.EXAM_QUESTION_CHUNK_SIZE
     questions_data = []
-    questions = exam.questions.all().prefetch_related('choices')
-    
-    # Apply shuffle if enabled
-    if exam.shuffle_questions:
-        questions = questions.order_by('?')
-    
-    for question in questions:
-        choices = list(question.choices.all())
-        
-        # Apply shuffle to choices if enabled
-        if exam.shuffle_choices:
-            import random
-            random.shuffle(choices)
-        
-        questions_data.append({
-            'id': question.id,
-            'text': question.text,
-            'image': question.image.url if question.image else None,
-            'options': [
-                {
-                    'id': choice.id,
-                    'text': choice.text
-                } for choice in choices
-            ],
-            'answered': False,
-            'selected_option': None,
+    for index, question in enumerate(questions):
+        if index < chunk_size:
+            item = {**question, 'loaded': True}
+        else:
+            item = {
+                'id': question['id'], 'type': question['type'], 'text': '', 'image': None,
+                'options': [], 'loaded': False,
+            }
+        saved = saved_answers.get(question['id']) or {}
+        selected = saved.get('choice_ids') or []
+        item.update({
+            'answered': bool(selected or saved.get('text') or saved.get('matching')),
+            'selected_option': selected[0] if selected else None,
+            'selected_options': selected,
+            'text_answer': saved.get('text') or '',
+            'matching': saved.get('matching'),
             'flagged': False
         })
+        questions_data.append(item)
     
+    remaining = ongoing_session.time_remaining
     context = {
         'exam': exam,
         'questions_data': json.dumps(questions_data),
+        'total_questions': len(questions_data),
+        'chunk_size': chunk_size,
+        'last_seq': last_seq,
+        'autosave_interval': settings.EXAM_AUTOSAVE_INTERVAL,
+        'heartbeat_interval': settings.EXAM_HEARTBEAT_INTERVAL,
+        # Timer di browser hanya tampilan, deadline dari server yang berlaku
+        'remaining_seconds': int(remaining.total_seconds()) if remaining is not None else exam.duration_minutes * 60,
         'ongoing_session': ongoing_session,
         'shuffle_questions': exam.shuffle_questions,
         'shuffle_choices': exam.shuffle_choices,
@@ -396,6 +412,124 @@ def take_exam(request, exam_id):
     
     return render(request, 'exam/take_exam.html', context)
 
+@login_required
+@student_required
+def exam_questions_chunk(request, exam_id):
+    """JSON potongan soal (berdasarkan index) sesuai urutan session student"""
+    exam = get_object_or_404(Exam, id=exam_id, is_active=True)
+    session = ExamSession.objects.filter(
+        user=request.user,
+        exam=exam,
+        end_time__isnull=True
+    ).first()
+
+    if not session:
+        return JsonResponse({'error': 'Session not found'}, status=404)
+
+    try:
+        start = max(0, int(request.GET.get('start', 0)))
+        count = int(request.GET.get('count', settings.EXAM_QUESTION_CHUNK_SIZE))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid range'}, status=400)
+    count = min(max(count, 1), settings.EXAM_QUESTION_CHUNK_MAX)
+
+    # Isi chunk hanya bergantung pada versi exam, seed session dan range
+    etag = f'"{exam_version(exam)}-{session.shuffle_seed}-{start}-{count}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    questions = session.order_questions(
+        get_exam_payload(exam),
+        shuffle_questions=exam.shuffle_questions,
+        shuffle_choices=exam.shuffle_choices,
+    )
+
+    response = JsonResponse({
+        'total': len(questions),
+        'start': start,
+        'questions': questions[start:start + count],
+    })
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+@login_required
+@student_required
+def autosave_answers(request, exam_id):
+    """Terima batch delta jawaban {question_id, choice_ids, seq} dari take_exam"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request'}, status=405)
+
+    exam = get_object_or_404(Exam, id=exam_id)
+    session = ExamSession.objects.filter(
+        user=request.user,
+        exam=exam,
+        end_time__isnull=True
+    ).first()
+
+    if not session:
+        return JsonResponse({'error': 'Session not found'}, status=400)
+
+    grace = timedelta(seconds=settings.EXAM_DEADLINE_GRACE_SECONDS)
+    if session.deadline and timezone.now() > session.deadline + grace:
+        return JsonResponse({'error': 'Time is up'}, status=409)
+
+    try:
+        deltas = parse_deltas(json.loads(request.body).get('deltas', []))
+    except (ValueError, AttributeError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    # Delta masuk ke spool dulu, ditulis ke UserAnswer secara bulk oleh flusher
+    session.exam = exam
+    saved = buffer_answer_deltas(session, deltas)
+    maybe_flush(session)
+
+    # Semua delta sampai seq ini sudah diterima (atau memang tidak valid)
+    acked_seq = max((delta.seq for delta in deltas), default=0)
+    return JsonResponse({'saved': saved, 'acked_seq': acked_seq})
+
+@login_required
+@student_required
+def exam_heartbeat(request, exam_id):
+    """Ping presence dari take_exam, hanya ditulis ke cache (lihat exam/presence.py)"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request'}, status=405)
+
+    session = ExamSession.objects.filter(
+        user=request.user,
+        exam_id=exam_id,
+        end_time__isnull=True
+    ).first()
+
+    if not session:
+        return JsonResponse({'error': 'Session not found'}, status=400)
+
+    state = record_heartbeat(session)
+    remaining = session.time_remaining
+    return JsonResponse({
+        'time_spent': int(state['time_spent']),
+        'remaining': int(remaining.total_seconds()) if remaining is not None else None,
+    })
+
+@login_required
+def exam_presence_status(request, exam_id):
+    """Siapa saja yang sedang mengerjakan exam ini, untuk proctor"""
+    if request.user.user_type not in ['teacher', 'admin', 'superadmin']:
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+
+    # Teacher hanya boleh melihat exam miliknya sendiri
+    exams = Exam.objects.all()
+    if request.user.user_type == 'teacher':
+        exams = exams.filter(created_by=request.user)
+    exam = get_object_or_404(exams, id=exam_id)
+    sessions = exam_presence(exam)
+    return JsonResponse({
+        'online': sum(1 for s in sessions if s['online']),
+        'sessions': sessions,
+    })
+
 @csrf_exempt
 def submit_exam(request, exam_id):
     if request.method == 'POST':
@@ -410,41 +544,27 @@ def submit_exam(request, exam_id):
         ).first()
         
         if session:
-            session.end_time = timezone.now()
-            session.time_spent = data.get('time_spent', 0)
-            
-            # Calculate score
-            total_questions = exam.questions.count()
-            correct_answers = 0
-            
-            for answer_data in data.get('answers', []):
-                question = get_object_or_404(Question, id=answer_data['question_id'])
-                selected_choice = get_object_or_404(Choice, id=answer_data['option_id'])
-                
-                # Create UserAnswer record
-                user_answer = UserAnswer.objects.create(
-                    session=session,
-                    question=question,
-                    is_correct=selected_choice.is_correct
-                )
-                user_answer.selected_choices.add(selected_choice)
-                
-                if selected_choice.is_correct:
-                    correct_answers += 1
-            
-            # Update session statistics
-            session.score = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
-            session.total_questions = total_questions
-            session.answered_questions = len(data.get('answers', []))
-            session.correct_answers = correct_answers
-            session.wrong_answers = session.answered_questions - correct_answers
-            session.status = 'completed'
-            session.is_completed = True
-            session.save()
+            # Jawaban sudah masuk lewat autosave, di sini cukup sisa delta
+            # yang belum sempat terkirim
+            try:
+                deltas = parse_deltas(data.get('deltas', []))
+            except ValueError as e:
+                return JsonResponse({'error': str(e)}, status=400)
+
+            # Waktu dari heartbeat lebih dipercaya daripada angka dari client
+            time_spent = heartbeat_time_spent(session)
+            if time_spent is None:
+                time_spent = data.get('time_spent', 0)
+
+            # Nilai semua jawaban sekaligus (lihat exam/grading.py)
+            submit_session(session, exam, deltas, time_spent=time_spent)
+            clear_heartbeat(session)
             
             return JsonResponse({'session_id': session.id, 'score': session.score})
         
-        return JsonResponse({'error': 'Session not found'}, status=400)@login_required
+        return JsonResponse({'error': 'Session not found'}, status=400)
+
+@login_required
 # views.py - tambahkan fungsi exam_results
 @student_required
 def exam_results(request, session_id):
@@ -622,6 +742,7 @@ def edit_question(request, question_id):
     context = {
         'question_form': question_form,
         'choice_formset': choice_formset,
+        'item': item_for_question(get_item_analysis(question.exam), question.id) if question.exam else None,
         'title': 'Edit Question'
     }
     return render(request, 'exam/question_form.html', context)
@@ -642,118 +763,8 @@ def delete_question(request, question_id):
 @login_required
 @teacher_required
 def upload_questions_csv(request, question_bank_id=None):
-    # Get available exams for the dropdown
-    exams = Exam.objects.filter(created_by=request.user, is_active=True)
-    
-    if request.method == 'POST':
-        try:
-            csv_file = request.FILES.get('file')
-            exam_id = request.POST.get('exam_id')  # ✅ GET exam_id FROM FORM
-            question_bank_id = request.POST.get('question_bank_id')
-            
-            # Validasi: Pastikan file ada
-            if not csv_file:
-                messages.error(request, 'Please select a CSV file to upload.')
-                return render(request, 'exam/bulk_upload.html', {'exams': exams})
-            
-            # Validasi: Pastikan file adalah CSV
-            if not csv_file.name.endswith('.csv'):
-                messages.error(request, 'Please upload a valid CSV file.')
-                return render(request, 'exam/bulk_upload.html', {'exams': exams})
-            
-            # Validasi: Pastikan exam dipilih
-            if not exam_id:
-                messages.error(request, 'Please select an exam for these questions.')
-                return render(request, 'exam/bulk_upload.html', {'exams': exams})
-            
-            # Baca file CSV
-            data_set = csv_file.read().decode('UTF-8')
-            io_string = io.StringIO(data_set)
-            
-            questions_created = 0
-            with transaction.atomic():  # ✅ GUNAKAN TRANSACTION
-                for row_num, row in enumerate(csv.reader(io_string, delimiter=','), 1):
-                    # Skip header row
-                    if row_num == 1:
-                        continue
-                    
-                    # Skip empty rows
-                    if not any(row) or len(row) < 5:
-                        continue
-                    
-                    try:
-                        # Process each row
-                        question_text = row[0].strip()
-                        question_type = row[1].strip().lower()
-                        points = int(row[2]) if row[2].strip().isdigit() else 1
-                        difficulty = row[3].strip().lower()
-                        correct_answer = row[4].strip().upper()
-                        
-                        # Validasi difficulty
-                        if difficulty not in ['easy', 'medium', 'hard']:
-                            difficulty = 'medium'
-                        
-                        # Validasi question type
-                        if question_type not in ['multiple_choice', 'true_false', 'short_answer', 'essay']:
-                            question_type = 'multiple_choice'
-                        
-                        # Create question
-                        question = Question.objects.create(
-                            text=question_text,
-                            question_type=question_type,
-                            points=points,
-                            difficulty=difficulty,
-                            exam_id=exam_id,  # ✅ GUNAKAN exam_id YANG SUDAH DIPILIH
-                            created_by=request.user
-                        )
-                        
-                        # Jika ada question_bank_id, assign ke question bank
-                        if question_bank_id:
-                            question.question_bank_id = question_bank_id
-                            question.save()
-                        
-                        # Create choices untuk multiple choice questions
-                        if question_type == 'multiple_choice' and len(row) >= 9:
-                            choices = row[5:9]  # Options A, B, C, D
-                            for i, choice_text in enumerate(choices):
-                                if choice_text.strip():  # Only create if choice text is not empty
-                                    is_correct = (chr(65 + i) == correct_answer)  # A=0, B=1, etc.
-                                    Choice.objects.create(
-                                        question=question,
-                                        text=choice_text.strip(),
-                                        is_correct=is_correct
-                                    )
-                        
-                        # Create choices untuk true_false questions
-                        elif question_type == 'true_false':
-                            # Create True choice
-                            Choice.objects.create(
-                                question=question,
-                                text="True",
-                                is_correct=(correct_answer.upper() == 'TRUE' or correct_answer == 'A')
-                            )
-                            # Create False choice  
-                            Choice.objects.create(
-                                question=question,
-                                text="False", 
-                                is_correct=(correct_answer.upper() == 'FALSE' or correct_answer == 'B')
-                            )
-                        
-                        questions_created += 1
-                        
-                    except Exception as e:
-                        # Skip row jika ada error dan continue ke row berikutnya
-                        print(f"Error processing row {row_num}: {e}")
-                        continue
-            
-            messages.success(request, f'Successfully uploaded {questions_created} questions!')
-            return redirect('exam:teacher_questions')  # Sesuaikan dengan nama URL Anda
-            
-        except Exception as e:
-            messages.error(request, f'Error uploading file: {str(e)}')
-            return render(request, 'exam/bulk_upload.html', {'exams': exams})
-    
-    return render(request, 'exam/bulk_upload.html', {'exams': exams})
+    # Alur upload yang sama dengan bulk_upload_questions (lihat exam/importers.py)
+    return bulk_upload_questions(request)
 
 @login_required
 @teacher_required
@@ -800,75 +811,24 @@ def admin_dashboard(request):
         messages.error(request, "Access denied. Admin access required.")
         return redirect('exam:login')
     
-    # System statistics
-    total_users = CustomUser.objects.count()
-    total_students = CustomUser.objects.filter(user_type='student').count()
-    total_teachers = CustomUser.objects.filter(user_type='teacher').count()
-    total_exams = Exam.objects.count()
-    total_sessions = ExamSession.objects.count()
-    active_sessions = ExamSession.objects.filter(status='in_progress').count()
-    
-    # Recent exams
-    recent_exams = Exam.objects.select_related('subject', 'created_by').order_by('-created_at')[:5]
-    
-    # System logs
-    system_logs = SystemLog.objects.select_related('user').order_by('-created_at')[:10]
-    
-    # Today's activity
-    today = timezone.now().date()
-    today_exams = Exam.objects.filter(created_at__date=today).count()
-    today_sessions = ExamSession.objects.filter(start_time__date=today).count()
-    
-    # Performance metrics
-    avg_score = ExamSession.objects.filter(score__isnull=False).aggregate(Avg('score'))['score__avg'] or 0
-    completed_sessions = ExamSession.objects.filter(is_completed=True)
-    pass_rate = (completed_sessions.filter(score__gte=60).count() / completed_sessions.count() * 100) if completed_sessions.count() > 0 else 0
+    # System statistics dari rollup SystemStats (exam/stats.py)
+    context = get_system_stats()
+    context.update({
+        'recent_exams': Exam.objects.select_related('subject', 'created_by').order_by('-created_at')[:5],
+        'system_logs': SystemLog.objects.select_related('user').order_by('-created_at')[:10],
+    })
 
-    context = {
-        'total_users': total_users,
-        'total_students': total_students,
-        'total_teachers': total_teachers,
-        'total_exams': total_exams,
-        'total_sessions': total_sessions,
-        'active_sessions': active_sessions,
-        'today_exams': today_exams,
-        'today_sessions': today_sessions,
-        'avg_score': round(avg_score, 2),
-        'pass_rate': round(pass_rate, 2),
-        'recent_exams': recent_exams,
-        'system_logs': system_logs,
-    }
-    
     return render(request, 'exam/admin_dashboard.html', context)
 
 @login_required
 @admin_required
 def admin_stats(request):
     """Statistics page untuk admin"""
-    # Basic statistics
-    total_users = CustomUser.objects.count()
-    total_exams = Exam.objects.count()
-    total_sessions = ExamSession.objects.count()
-    active_sessions = ExamSession.objects.filter(status='in_progress').count()
-    
-    # Performance metrics
-    avg_score = ExamSession.objects.filter(score__isnull=False).aggregate(Avg('score'))['score__avg'] or 0
-    pass_rate = (ExamSession.objects.filter(score__gte=60).count() / total_sessions * 100) if total_sessions > 0 else 0
-    
-    # Recent activity
-    recent_exams = Exam.objects.order_by('-created_at')[:5]
-    recent_sessions = ExamSession.objects.select_related('user', 'exam').order_by('-start_time')[:10]
-    
-    context = {
-        'total_users': total_users,
-        'total_exams': total_exams,
-        'total_sessions': total_sessions,
-        'active_sessions': active_sessions,
-        'avg_score': round(avg_score, 2),
-        'pass_rate': round(pass_rate, 2),
-        'recent_exams': recent_exams,
-        'recent_sessions': recent_sessions,
-    }
+    context = get_system_stats()
+    context.update({
+        'recent_exams': Exam.objects.order_by('-created_at')[:5],
+        'recent_sessions': ExamSession.objects.select_related('user', 'exam').order_by('-start_time')[:10],
+    })
     return render(request, 'admin/admin_stats.html', context)
 
 # USER Management
@@ -978,15 +938,32 @@ def download_user_template(request):
 
     writer = csv.writer(response)
     # Header kolom (sesuai dengan model CustomUser)
-    writer.writerow(['username', 'email', 'first_name', 'last_name', 'role', 'password'])
+    writer.writerow(['username', 'email', 'first_name', 'last_name', 'role', 'password', 'department'])
 
-    # Tambahkan contoh data
-    writer.writerow(['john_doe', 'john@example.com', 'John', 'Doe', 'student', '123456'])
-    writer.writerow(['teacher_01', 'teacher@example.com', 'Jane', 'Smith', 'teacher', 'password123'])
+    # Tambahkan contoh data (department: kode atau nama, boleh kosong)
+    writer.writerow(['john_doe', 'john@example.com', 'John', 'Doe', 'student', '123456', 'INF'])
+    writer.writerow(['teacher_01', 'teacher@example.com', 'Jane', 'Smith', 'teacher', 'password123', ''])
 
     return response
 
 
+@login_required
+@admin_required
+def import_users(request):
+    """Import roster user dari CSV template, diproses di background"""
+    if request.method != 'POST':
+        return redirect('exam:admin_user_list')
+
+    csv_file = request.FILES.get('file')
+    if not csv_file or not csv_file.name.endswith('.csv'):
+        messages.error(request, 'Please upload a valid CSV file (.csv).')
+        return redirect('exam:admin_user_list')
+
+    path = save_upload(csv_file)
+    job_id = submit_job('user_import', import_users_job, path, owner=request.user.pk)
+    return job_started_response(request, job_id, 'exam:admin_user_list')
+
+
 @login_required
 @admin_required
 def user_management_toggle(request, user_id):
@@ -1057,25 +1034,25 @@ def user_management(request):
 @user_passes_test(is_admin)
 def export_users(request):
     """Export users to CSV"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="users.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Username', 'Email', 'First Name', 'Last Name', 'User Type', 'Status', 'Registration Date'])
-    
-    users = CustomUser.objects.all()
-    for user in users:
-        writer.writerow([
-            user.username,
-            user.email,
-            user.first_name,
-            user.last_name,
-            user.get_user_type_display(),
-            'Active' if user.is_active else 'Inactive',
-            user.date_joined.strftime('%Y-%m-%d')
-        ])
-    
-    return response
+    user_types = dict(CustomUser.USER_TYPE_CHOICES)
+    users = iter_values(
+        CustomUser.objects.order_by('pk'),
+        ['username', 'email', 'first_name', 'last_name', 'user_type', 'is_active', 'date_joined'],
+    )
+    rows = (
+        [
+            username, email, first_name, last_name,
+            user_types.get(user_type, user_type),
+            'Active' if is_active else 'Inactive',
+            date_joined.strftime('%Y-%m-%d'),
+        ]
+        for username, email, first_name, last_name, user_type, is_active, date_joined in users
+    )
+    return stream_csv(
+        'users',
+        ['Username', 'Email', 'First Name', 'Last Name', 'User Type', 'Status', 'Registration Date'],
+        rows,
+    )
 
 # ===== FALLBACK VIEWS (jika decorator masih error) =====
 def teacher_dashboard_fallback(request):
@@ -1189,9 +1166,6 @@ def download_question_bank_template(request):
     
     return response
 
-@login_required
-@teacher_required
-
 def auto_wrap_math(text):
     """Otomatis bungkus teks yang mengandung rumus dengan $...$ biar MathJax render."""
     if not text:
@@ -1209,95 +1183,42 @@ def auto_wrap_math(text):
     return text
 
 
+@login_required
+@teacher_required
 def bulk_upload_questions(request):
     exams = Exam.objects.filter(created_by=request.user, is_active=True)
     question_banks = QuestionBank.objects.filter(created_by=request.user)
+    context = {'exams': exams, 'question_banks': question_banks}
     
     if request.method == 'POST':
-        try:
-            csv_file = request.FILES.get('file')
-            exam_id = request.POST.get('exam_id')
-            question_bank_id = request.POST.get('question_bank_id')
-            
-            if not csv_file:
-                messages.error(request, 'Please select a CSV file to upload.')
-                return render(request, 'exam/bulk_upload.html', {'exams': exams, 'question_banks': question_banks})
-            
-            if not csv_file.name.endswith('.csv'):
-                messages.error(request, 'Please upload a valid CSV file (.csv).')
-                return render(request, 'exam/bulk_upload.html', {'exams': exams, 'question_banks': question_banks})
-
-            if not exam_id:
-                messages.error(request, 'Please select an exam.')
-                return render(request, 'exam/bulk_upload.html', {'exams': exams, 'question_banks': question_banks})
-            
-            # ✅ UTF-8 BOM Safe (biar ARAB / PEGON masuk utuh)
-            data_set = csv_file.read().decode('utf-8-sig')
-            io_string = io.StringIO(data_set)
-            
-            questions_created = 0
-            
-            with transaction.atomic():
-                for row_num, row in enumerate(csv.reader(io_string, delimiter=','), 1):
-                    if row_num == 1 or not any(row) or len(row) < 5:
-                        continue
-
-                    try:
-                        # ✅ Jangan strip teks → biarkan RTL natural
-                        question_text = row[0]
-                        question_type = row[1].strip().lower()
-                        points = int(row[2]) if row[2].strip().isdigit() else 1
-                        difficulty = row[3].strip().lower()
-                        correct_answer = row[4].strip().upper()
-
-                        if difficulty not in ['easy', 'medium', 'hard']:
-                            difficulty = 'medium'
-
-                        if question_type not in ['multiple_choice', 'true_false', 'short_answer', 'essay']:
-                            question_type = 'multiple_choice'
-
-                        question = Question.objects.create(
-                            text=question_text,
-                            question_type=question_type,
-                            points=points,
-                            difficulty=difficulty,
-                            exam_id=exam_id,
-                            created_by=request.user
-                        )
-
-                        if question_bank_id:
-                            question.question_bank_id = question_bank_id
-                            question.save()
-
-                        # ✅ MULTIPLE CHOICE (pilihan tidak di-strip)
-                        if question_type == 'multiple_choice' and len(row) >= 9:
-                            choices = row[5:9]
-                            for i, choice in enumerate(choices):
-                                if choice:
-                                    Choice.objects.create(
-                                        question=question,
-                                        text=choice,
-                                        is_correct=(chr(65 + i) == correct_answer)
-                                    )
-
-                        # ✅ TRUE / FALSE clean
-                        elif question_type == 'true_false':
-                            Choice.objects.create(question=question, text="True", is_correct=(correct_answer in ['TRUE', 'A']))
-                            Choice.objects.create(question=question, text="False", is_correct=(correct_answer in ['FALSE', 'B']))
-
-                        questions_created += 1
-                    
-                    except Exception as e:
-                        print(f"Row {row_num} skipped: {e}")
-                        continue
-
-            messages.success(request, f'Successfully uploaded {questions_created} questions (Arabic/Pegon supported).')
-            return redirect('exam:teacher_questions')
-
-        except Exception as e:
-            messages.error(request, f'Error uploading file: {str(e)}')
+        csv_file = request.FILES.get('file')
+        exam_id = request.POST.get('exam_id')
+        question_bank_id = request.POST.get('question_bank_id')
+        
+        if not csv_file:
+            messages.error(request, 'Please select a CSV file to upload.')
+            return render(request, 'exam/bulk_upload.html', context)
+        
+        if not csv_file.name.endswith('.csv'):
+            messages.error(request, 'Please upload a valid CSV file (.csv).')
+            return render(request, 'exam/bulk_upload.html', context)
+
+        exam = exams.filter(id=exam_id).first() if exam_id else None
+        if exam is None:
+            messages.error(request, 'Please select an exam.')
+            return render(request, 'exam/bulk_upload.html', context)
+
+        question_bank = question_banks.filter(id=question_bank_id).first() if question_bank_id else None
+
+        # File disimpan ke disk, parsing dan insert jalan di background (lihat exam/importers.py)
+        path = save_upload(csv_file)
+        job_id = submit_job(
+            'question_import', import_questions_job, path, exam.pk, request.user.pk,
+            question_bank.pk if question_bank else None, owner=request.user.pk,
+        )
+        return job_started_response(request, job_id, 'exam:bulk_upload_questions')
     
-    return render(request, 'exam/bulk_upload.html', {'exams': exams, 'question_banks': question_banks})
+    return render(request, 'exam/bulk_upload.html', context)
 
     
 @login_required
@@ -1328,38 +1249,24 @@ def exam_details(request, exam_id):
     now = timezone.now()
     user = request.user
     
-    # Basic exam information
-    question_count = exam.questions.count()
-    
-    # Question type breakdown
-    question_types = exam.questions.values('question_type').annotate(count=Count('id'))
-    question_types_dict = {item['question_type']: item['count'] for item in question_types}
-    
-    # Difficulty distribution
-    difficulty_distribution = exam.questions.values('difficulty').annotate(count=Count('id'))
-    difficulty_dict = {item['difficulty']: item['count'] for item in difficulty_distribution}
+    # Komposisi soal di-cache per versi exam, sama untuk semua viewer
+    composition = get_exam_composition(exam)
     
     # Time progress calculation
     total_duration = (exam.end_time - exam.start_time).total_seconds()
     elapsed_time = (now - exam.start_time).total_seconds()
     time_progress = min(100, max(0, (elapsed_time / total_duration) * 100)) if total_duration > 0 else 0
     
-    # User-specific data
-    user_sessions = ExamSession.objects.filter(
+    # User-specific data: satu query, statistik dihitung dari list
+    user_sessions = list(ExamSession.objects.filter(
         user=user, 
         exam=exam
-    ).order_by('-start_time')
-    
-    completed_sessions = user_sessions.filter(is_completed=True)
-    attempts_remaining = max(0, exam.max_attempts - completed_sessions.count())
+    ).order_by('-start_time'))
     
-    # Calculate user statistics
-    if completed_sessions.exists():
-        best_score = completed_sessions.aggregate(max_score=Max('score'))['max_score'] or 0
-        average_score = completed_sessions.aggregate(avg_score=Avg('score'))['avg_score'] or 0
-    else:
-        best_score = 0
-        average_score = 0
+    completed_scores = [session.score or 0 for session in user_sessions if session.is_completed]
+    attempts_remaining = max(0, exam.max_attempts - len(completed_scores))
+    best_score = max(completed_scores, default=0)
+    average_score = sum(completed_scores) / len(completed_scores) if completed_scores else 0
     
     # Check exam availability
     exam_available = (
@@ -1375,13 +1282,16 @@ def exam_details(request, exam_id):
         time_available
     )
     
-    # Check permissions
-    has_permission = (
-        not exam.allowed_departments.exists() or 
-        exam.allowed_departments.filter(id=user.department.id).exists()
-    ) and (
-        not exam.allowed_users.exists() or 
-        exam.allowed_users.filter(id=user.id).exists()
+    # Check permissions (satu aggregate per relasi: ada pembatasan? user termasuk?)
+    departments = exam.allowed_departments.aggregate(
+        total=Count('id'), allowed=Count('id', filter=Q(id=user.department_id))
+    )
+    allowed_users = exam.allowed_users.aggregate(
+        total=Count('id'), allowed=Count('id', filter=Q(id=user.id))
+    )
+    has_permission = bool(
+        (not departments['total'] or departments['allowed']) and
+        (not allowed_users['total'] or allowed_users['allowed'])
     )
     
     # Get active token if exists
@@ -1392,33 +1302,19 @@ def exam_details(request, exam_id):
             expires_at__gt=now
         ).first()
     
-    # Overall exam statistics (for all users)
-    all_sessions = ExamSession.objects.filter(exam=exam)
-    total_attempts = all_sessions.count()
-    completed_attempts = all_sessions.filter(is_completed=True).count()
+    # Overall exam statistics (for all users) dari rollup ExamStats
+    exam_stats = get_exam_stats(exam)
     
-    if completed_attempts > 0:
-        overall_average_score = all_sessions.filter(is_completed=True).aggregate(
-            avg_score=Avg('score')
-        )['avg_score'] or 0
-        
-        passed_attempts = all_sessions.filter(
-            is_completed=True, 
-            score__gte=exam.passing_score
-        ).count()
-        
-        pass_rate = round((passed_attempts / completed_attempts) * 100, 2)
-        completion_rate = round((completed_attempts / total_attempts) * 100, 2)
-    else:
-        overall_average_score = 0
-        pass_rate = 0
-        completion_rate = 0
+    # Gradebook dan item analysis hanya untuk pembuat exam dan admin
+    can_manage = user.user_type in ['admin', 'superadmin'] or (
+        user.user_type == 'teacher' and exam.created_by_id == user.id
+    )
     
     context = {
         'exam': exam,
-        'question_count': question_count,
-        'question_types': question_types_dict,
-        'difficulty_distribution': difficulty_dict,
+        'question_count': composition['count'],
+        'question_types': composition['types'],
+        'difficulty_distribution': composition['difficulty'],
         'time_progress': time_progress,
         'user_sessions': user_sessions,
         'attempts_remaining': attempts_remaining,
@@ -1429,10 +1325,9 @@ def exam_details(request, exam_id):
         'can_start_exam': can_start_exam and has_permission,
         'has_permission': has_permission,
         'active_token': active_token,
-        'total_attempts': total_attempts,
-        'overall_average_score': round(overall_average_score, 2),
-        'pass_rate': pass_rate,
-        'completion_rate': completion_rate,
+        **exam_stats,
+        'can_export_gradebook': can_manage,
+        'item_analysis': get_item_analysis(exam) if can_manage else None,
         'now': now,
         'title': f'{exam.title} - Details'
     }
@@ -1516,22 +1411,22 @@ def exam_token_access(request):
 @login_required
 @admin_required
 def token_management(request):
+    # Read-only: status expired ditulis oleh job expire_tokens, di sini
+    # expires_at yang jadi acuan
     now = timezone.now()
-    expired_count = ExamToken.objects.filter(
-        status='active',
-        expires_at__lte=now  # ✅ HANYA yang waktu expiry <= sekarang
-    ).update(status='expired')
-    
-    print(f"🔄 Auto-expired {expired_count} tokens")  # Debug
-    
-    # Query seperti biasa
     tokens = ExamToken.objects.select_related('exam', 'created_by').all()
     exams = Exam.objects.filter(is_active=True)
     
     # Hitung stats
-    active_tokens = tokens.filter(status='active').count()
-    expired_tokens = tokens.filter(status='expired').count()
-    global_tokens = tokens.filter(is_global=True).count()
+    lapsed = Q(expires_at__lte=now) | Q(used_count__gte=F('max_usage'))
+    stats = tokens.aggregate(
+        active=Count('id', filter=Q(status='active') & ~lapsed),
+        expired=Count('id', filter=Q(status='expired') | (Q(status='active') & lapsed)),
+        global_tokens=Count('id', filter=Q(is_global=True)),
+    )
+    active_tokens = stats['active']
+    expired_tokens = stats['expired']
+    global_tokens = stats['global_tokens']
     
     # POST logic (existing code tetap)
     if request.method == 'POST':
@@ -1563,7 +1458,11 @@ def token_management(request):
             
             # Revoke existing active tokens untuk exam yang sama (jika bukan global)
             if not is_global:
-                ExamToken.objects.filter(exam=exam, status='active').update(status='expired')
+                previous = ExamToken.objects.filter(exam=exam, status='active')
+                revoked = list(previous.values_list('token', flat=True))
+                previous.update(status='expired')
+                # update() tidak memicu signal, index token dibuang di sini
+                invalidate_tokens(*revoked)
             
             # Create token
             token = ExamToken.create_token(
@@ -1600,6 +1499,7 @@ def token_management(request):
         'active_tokens': active_tokens,
         'expired_tokens': expired_tokens,
         'global_tokens': global_tokens,
+        'token_mint_max': settings.TOKEN_MINT_MAX,
     }
     return render(request, 'admin/token_management.html', context)
 
@@ -1627,79 +1527,81 @@ def export_tokens(request):
     """Export tokens ke CSV atau Excel"""
     export_format = request.GET.get('format', 'csv')
     
-    tokens = ExamToken.objects.select_related('exam', 'created_by').all()
-    
     if export_format == 'excel':
-        # Export ke Excel
-        output = BytesIO()
-        workbook = xlsxwriter.Workbook(output)
-        worksheet = workbook.add_worksheet('Tokens')
-        
-        # Header style
-        header_format = workbook.add_format({
-            'bold': True,
-            'bg_color': '#4F46E5',
-            'font_color': 'white',
-            'border': 1
-        })
-        
-        # Headers
-        headers = ['Token', 'Exam', 'Status', 'Created By', 'Created At', 'Expires At', 'Usage', 'Max Usage', 'Global']
-        for col, header in enumerate(headers):
-            worksheet.write(0, col, header, header_format)
-        
-        # Data rows
-        for row, token in enumerate(tokens, start=1):
-            worksheet.write(row, 0, token.token)
-            worksheet.write(row, 1, token.exam.title)
-            worksheet.write(row, 2, token.get_status_display())
-            worksheet.write(row, 3, token.created_by.username)
-            worksheet.write(row, 4, token.created_at.strftime('%Y-%m-%d %H:%M'))
-            worksheet.write(row, 5, token.expires_at.strftime('%Y-%m-%d %H:%M'))
-            worksheet.write(row, 6, token.used_count)
-            worksheet.write(row, 7, token.max_usage)
-            worksheet.write(row, 8, 'Yes' if token.is_global else 'No')
-        
-        # Adjust column widths
-        worksheet.set_column(0, 0, 12)  # Token
-        worksheet.set_column(1, 1, 30)  # Exam
-        worksheet.set_column(2, 2, 12)  # Status
-        worksheet.set_column(3, 3, 15)  # Created By
-        worksheet.set_column(4, 5, 18)  # Dates
-        
-        workbook.close()
-        output.seek(0)
-        
-        response = HttpResponse(
-            output.read(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = f'attachment; filename="exam_tokens_{timezone.now().strftime("%Y%m%d_%H%M%S")}.xlsx"'
-        
-        return response
-    
-    else:
-        # Export ke CSV
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="exam_tokens_{timezone.now().strftime("%Y%m%d_%H%M%S")}.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Token', 'Exam', 'Status', 'Created By', 'Created At', 'Expires At', 'Usage', 'Max Usage', 'Global'])
-        
-        for token in tokens:
-            writer.writerow([
-                token.token,
-                token.exam.title,
-                token.get_status_display(),
-                token.created_by.username,
-                token.created_at.strftime('%Y-%m-%d %H:%M'),
-                token.expires_at.strftime('%Y-%m-%d %H:%M'),
-                f"{token.used_count}/{token.max_usage}",
-                token.max_usage,
-                'Yes' if token.is_global else 'No'
-            ])
-        
-        return response
+        # XLSX dibuat di background, halaman mem-poll progress lalu download
+        job_id = submit_job('tokens_xlsx', export_tokens_xlsx, owner=request.user.pk)
+        return job_started_response(request, job_id, 'exam:token_management')
+
+    # Export ke CSV, di-stream (lihat exam/exports.py)
+    return stream_csv('exam_tokens', TOKEN_HEADER, token_rows())
+
+
+def job_started_response(request, job_id, fallback, *fallback_args):
+    """JSON berisi URL polling untuk fetch(), selain itu redirect ke ``fallback``"""
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse({
+            'job_id': job_id,
+            'status_url': reverse('exam:job_status', args=[job_id]),
+            'download_url': reverse('exam:job_download', args=[job_id]),
+        }, status=202)
+    messages.info(request, 'Processing in the background, progress is shown below.')
+    return redirect(f"{reverse(fallback, args=fallback_args)}?job={job_id}")
+
+
+def _owned_job(request, job_id):
+    state = get_job(job_id)
+    if state is None or (state['owner'] != request.user.pk and not request.user.is_superuser):
+        raise Http404('Job not found')
+    return state
+
+
+@login_required
+def job_status(request, job_id):
+    """Polling progress job background"""
+    return JsonResponse(job_summary(_owned_job(request, job_id)))
+
+
+@login_required
+def job_download(request, job_id):
+    """Download file hasil job yang sudah selesai"""
+    state = _owned_job(request, job_id)
+    if state['status'] != 'done' or not state.get('file') or not os.path.exists(state['file']):
+        raise Http404('File not ready')
+    return FileResponse(open(state['file'], 'rb'), as_attachment=True, filename=state['filename'])
+
+@login_required
+def export_gradebook(request, exam_id):
+    """Gradebook exam (session x soal) ke CSV atau Excel"""
+    if request.user.user_type not in ['teacher', 'admin', 'superadmin']:
+        raise PermissionDenied
+    exams = Exam.objects.all()
+    if request.user.user_type == 'teacher':
+        exams = exams.filter(created_by=request.user)
+    exam = get_object_or_404(exams, id=exam_id)
+
+    mode = request.GET.get('mode', 'answers')
+    if mode not in GRADEBOOK_MODES:
+        mode = 'answers'
+
+    if request.GET.get('format') == 'excel':
+        job_id = submit_job('gradebook_xlsx', export_gradebook_xlsx, exam.pk, mode, owner=request.user.pk)
+        return job_started_response(request, job_id, 'exam:exam_details', exam.pk)
+
+    gradebook = build_gradebook(exam, mode)
+    return stream_csv(gradebook_filename(exam, mode), gradebook.header, gradebook.rows())
+
+
+def minted_tokens_csv_response(exam, tokens):
+    """Download CSV token yang baru dibuat (hasil mint_tokens)"""
+    return stream_csv(
+        'minted_tokens',
+        ['Token', 'Exam', 'Expires At', 'Max Usage'],
+        (
+            [token.token, exam.title, token.expires_at.strftime('%Y-%m-%d %H:%M'), token.max_usage]
+            for token in tokens
+        ),
+    )
+
 
 @login_required
 @admin_required
@@ -1713,8 +1615,8 @@ def bulk_generate_tokens(request):
             max_usage = int(request.POST.get('max_usage', 1))
             
             # Validasi quantity
-            if quantity < 1 or quantity > 100:
-                messages.error(request, 'Quantity must be between 1 and 100')
+            if quantity < 1 or quantity > settings.TOKEN_MINT_MAX:
+                messages.error(request, f'Quantity must be between 1 and {settings.TOKEN_MINT_MAX}')
                 return redirect('exam:token_management')
             
             # ✅ FIX: Handle global token
@@ -1735,22 +1637,15 @@ def bulk_generate_tokens(request):
                 
                 exam = get_object_or_404(Exam, id=exam_id)
             
-            # Generate tokens
-            created_tokens = []
-            expires_at = timezone.now() + timedelta(minutes=duration)
-            
-            for _ in range(quantity):
-                token = ExamToken.objects.create(
-                    token=ExamToken.generate_token(),
-                    exam=exam,
-                    created_by=request.user,
-                    expires_at=expires_at,
-                    is_global=is_global,
-                    max_usage=max_usage,
-                    status='active'
-                )
-                created_tokens.append(token.token)
-            
+            # Generate tokens: kandidat dicek bentrok sekaligus, insert per batch
+            created_tokens = mint_tokens(
+                exam, request.user, quantity,
+                duration_minutes=duration, max_usage=max_usage, is_global=is_global,
+            )
+
+            if request.POST.get('download') == 'csv':
+                return minted_tokens_csv_response(exam, created_tokens)
+
             # Success message
             if is_global:
                 messages.success(
@@ -1763,8 +1658,9 @@ def bulk_generate_tokens(request):
                     f'Successfully generated {quantity} tokens for {exam.title}!'
                 )
             
-            # Optional: Save ke session untuk ditampilkan
-            request.session['generated_tokens'] = created_tokens
+            # Optional: Save ke session untuk ditampilkan (batch kecil saja)
+            if len(created_tokens) <= 100:
+                request.session['generated_tokens'] = [token.token for token in created_tokens]
             
             return redirect('exam:token_management')
             
@@ -1789,40 +1685,34 @@ def validate_exam_token(request):
                     'message': 'Token must be 6 characters long'
                 })
             
-            # Cari token yang aktif dan belum expired
-            token = ExamToken.objects.filter(
-                token=token_value,
-                status='active'
-            ).select_related('exam').first()
-            
-            if not token:
+            # Lookup dari index cache, tanpa query ke ExamToken (lihat exam/tokens.py)
+            now = timezone.now()
+            entry = lookup_token(token_value)['token']
+
+            if not entry:
                 return JsonResponse({
                     'valid': False,
                     'message': 'Invalid token'
                 })
-            
-            if token.is_expired:
-                token.status = 'expired'
-                token.save()
+
+            # Check jika token global atau untuk user tertentu
+            if not entry['is_global']:
+                # Tambahkan logic untuk check user specific access jika needed
+                pass
+
+            # Kuota dipakai dengan satu UPDATE atomik; gagal berarti sudah
+            # expired atau kuota habis (status dirapikan oleh expire_tokens)
+            if not consume_token(entry['id'], now):
                 return JsonResponse({
                     'valid': False,
                     'message': 'Token has expired'
                 })
-            
-            # Check jika token global atau untuk user tertentu
-            if not token.is_global:
-                # Tambahkan logic untuk check user specific access jika needed
-                pass
-            
-            # Update usage count
-            token.used_count += 1
-            token.save()
-            
+
             return JsonResponse({
                 'valid': True,
-                'exam_id': token.exam.id,
-                'exam_title': token.exam.title,
-                'time_remaining': str(token.time_remaining).split('.')[0]
+                'exam_id': entry['exam_id'],
+                'exam_title': entry['exam__title'],
+                'time_remaining': str(entry['expires_at'] - now).split('.')[0]
             })
             
         except Exception as e:
@@ -1858,16 +1748,10 @@ def get_active_tokens(request):
 @admin_required
 def auto_rotate_tokens(request):
     """Auto rotate tokens yang sudah expired"""
-    expired_tokens = ExamToken.objects.filter(
-        status='active',
-        expires_at__lte=timezone.now()
-    )
-    
-    expired_count = expired_tokens.count()
-    expired_tokens.update(status='expired')
+    expired_count = expire_tokens()
     
     messages.success(request, f'Rotated {expired_count} expired tokens')
-    return redirect('token_management')
+    return redirect('exam:token_management')
 
 
 
@@ -1875,33 +1759,23 @@ def auto_rotate_tokens(request):
 @student_required
 def access_exam_with_token(request, token):
     """Akses ujian langsung dengan token"""
-    token = token.upper()
-    
-    try:
-        exam = get_object_or_404(
-            Exam, 
-            access_token=token,
-            is_active=True,
-            status='published'
-        )
-        
-        # Validasi yang sama seperti di atas
-        if not exam.is_token_valid():
+    # Dilayani dari index token yang sama dengan validate_exam_token
+    exam = exam_for_access_token(token)
+    if exam is None:
+        if lookup_token(token)['exam']:
             messages.error(request, 'Token has expired')
-            return redirect('exam:my_exams')
-        
-        now = timezone.now()
-        if now < exam.start_time:
-            messages.error(request, f'Exam starts at {exam.start_time.strftime("%Y-%m-%d %H:%M")}')
-            return redirect('exam:my_exams')
-        
-        if now > exam.end_time:
-            messages.error(request, 'Exam has ended')
-            return redirect('exam:my_exams')
-        
-        # Redirect ke halaman take exam
-        return redirect('exam:take_exam', exam_id=exam.id)
-        
-    except Exam.DoesNotExist:
-        messages.error(request, 'Invalid exam token')
-        return redirect('exam:my_exams')
\ No newline at end of file
+        else:
+            messages.error(request, 'Invalid exam token')
+        return redirect('exam:my_exams')
+
+    now = timezone.now()
+    if now < exam['start_time']:
+        messages.error(request, f'Exam starts at {exam["start_time"].strftime("%Y-%m-%d %H:%M")}')
+        return redirect('exam:my_exams')
+
+    if now > exam['end_time']:
+        messages.error(request, 'Exam has ended')
+        return redirect('exam:my_exams')
+
+    # Redirect ke halaman take exam
+    return redirect('exam:take_exam', exam_id=exam['id'])
\ No newline at end of file